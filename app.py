@@ -3,13 +3,14 @@ SoF Event Extractor - Main Flask Application
 Maritime document processing and event extraction system
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, stream_with_context
+import click
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
 import logging
-from datetime import datetime
-import uuid
+from datetime import datetime, timedelta
+from itertools import groupby
 
 # Import from backend directory
 import sys
@@ -26,15 +27,46 @@ except ImportError:
         UPLOAD_FOLDER = 'backend/uploads'
         MAX_CONTENT_LENGTH = 10 * 1024 * 1024
 
-from backend.models import db, Document, Event
+from backend.models import (
+    db, Document, Event, DocumentSummary, ProcessingJob, pending_schema_changes, upgrade_schema
+)
+from backend.services.job_queue import JobQueue, LeaseLost
+from backend.services.extraction_cache import ExtractionCache
+from backend.services.export_service import ExportService
+from backend.services.laytime import LaytimeEngine, LaytimeTerms, Timeline
+from backend.services.model_registry import model_registry
+from backend.services.search_index import SearchIndex
+from backend.utils.helpers import save_stream_hashed, content_addressed_path, contains_pattern
+from backend.utils.metrics import metrics
+from backend.utils.pagination import (
+    encode_cursor, decode_cursor, parse_fields, parse_limit,
+    select_fields, ndjson_response, wants_ndjson
+)
 
 try:
-    from backend.services.document_processor import DocumentProcessor
+    from backend.services.document_processor import (
+        DocumentProcessor, PageText, summarize_page_methods, text_is_final
+    )
 except ImportError:
     # Fallback document processor
     class DocumentProcessor:
-        def extract_text(self, file_path):
+        version = 'fallback'
+        
+        def __init__(self, **kwargs):
+            pass
+            
+        def extract_text(self, file_path, page_report=None):
             return "Sample extracted text from document"
+    
+    class PageText:
+        def __init__(self, **kwargs):
+            pass
+    
+    def summarize_page_methods(pages):
+        return {}
+    
+    def text_is_final(text_content, pages):
+        return False
 
 # Import the Enhanced Maritime Event Extractor
 from backend.enhanced_maritime_extractor import EnhancedMaritimeExtractor
@@ -46,45 +78,17 @@ except ImportError:
     class AIService:
         def generate_response(self, message, document):
             return f"I understand you're asking about: {message}. Based on the document analysis, I can help you with maritime operations and event timelines."
-        
-        def export_to_csv(self, document, include_confidence, include_remarks, include_metadata):
-            import tempfile
-            temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False)
-            temp_file.write("Event,Type,Start Time,End Time\n")
-            temp_file.write("Sample Event,arrival,2024-03-15 06:45,2024-03-15 07:10\n")
-            temp_file.close()
-            return temp_file.name
-        
-        def export_to_json(self, document, include_confidence, include_remarks, include_metadata):
-            import tempfile
-            import json
-            temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False)
-            data = {"events": [{"event": "Sample Event", "type": "arrival"}]}
-            json.dump(data, temp_file)
-            temp_file.close()
-            return temp_file.name
+
 
 try:
-    from backend.utils.helpers import allowed_file, get_file_hash
+    from backend.utils.helpers import allowed_file
 except ImportError:
     # Fallback helper functions
-    import hashlib
-    
     def allowed_file(filename):
         if not filename:
             return False
         allowed_extensions = {'pdf', 'doc', 'docx'}
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
-    
-    def get_file_hash(file_path):
-        try:
-            hash_sha256 = hashlib.sha256()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_sha256.update(chunk)
-            return hash_sha256.hexdigest()
-        except Exception:
-            return ""
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='frontend', static_url_path='')
@@ -95,9 +99,33 @@ db.init_app(app)
 CORS(app, origins=["http://localhost:3000", "http://127.0.0.1:5500", "*"])
 
 # Initialize services
-document_processor = DocumentProcessor()
-event_extractor = EnhancedMaritimeExtractor()  # Use the Enhanced Maritime Event Extractor
+document_processor = DocumentProcessor(
+    ocr_workers=app.config.get('OCR_WORKERS') or None,
+    ocr_dpi=app.config.get('OCR_DPI', 300)
+)
+event_extractor = EnhancedMaritimeExtractor(  # Use the Enhanced Maritime Event Extractor
+    nlp_mode=app.config.get('NLP_MODE', 'full'),
+    model_name=app.config.get('SPACY_MODEL', 'en_core_web_sm'),
+    pattern_stats=metrics.patterns if app.config.get('PATTERN_METRICS', True) else None
+)
+# The spaCy model is loaded on first use; start loading it now unless lazy
+nlp_warmup = app.config.get('NLP_WARMUP', 'background')
+if nlp_warmup in ('background', 'eager'):
+    model_registry.warmup([event_extractor.nlp_model], background=nlp_warmup == 'background')
+laytime_terms = LaytimeTerms(
+    allowed_hours=app.config.get('LAYTIME_ALLOWED_HOURS', 72.0),
+    notice_hours=app.config.get('LAYTIME_NOTICE_HOURS', 6.0),
+    demurrage_rate=app.config.get('DEMURRAGE_RATE', 0.0),
+    despatch_rate=app.config.get('DESPATCH_RATE')
+)
 ai_service = AIService()
+if hasattr(ai_service, 'laytime_engine'):
+    ai_service.laytime_engine = LaytimeEngine(laytime_terms)
+# Per-document chat retrieval indexes, built with the events at processing time
+retrieval_store = getattr(ai_service, 'retrieval', None)
+extraction_cache = ExtractionCache()
+export_service = ExportService()
+search_index = SearchIndex()
 
 # Configure logging
 logging.basicConfig(
@@ -110,9 +138,172 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create tables
-with app.app_context():
+
+def upgrade_database():
+    """Create missing tables and columns, backfill them, and build the search index"""
     db.create_all()
+    upgrade_schema()
+    search_index.ensure_schema()
+
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Upgrade the database schema; run once per deploy, before the app starts"""
+    upgrade_database()
+    click.echo("Database is up to date")
+
+
+@app.cli.command('reindex')
+def reindex_command():
+    """Rebuild the full-text search index from the processed documents"""
+    if not search_index.check_schema():
+        raise click.ClickException("No search index; run `flask --app app db-upgrade` first")
+    click.echo(f"Indexed {search_index.reindex()} documents")
+
+
+# Upgrades and backfills run from the CLI above, not here: every gunicorn
+# master and worker imports this module. Only check whether they are due.
+with app.app_context():
+    search_index.check_schema()
+    pending = pending_schema_changes()
+    if pending:
+        logger.warning(
+            f"Database schema is behind the models (missing {', '.join(pending)}); "
+            f"run `flask --app app db-upgrade`"
+        )
+
+# Fields clients can select on the list endpoints
+EVENT_FIELDS = (
+    'id', 'event', 'event_type', 'start_time', 'end_time', 'duration',
+    'location', 'remarks', 'confidence', 'start_at', 'end_at'
+)
+DOCUMENT_FIELDS = (
+    'id', 'filename', 'original_filename', 'file_size', 'status',
+    'created_at', 'processed_at', 'vessel_name', 'imo_number', 'port_name',
+    'terminal', 'berth'
+)
+
+# Stages reported by document processing jobs, in order
+PROCESSING_STAGES = ['extracting_text', 'extracting_events', 'saving_events']
+
+
+def run_document_processing(document_id, report_progress, hold_lease):
+    """
+    Extract text and events for a document; runs on a job queue worker
+    
+    Every commit of the document and its events is preceded by
+    ``hold_lease()``, so a run whose job has been reclaimed by another
+    worker rolls back instead of interleaving its writes with that worker's.
+    The extraction stages only read; the document, its events and the cache
+    entries are all written in the saving stage's one transaction.
+    """
+    document = Document.query.get(document_id)
+    if document is None:
+        raise ValueError(f"Document not found: {document_id}")
+    
+    try:
+        document.status = 'processing'
+        hold_lease()
+        db.session.commit()
+        
+        logger.info(f"Processing document: {document_id}")
+        
+        # Re-processing the same file with the same versions is a cache lookup
+        file_hash = document.file_hash
+        processor_version = document_processor.version
+        cache_status = {}
+        
+        # Extract text from document
+        report_progress('extracting_text', 0.0)
+        cached_text = extraction_cache.get_text(file_hash, processor_version)
+        if cached_text is not None:
+            text_content, page_records = cached_text
+            pages = [PageText(**record) for record in page_records]
+            cache_status['text'] = 'hit'
+        else:
+            pages = []
+            text_content = document_processor.extract_text(document.file_path, page_report=pages)
+            # An OCR failure is not cached, so re-processing retries it
+            cache_status['text'] = 'miss' if text_is_final(text_content, pages) else 'not_cached'
+        # Vessel, IMO, port, terminal and berth: once per document, not per event
+        header = event_extractor.analyze_header(text_content)
+        report_progress('extracting_text', 1.0)
+        
+        # Extract events using AI
+        report_progress('extracting_events', 0.0)
+        # Nor are events of uncached text: a retry may read different text
+        cacheable = cache_status['text'] != 'not_cached'
+        extracted_events = extraction_cache.get_events(
+            file_hash, processor_version, event_extractor.version
+        ) if cacheable else None
+        if extracted_events is not None:
+            cache_status['events'] = 'hit'
+        else:
+            extracted_events = event_extractor.extract_events(text_content)
+            cache_status['events'] = 'miss' if cacheable else 'not_cached'
+        report_progress('extracting_events', 1.0)
+        
+        # Save events to database, replacing any from an earlier run
+        report_progress('saving_events', 0.0)
+        with metrics.stage('persist_events', db.engine.dialect.name):
+            if cache_status['text'] == 'miss':
+                extraction_cache.put_text(
+                    file_hash, processor_version, text_content,
+                    [page.to_dict() for page in pages]
+                )
+            if cache_status['events'] == 'miss':
+                extraction_cache.put_events(
+                    file_hash, processor_version, event_extractor.version, extracted_events
+                )
+            document.text_content = text_content
+            document.apply_header(header)
+            Event.query.filter_by(document_id=document.id).delete(synchronize_session=False)
+            Event.bulk_insert(document.id, extracted_events)
+            DocumentSummary.rebuild(document.id, extracted_events)
+            search_index.index_document(document.id, text_content, extracted_events)
+            if retrieval_store is not None:
+                retrieval_store.index_document(document.id, text_content, extracted_events)
+            
+            # Update document status
+            document.status = 'processed'
+            document.processed_at = datetime.utcnow()
+            hold_lease()
+            db.session.commit()
+        report_progress('saving_events', 1.0)
+        
+        logger.info(f"Document processed successfully: {document_id}")
+        result = {'total_events': len(extracted_events), 'cache': cache_status}
+        if pages:
+            # Which extractor (text layer or OCR) handled each page, and the time spent
+            result['page_methods'] = summarize_page_methods(pages)
+        return result
+        
+    except LeaseLost:
+        db.session.rollback()
+        raise
+    except Exception as e:
+        logger.error(f"Processing error: {str(e)}")
+        db.session.rollback()
+        document = Document.query.get(document_id)
+        document.status = 'failed'
+        try:
+            hold_lease()
+        except LeaseLost:
+            db.session.rollback()
+            raise
+        db.session.commit()
+        raise
+
+
+def mark_abandoned(document_id):
+    """A job given up after its workers kept dying leaves the document failed"""
+    document = Document.query.get(document_id)
+    if document is not None and document.status == 'processing':
+        document.status = 'failed'
+        db.session.commit()
+
+
+job_queue = JobQueue(app, run_document_processing, on_abandoned=mark_abandoned)
 
 @app.route('/')
 def root():
@@ -125,7 +316,23 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'models': model_registry.status()
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage latency histograms and per-pattern counters in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/patterns', methods=['GET'])
+def pattern_metrics():
+    """Per-pattern hit/cost table since startup, most expensive first"""
+    limit = request.args.get('limit', type=int)
+    table = metrics.patterns.table()
+    return jsonify({
+        'patterns': table[:limit] if limit else table,
+        'enabled': event_extractor.pattern_engine.stats is not None
     })
 
 @app.route('/api/upload', methods=['POST'])
@@ -143,46 +350,48 @@ def upload_document():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Only PDF, DOC, DOCX allowed'}), 400
         
-        # Check file size (10MB limit)
-        file.seek(0, os.SEEK_END)
-        file_size = file.tell()
-        file.seek(0)
-        
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            return jsonify({'error': 'File size exceeds 10MB limit'}), 400
-        
-        # Generate unique filename
         filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        # Save file
-        file.save(file_path)
-        
-        # Calculate file hash for deduplication
-        file_hash = get_file_hash(file_path)
+        upload_folder = app.config['UPLOAD_FOLDER']
         
-        # Check if document already processed
-        existing_doc = Document.query.filter_by(file_hash=file_hash).first()
-        if existing_doc:
-            logger.info(f"Document already processed: {existing_doc.id}")
-            return jsonify({
-                'document_id': existing_doc.id,
-                'message': 'Document already processed',
-                'events': [event.to_dict() for event in existing_doc.events]
-            })
-        
-        # Create document record
-        document = Document(
-            filename=filename,
-            original_filename=file.filename,
-            file_path=file_path,
-            file_size=file_size,
-            file_hash=file_hash
-        )
+        # Stream to a temp file in large chunks, hashing in the same pass
+        try:
+            temp_path, file_hash, file_size = save_stream_hashed(
+                file.stream, upload_folder, max_size=10 * 1024 * 1024  # 10MB
+            )
+        except ValueError:
+            return jsonify({'error': 'File size exceeds 10MB limit'}), 400
         
-        db.session.add(document)
-        db.session.commit()
+        try:
+            # Check if document already processed; the duplicate is never stored
+            existing_doc = Document.query.filter_by(file_hash=file_hash).first()
+            if existing_doc:
+                logger.info(f"Document already processed: {existing_doc.id}")
+                return jsonify({
+                    'document_id': existing_doc.id,
+                    'message': 'Document already processed',
+                    'events': [event.to_dict() for event in existing_doc.events]
+                })
+            
+            # Atomically move the file to its content-addressed location
+            file_path = content_addressed_path(upload_folder, file_hash, filename)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            os.replace(temp_path, file_path)
+            
+            # Create document record
+            document = Document(
+                filename=filename,
+                original_filename=file.filename,
+                file_path=file_path,
+                file_size=file_size,
+                file_hash=file_hash
+            )
+            
+            db.session.add(document)
+            db.session.commit()
+        finally:
+            # Duplicates, and uploads that failed before (or while) being moved
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
         
         logger.info(f"Document uploaded: {document.id}")
         
@@ -200,7 +409,7 @@ def upload_document():
 @app.route('/api/process/<document_id>', methods=['POST'])
 @app.route('/api/process/<document_id>')
 def process_document(document_id):
-    """Process document and extract events"""
+    """Queue document processing and return the job to poll"""
     try:
         document = Document.query.get_or_404(document_id)
         
@@ -210,76 +419,239 @@ def process_document(document_id):
                 'events': [event.to_dict() for event in document.events]
             })
         
-        # Update status
-        document.status = 'processing'
-        db.session.commit()
-        
-        # Process document
-        logger.info(f"Processing document: {document_id}")
-        
-        # Extract text from document
-        text_content = document_processor.extract_text(document.file_path)
-        document.text_content = text_content
-        
-        # Extract events using AI
-        extracted_events = event_extractor.extract_events(text_content)
-        
-        # Save events to database
-        for event_data in extracted_events:
-            event = Event(
-                document_id=document.id,
-                event_type=event_data['event_type'],
-                event_name=event_data['event'],
-                start_time=event_data.get('start_time'),
-                end_time=event_data.get('end_time'),
-                duration=event_data.get('duration'),
-                location=event_data.get('location'),
-                remarks=event_data.get('remarks'),
-                confidence=event_data.get('confidence', 0.0)
-            )
-            db.session.add(event)
-        
-        # Update document status
-        document.status = 'processed'
-        document.processed_at = datetime.utcnow()
-        db.session.commit()
-        
-        logger.info(f"Document processed successfully: {document_id}")
+        job = job_queue.enqueue(document.id, PROCESSING_STAGES)
         
         return jsonify({
-            'message': 'Document processed successfully',
-            'events': extracted_events,  # Return newly extracted events instead of cached ones
-            'total_events': len(extracted_events)
-        })
+            'message': 'Document queued for processing',
+            'document_id': document.id,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f"/api/jobs/{job.id}"
+        }), 202
         
     except Exception as e:
         logger.error(f"Processing error: {str(e)}")
-        document.status = 'failed'
-        db.session.commit()
         return jsonify({'error': 'Processing failed'}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get background job status and per-stage progress"""
+    try:
+        job = ProcessingJob.query.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job.to_dict())
+        
+    except Exception as e:
+        logger.error(f"Get job error: {str(e)}")
+        return jsonify({'error': 'Failed to retrieve job'}), 500
+
 @app.route('/api/documents/<document_id>/events', methods=['GET'])
 def get_events(document_id):
-    """Get extracted events for a document"""
+    """
+    Get extracted events for a document
+    
+    Query args: type, fields (e.g. fields=event,start_at to omit remarks),
+    limit/cursor for keyset pages, format=ndjson to stream every event.
+    Without limit/cursor all events are returned in one JSON response.
+    """
     try:
         document = Document.query.get_or_404(document_id)
         
+        try:
+            fields = parse_fields(request.args.get('fields'), EVENT_FIELDS)
+            cursor = request.args.get('cursor')
+            paginate = cursor is not None or 'limit' in request.args
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Filter by event type if specified
         event_type = request.args.get('type')
-        events = document.events
+        query = Event.query.filter_by(document_id=document.id)
         
         if event_type and event_type != 'all':
-            events = [e for e in events if e.event_type == event_type]
+            query = query.filter_by(event_type=event_type)
         
+        # Don't load the remarks blobs unless they are returned
+        include_remarks = fields is None or 'remarks' in fields
+        if not include_remarks:
+            query = query.options(db.defer(Event.remarks))
+        
+        query = query.order_by(Event.sequence, Event.id)
+        serialize = lambda event: select_fields(event.to_dict(include_remarks), fields)
+        
+        if wants_ndjson(request):
+            return ndjson_response(query.yield_per(500), serialize)
+        
+        if not paginate:
+            events = query.all()
+            return jsonify({
+                'events': [serialize(event) for event in events],
+                'total': len(events)
+            })
+        
+        if cursor:
+            try:
+                last_sequence, last_id = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            query = query.filter(db.or_(
+                Event.sequence > last_sequence,
+                db.and_(Event.sequence == last_sequence, Event.id > last_id)
+            ))
+        
+        events = query.limit(limit + 1).all()
+        page = events[:limit]
         return jsonify({
-            'events': [event.to_dict() for event in events],
-            'total': len(events)
+            'events': [serialize(event) for event in page],
+            'total': len(page),
+            'next_cursor': (
+                encode_cursor([page[-1].sequence, page[-1].id])
+                if len(events) > limit else None
+            )
         })
         
     except Exception as e:
         logger.error(f"Get events error: {str(e)}")
         return jsonify({'error': 'Failed to retrieve events'}), 500
 
+@app.route('/api/events', methods=['GET'])
+def search_events():
+    """Query events across documents by type, location and time range"""
+    try:
+        query = Event.query
+        
+        event_type = request.args.get('type')
+        if event_type and event_type != 'all':
+            query = query.filter(Event.event_type == event_type)
+        
+        # Most events (NOR in particular) carry no location of their own;
+        # match the document's port as well
+        location = request.args.get('location')
+        if location:
+            pattern = contains_pattern(location)
+            query = query.join(Document, Event.document_id == Document.id).filter(db.or_(
+                Event.location.ilike(pattern, escape='\\'),
+                Document.port_name.ilike(pattern, escape='\\')
+            ))
+        
+        # Time range on the normalized start timestamp, as ISO dates/datetimes
+        try:
+            start_from = request.args.get('from')
+            start_to = request.args.get('to')
+            if start_from:
+                query = query.filter(Event.start_at >= datetime.fromisoformat(start_from))
+            if start_to:
+                query = query.filter(Event.start_at < datetime.fromisoformat(start_to))
+        except ValueError:
+            return jsonify({'error': 'from/to must be ISO dates, e.g. 2024-03-01'}), 400
+        
+        limit = max(1, min(request.args.get('limit', 500, type=int), 5000))
+        # Undated events last (SQLite sorts NULLs first), in document order
+        events = query.order_by(
+            Event.start_at.is_(None), Event.start_at, Event.sequence
+        ).limit(limit).all()
+        
+        return jsonify({
+            'events': [dict(event.to_dict(), document_id=event.document_id) for event in events],
+            'total': len(events)
+        })
+        
+    except Exception as e:
+        logger.error(f"Search events error: {str(e)}")
+        return jsonify({'error': 'Failed to retrieve events'}), 500
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """
+    Full-text search across all documents' text and event remarks
+    
+    Query args: q (words, "quoted phrases", OR), type=document|event,
+    limit/cursor for keyset pages. Results are ranked best first, one per
+    document (its best-matching text or event), with matched terms in the
+    snippet wrapped in <mark> tags.
+    """
+    try:
+        if not search_index.available:
+            return jsonify({'error': 'Full-text search is not available on this database'}), 503
+        
+        query_text = (request.args.get('q') or '').strip()
+        if not query_text:
+            return jsonify({'error': 'q is required'}), 400
+        
+        kind = request.args.get('type')
+        if kind == 'all':
+            kind = None
+        
+        try:
+            limit = parse_limit(request.args.get('limit'), default=20)
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+            with metrics.stage('search', db.engine.dialect.name):
+                rows, has_more = search_index.search(query_text, limit, after, kind)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Name the documents and events the hits belong to
+        document_ids = {row['document_id'] for row in rows}
+        documents = {
+            document.id: document
+            for document in Document.query.filter(Document.id.in_(document_ids)).options(
+                db.load_only(Document.id, Document.original_filename, Document.vessel_name)
+            )
+        } if document_ids else {}
+        event_keys = {(row['document_id'], row['sequence']) for row in rows if row['kind'] == 'event'}
+        events = {}
+        if event_keys:
+            event_query = Event.query.filter(
+                Event.document_id.in_({key[0] for key in event_keys}),
+                Event.sequence.in_({key[1] for key in event_keys})
+            ).options(db.defer(Event.remarks))
+            events = {
+                (event.document_id, event.sequence): event
+                for event in event_query
+                if (event.document_id, event.sequence) in event_keys
+            }
+        
+        results = []
+        for row in rows:
+            document = documents.get(row['document_id'])
+            result = {
+                'type': row['kind'],
+                'document_id': row['document_id'],
+                'filename': document.original_filename if document else None,
+                'vessel_name': document.vessel_name if document else None,
+                # Unrounded: bm25 scores of common terms differ only in
+                # their last digits
+                'score': row['score'],
+                'matches': row['matches'],
+                'snippet': row['snippet']
+            }
+            event = events.get((row['document_id'], row['sequence']))
+            if event is not None:
+                result['event'] = {
+                    'id': event.id,
+                    'event': event.event_name,
+                    'event_type': event.event_type,
+                    'start_time': event.start_time,
+                    'start_at': event.start_at.isoformat() if event.start_at else None
+                }
+            results.append(result)
+        
+        return jsonify({
+            'query': query_text,
+            'results': results,
+            'total': len(results),
+            'next_cursor': (
+                encode_cursor([rows[-1]['score'], rows[-1]['id']]) if has_more else None
+            )
+        })
+        
+    except Exception as e:
+        logger.error(f"Search error: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+
 @app.route('/api/chat', methods=['POST'])
 @app.route('/api/chat')
 def chat():
@@ -296,6 +668,8 @@ def chat():
         document = None
         if document_id:
             document = Document.query.get(document_id)
+            if document is not None and document.status == 'processed':
+                DocumentSummary.for_document(document)
         
         # Generate AI response
         response = ai_service.generate_response(message, document)
@@ -314,7 +688,7 @@ def chat():
 @app.route('/api/export/<document_id>/<format>', methods=['GET'])
 @app.route('/api/export/<document_id>/<format>')
 def export_data(document_id, format):
-    """Export document events in CSV or JSON format"""
+    """Export document events in CSV or JSON format, streamed to the client"""
     try:
         document = Document.query.get_or_404(document_id)
         
@@ -323,70 +697,267 @@ def export_data(document_id, format):
         include_remarks = request.args.get('remarks', 'true').lower() == 'true'
         include_metadata = request.args.get('metadata', 'false').lower() == 'true'
         
+        if format.lower() not in ('csv', 'json'):
+            return jsonify({'error': 'Invalid format. Use csv or json'}), 400
+        
+        events = Event.query.filter_by(document_id=document.id).order_by(Event.sequence)
+        if not include_remarks:
+            events = events.options(db.defer(Event.remarks))
+        events = events.yield_per(500)
+        
         if format.lower() == 'csv':
-            file_path = ai_service.export_to_csv(
-                document, include_confidence, include_remarks, include_metadata
+            chunks = export_service.iter_document_csv(
+                document, events, include_confidence, include_remarks, include_metadata
             )
-            return send_file(file_path, as_attachment=True, download_name=f"{document.original_filename}_events.csv")
-        
-        elif format.lower() == 'json':
-            file_path = ai_service.export_to_json(
-                document, include_confidence, include_remarks, include_metadata
+            mimetype = 'text/csv'
+        else:
+            chunks = export_service.iter_document_json(
+                document, events, include_confidence, include_remarks, include_metadata
             )
-            return send_file(file_path, as_attachment=True, download_name=f"{document.original_filename}_events.json")
+            mimetype = 'application/json'
         
-        else:
-            return jsonify({'error': 'Invalid format. Use csv or json'}), 400
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers=export_service.attachment_headers(
+                f"{document.original_filename}_events.{format.lower()}"
+            )
+        )
             
     except Exception as e:
         logger.error(f"Export error: {str(e)}")
         return jsonify({'error': 'Export failed'}), 500
 
+@app.route('/api/export/bulk/<format>', methods=['GET'])
+def export_bulk(format):
+    """
+    Stream events of many documents as CSV or NDJSON
+    
+    Query args: from/to (ISO dates, on the event start), type, vessel
+    (part of the document's vessel name; documents without one, e.g.
+    processed before header metadata was stored, match on their text),
+    remarks, confidence.
+    """
+    try:
+        include_confidence = request.args.get('confidence', 'true').lower() == 'true'
+        include_remarks = request.args.get('remarks', 'false').lower() == 'true'
+        
+        if format.lower() not in ('csv', 'ndjson'):
+            return jsonify({'error': 'Invalid format. Use csv or ndjson'}), 400
+        
+        query = db.session.query(Event, Document).join(
+            Document, Event.document_id == Document.id
+        ).filter(Document.status == 'processed').options(
+            db.defer(Document.text_content)
+        )
+        if not include_remarks:
+            query = query.options(db.defer(Event.remarks))
+        
+        try:
+            start_from = request.args.get('from')
+            start_to = request.args.get('to')
+            if start_from:
+                query = query.filter(Event.start_at >= datetime.fromisoformat(start_from))
+            if start_to:
+                query = query.filter(Event.start_at < datetime.fromisoformat(start_to))
+        except ValueError:
+            return jsonify({'error': 'from/to must be ISO dates, e.g. 2024-03-01'}), 400
+        
+        event_type = request.args.get('type')
+        if event_type and event_type != 'all':
+            query = query.filter(Event.event_type == event_type)
+        
+        vessel = request.args.get('vessel')
+        if vessel:
+            pattern = contains_pattern(vessel)
+            query = query.filter(db.or_(
+                Document.vessel_name.ilike(pattern, escape='\\'),
+                db.and_(
+                    Document.vessel_name.is_(None),
+                    Document.text_content.ilike(pattern, escape='\\')
+                )
+            ))
+        
+        rows = query.order_by(Event.document_id, Event.sequence).yield_per(1000)
+        
+        if format.lower() == 'csv':
+            chunks = export_service.iter_bulk_csv(rows, include_confidence, include_remarks)
+            mimetype = 'text/csv'
+        else:
+            chunks = export_service.iter_bulk_ndjson(rows, include_confidence, include_remarks)
+            mimetype = 'application/x-ndjson'
+        
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers=export_service.attachment_headers(f"events_export.{format.lower()}")
+        )
+        
+    except Exception as e:
+        logger.error(f"Bulk export error: {str(e)}")
+        return jsonify({'error': 'Export failed'}), 500
+
+def parse_export_watermark(since):
+    """
+    Read a columnar export's ``since``: the watermark header of an earlier
+    export, or a plain ISO datetime
+    
+    Returns:
+        (processed_at, ids of documents already exported in the overlap
+        before it, or None for a plain datetime)
+    
+    Raises:
+        ValueError: If it is neither
+    """
+    try:
+        return datetime.fromisoformat(since), None
+    except ValueError:
+        pass
+    values = decode_cursor(since)
+    if len(values) != 2 or not isinstance(values[0], str) or not isinstance(values[1], list):
+        raise ValueError("Invalid watermark")
+    return datetime.fromisoformat(values[0]), values[1]
+
+@app.route('/api/export/columnar/<format>', methods=['GET'])
+def export_columnar(format):
+    """
+    Export the event store joined with document metadata as Parquet or Arrow
+    
+    Query args: since (the X-Export-Watermark of the previous export, or an
+    ISO processed_at; only documents processed after it are exported),
+    remarks.
+    
+    ``processed_at`` is set before a document's commit, so a document can
+    become visible after an export whose watermark is later than its
+    ``processed_at``. The watermark therefore carries the ids of the
+    documents it covers within ``EXPORT_WATERMARK_OVERLAP`` seconds before
+    it; the next export re-reads that overlap and skips those ids.
+    """
+    try:
+        if format.lower() not in ('parquet', 'arrow'):
+            return jsonify({'error': 'Invalid format. Use parquet or arrow'}), 400
+        
+        include_remarks = request.args.get('remarks', 'false').lower() == 'true'
+        overlap = timedelta(seconds=app.config.get('EXPORT_WATERMARK_OVERLAP', 300))
+        
+        processed = Document.query.filter(Document.status == 'processed')
+        documents = processed
+        since = request.args.get('since')
+        since_at = None
+        if since:
+            try:
+                since_at, exported = parse_export_watermark(since)
+            except ValueError:
+                return jsonify({'error': 'since must be an X-Export-Watermark value or an ISO datetime'}), 400
+            if exported is None:
+                documents = documents.filter(Document.processed_at > since_at)
+            else:
+                documents = documents.filter(
+                    Document.processed_at > since_at - overlap,
+                    Document.id.notin_(exported)
+                )
+        
+        # Fix the upper bound first so documents finishing mid-export are
+        # left for the next run instead of being skipped
+        latest = documents.with_entities(db.func.max(Document.processed_at)).scalar()
+        if latest is None:
+            watermark = since
+        else:
+            # A late commit can sit behind the previous watermark; never
+            # move it back or the documents after it are sent again
+            if since_at is not None:
+                latest = max(latest, since_at)
+            # Everything visible in the overlap now: exported by this run or
+            # an earlier one. Later commits in the overlap are not listed,
+            # so the next run picks them up
+            window = [
+                document_id for (document_id,) in processed.filter(
+                    Document.processed_at > latest - overlap,
+                    Document.processed_at <= latest
+                ).with_entities(Document.id)
+            ]
+            documents = documents.filter(
+                Document.processed_at <= latest,
+                db.or_(Document.processed_at <= latest - overlap, Document.id.in_(window))
+            )
+            watermark = encode_cursor([latest.isoformat(), sorted(window)])
+        
+        query = db.session.query(Event, Document).join(
+            Document, Event.document_id == Document.id
+        ).filter(
+            Document.id.in_(documents.with_entities(Document.id))
+        ).options(db.defer(Document.text_content))
+        if not include_remarks:
+            query = query.options(db.defer(Event.remarks))
+        rows = query.order_by(Event.document_id, Event.sequence).yield_per(5000)
+        
+        try:
+            chunks = export_service.iter_columnar(rows, format.lower(), include_remarks)
+            first_chunk = next(chunks)
+        except ImportError as e:
+            return jsonify({'error': str(e)}), 501
+        
+        def generate():
+            yield first_chunk
+            yield from chunks
+        
+        extension = 'parquet' if format.lower() == 'parquet' else 'arrow'
+        headers = export_service.attachment_headers(f"events_export.{extension}")
+        if watermark:
+            headers['X-Export-Watermark'] = watermark
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype=(
+                'application/vnd.apache.parquet' if extension == 'parquet'
+                else 'application/vnd.apache.arrow.file'
+            ),
+            headers=headers
+        )
+        
+    except Exception as e:
+        logger.error(f"Columnar export error: {str(e)}")
+        return jsonify({'error': 'Export failed'}), 500
+
 @app.route('/api/documents/<document_id>/summary', methods=['GET'])
 def get_summary(document_id):
     """Get document processing summary and statistics"""
     try:
-        document = Document.query.get_or_404(document_id)
+        row = db.session.query(Document, DocumentSummary).outerjoin(
+            DocumentSummary, DocumentSummary.document_id == Document.id
+        ).options(
+            db.defer(Document.text_content)
+        ).filter(Document.id == document_id).first()
+        if row is None:
+            return jsonify({'error': 'Document not found'}), 404
+        document, stats = row
         
         if document.status != 'processed':
             return jsonify({'error': 'Document not yet processed'}), 400
         
-        # Calculate statistics
-        events = document.events
-        event_types = {}
-        total_duration = 0
-        
-        for event in events:
-            event_type = event.event_type
-            event_types[event_type] = event_types.get(event_type, 0) + 1
-            
-            # Calculate duration if available
-            if event.duration:
-                try:
-                    # Parse duration (assuming format like "1:30:00")
-                    parts = event.duration.split(':')
-                    if len(parts) == 3:
-                        hours = int(parts[0])
-                        minutes = int(parts[1])
-                        total_duration += hours * 60 + minutes
-                except:
-                    pass
+        if stats is None:
+            # Processed before summaries were kept; built once, then stored
+            stats = DocumentSummary.for_document(document)
+        stats = stats.to_dict()
         
         summary = {
             'document_info': {
                 'filename': document.original_filename,
                 'size': document.file_size,
                 'processed_at': document.processed_at.isoformat() if document.processed_at else None,
-                'total_events': len(events)
+                'total_events': stats['total_events']
             },
             'statistics': {
-                'event_distribution': event_types,
-                'total_duration_minutes': total_duration,
-                'average_confidence': sum(e.confidence for e in events) / len(events) if events else 0
+                'event_distribution': stats['event_distribution'],
+                'total_duration_minutes': stats['total_duration_minutes'],
+                'average_confidence': stats['average_confidence'],
+                'loading_hours': stats['loading_hours'],
+                'weather_delays': stats['weather_delays'],
+                'weather_delay_hours': stats['weather_delay_hours']
             },
             'timeline': {
-                'first_event': events[0].start_time if events else None,
-                'last_event': events[-1].end_time or events[-1].start_time if events else None
+                'first_event': stats['first_event'],
+                'last_event': stats['last_event']
             }
         }
         
@@ -396,14 +967,156 @@ def get_summary(document_id):
         logger.error(f"Summary error: {str(e)}")
         return jsonify({'error': 'Failed to generate summary'}), 500
 
+@app.route('/api/documents/<document_id>/laytime', methods=['GET'])
+def get_laytime(document_id):
+    """
+    Laytime, demurrage and despatch for one processed document
+    
+    Query args: allowed_hours, notice_hours, demurrage_rate, despatch_rate
+    (override the configured charter terms).
+    """
+    try:
+        document = Document.query.get(document_id)
+        if document is None:
+            return jsonify({'error': 'Document not found'}), 404
+        
+        if document.status != 'processed':
+            return jsonify({'error': 'Document not yet processed'}), 400
+        
+        terms = laytime_terms_from_request()
+        if terms is None:
+            return jsonify({'error': 'Laytime terms must be numbers'}), 400
+        
+        rows = db.session.query(
+            Event.event_name, Event.event_type, Event.start_at, Event.end_at
+        ).filter(Event.document_id == document.id).all()
+        
+        return jsonify(LaytimeEngine(terms).compute_document(rows, document.id))
+        
+    except Exception as e:
+        logger.error(f"Laytime error: {str(e)}")
+        return jsonify({'error': 'Failed to calculate laytime'}), 500
+
+@app.route('/api/reports/demurrage', methods=['GET'])
+def demurrage_report():
+    """
+    Demurrage exposure across processed documents
+    
+    Query args: from/to (ISO dates; documents with any event starting in the
+    range are included with their whole timeline) and the laytime term
+    overrides accepted by the per-document endpoint.
+    """
+    try:
+        terms = laytime_terms_from_request()
+        if terms is None:
+            return jsonify({'error': 'Laytime terms must be numbers'}), 400
+        
+        documents = db.session.query(Event.document_id).join(
+            Document, Event.document_id == Document.id
+        ).filter(Document.status == 'processed')
+        
+        try:
+            start_from = request.args.get('from')
+            start_to = request.args.get('to')
+            if start_from:
+                documents = documents.filter(Event.start_at >= datetime.fromisoformat(start_from))
+            if start_to:
+                documents = documents.filter(Event.start_at < datetime.fromisoformat(start_to))
+        except ValueError:
+            return jsonify({'error': 'from/to must be ISO dates, e.g. 2024-03-01'}), 400
+        
+        # Only the columns laytime depends on, one document after another
+        rows = db.session.query(
+            Event.document_id, Event.event_name, Event.event_type, Event.start_at, Event.end_at
+        ).filter(
+            Event.document_id.in_(documents.distinct())
+        ).order_by(Event.document_id).yield_per(5000)
+        
+        timelines = [
+            Timeline.from_events(events, document_id)
+            for document_id, events in groupby(rows, key=lambda row: row.document_id)
+        ]
+        
+        return jsonify(LaytimeEngine(terms).portfolio_report(timelines))
+        
+    except Exception as e:
+        logger.error(f"Demurrage report error: {str(e)}")
+        return jsonify({'error': 'Failed to generate demurrage report'}), 500
+
+def laytime_terms_from_request():
+    """Configured laytime terms with any overrides from the query string; None if invalid"""
+    overrides = {}
+    for name in ('allowed_hours', 'notice_hours', 'demurrage_rate', 'despatch_rate'):
+        value = request.args.get(name)
+        if value is None:
+            continue
+        try:
+            overrides[name] = float(value)
+        except ValueError:
+            return None
+    
+    if not overrides:
+        return laytime_terms
+    defaults = laytime_terms.to_dict()
+    if 'demurrage_rate' in overrides and 'despatch_rate' not in overrides \
+            and app.config.get('DESPATCH_RATE') is None:
+        # Let despatch follow the new demurrage rate (half) as it does by default
+        defaults.pop('despatch_rate')
+    defaults.update(overrides)
+    return LaytimeTerms(**defaults)
+
 @app.route('/api/documents', methods=['GET'])
 def list_documents():
-    """List all processed documents"""
+    """
+    List documents, newest first
+    
+    Query args: fields, limit/cursor for keyset pages, format=ndjson to
+    stream every document. Without limit/cursor all documents are returned.
+    """
     try:
-        documents = Document.query.order_by(Document.created_at.desc()).all()
+        try:
+            fields = parse_fields(request.args.get('fields'), DOCUMENT_FIELDS)
+            cursor = request.args.get('cursor')
+            paginate = cursor is not None or 'limit' in request.args
+            limit = parse_limit(request.args.get('limit'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = Document.query.options(db.defer(Document.text_content)).order_by(
+            Document.created_at.desc(), Document.id.desc()
+        )
+        serialize = lambda doc: select_fields(doc.to_dict(), fields)
+        
+        if wants_ndjson(request):
+            return ndjson_response(query.yield_per(500), serialize)
+        
+        if not paginate:
+            documents = query.all()
+            return jsonify({
+                'documents': [serialize(doc) for doc in documents],
+                'total': len(documents)
+            })
+        
+        if cursor:
+            try:
+                last_created, last_id = decode_cursor(cursor)
+                last_created = datetime.fromisoformat(last_created)
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query = query.filter(db.or_(
+                Document.created_at < last_created,
+                db.and_(Document.created_at == last_created, Document.id < last_id)
+            ))
+        
+        documents = query.limit(limit + 1).all()
+        page = documents[:limit]
         return jsonify({
-            'documents': [doc.to_dict() for doc in documents],
-            'total': len(documents)
+            'documents': [serialize(doc) for doc in page],
+            'total': len(page),
+            'next_cursor': (
+                encode_cursor([page[-1].created_at.isoformat(), page[-1].id])
+                if len(documents) > limit else None
+            )
         })
     except Exception as e:
         logger.error(f"List documents error: {str(e)}")
@@ -418,6 +1131,10 @@ def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
+    # The development server upgrades its database itself
+    with app.app_context():
+        upgrade_database()
+    
     # Use PORT environment variable for Render deployment
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
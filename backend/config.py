@@ -21,6 +21,39 @@ class Config:
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
     
+    # NLP settings ('full' loads the whole pipeline; 'lean', opt-in, only senter + NER)
+    SPACY_MODEL = os.environ.get('SPACY_MODEL', 'en_core_web_sm')
+    NLP_MODE = os.environ.get('NLP_MODE', 'full')
+    # When to load the model: 'background' (warmup thread at startup), 'eager'
+    # (before serving; with gunicorn preload_app) or 'lazy' (first document)
+    NLP_WARMUP = os.environ.get('NLP_WARMUP', 'background')
+    
+    # OCR settings (OCR_WORKERS=0 uses one worker per core)
+    OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 0))
+    OCR_DPI = int(os.environ.get('OCR_DPI', 300))
+    
+    # Metrics: per-pattern hit/cost counters on /metrics (small per-document overhead)
+    PATTERN_METRICS = os.environ.get('PATTERN_METRICS', 'true').lower() == 'true'
+    
+    # Background processing
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2.0))
+    # A running job whose worker sent no heartbeat for this long is requeued,
+    # or failed after JOB_MAX_ATTEMPTS claims
+    JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 300))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    
+    # Incremental columnar exports re-read documents processed this long
+    # before the previous watermark (processed_at is set before commit, on
+    # each worker's clock), skipping the ones that export already sent
+    EXPORT_WATERMARK_OVERLAP = float(os.environ.get('EXPORT_WATERMARK_OVERLAP', 300))
+    
+    # Laytime terms used when a request does not give its own (rates per day)
+    LAYTIME_ALLOWED_HOURS = float(os.environ.get('LAYTIME_ALLOWED_HOURS', 72))
+    LAYTIME_NOTICE_HOURS = float(os.environ.get('LAYTIME_NOTICE_HOURS', 6))
+    DEMURRAGE_RATE = float(os.environ.get('DEMURRAGE_RATE', 0))
+    DESPATCH_RATE = float(os.environ['DESPATCH_RATE']) if os.environ.get('DESPATCH_RATE') else None
+    
     # CORS settings
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000,http://127.0.0.1:5500').split(',')
     
@@ -4,31 +4,376 @@ Enhanced Maritime Event Extractor
 Advanced NLP-based event extraction with comprehensive maritime keyword patterns
 """
 
+import os
 import re
+import json
+import hashlib
 import logging
-from typing import List, Dict, Any, Tuple
-from datetime import datetime
-import spacy
+import importlib.util
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Optional
+from datetime import datetime, timedelta
 from collections import defaultdict
 
+try:
+    from backend.pattern_engine import PatternEngine
+    from backend.services.model_registry import model_registry
+    from backend.utils.datetime_parser import parse_parts
+    from backend.utils.helpers import extract_imo_number
+    from backend.utils.metrics import metrics
+except ImportError:
+    from pattern_engine import PatternEngine
+    from services.model_registry import model_registry
+    from utils.datetime_parser import parse_parts
+    from utils.helpers import extract_imo_number
+    from utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# Group classifiers used when turning a match into a structured event
+TIME_GROUP_RE = re.compile(r'^\d{1,2}:\d{2}$|^\d{4}$')
+DATE_GROUP_RE = re.compile(r'^\d{1,2}[\.\/\-]\d{1,2}[\.\/\-]\d{4}$')
+LOCATION_GROUP_RE = re.compile(r'^[A-Za-z\s]+$')
+DATE_SEPARATOR_RE = re.compile(r'[\.\/\-]')
+WORD_RE = re.compile(r'\S+')
+PAGE_MARKER_RE = re.compile(r'^--- Page \d+ ---$', re.MULTILINE)
+
+# A delay period on the line of a weather match: "11:00 - 13:00",
+# "1410- 1810 HRS", "0800 TO 1000 HRS 31/08/2025"
+PERIOD_RE = re.compile(
+    r'\b(\d{1,2}:?\d{2})\s*(?:hrs?|lt)?\s*(?:-|–|to|till|until)\s*(\d{1,2}:?\d{2})\b'
+    r'(?:\s*(?:hrs?|lt)\b)?(?:\s*(?:on\s+)?(\d{1,2}[\.\/\-]\d{1,2}[\.\/\-]\d{4}))?',
+    re.IGNORECASE
+)
+
+# Document header fields, tried in order; the first long enough value wins
+HEADER_PATTERNS = {
+    'vessel_name': [
+        re.compile(r'(?i)vessel\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|IMO|FLAG)'),
+        re.compile(r'(?i)name\s+of\s+the\s+vessel\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|IMO|FLAG)'),
+        re.compile(r'(?i)mv\.?\s+([A-Za-z\s\.\-]+?)(?:\n|$|IMO|FLAG)'),
+    ],
+    'port_name': [
+        re.compile(r'(?i)port\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|TERMINAL|BERTH)'),
+        re.compile(r'(?i)port\s+of\s+(?:loading|discharge)\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|TERMINAL|BERTH)'),
+    ],
+    'terminal': [
+        re.compile(r'(?i)terminal\s*[:=]\s*([A-Za-z0-9\s\.\-]+?)(?:\n|$|BERTH)'),
+    ],
+    'berth': [
+        re.compile(r'(?i)berth\s*(?:no\.?)?\s*[:=]\s*([A-Za-z0-9\.\-/ ]+?)[ \t]*(?:\n|$)', re.MULTILINE),
+    ],
+}
+HEADER_FIELDS = ('vessel_name', 'imo_number', 'port_name', 'terminal', 'berth')
+HEADER_MIN_LENGTH = {'vessel_name': 3, 'port_name': 3}
+
+# DocumentProcessor joins page blocks with this separator
+PAGE_SEPARATOR = '\n\n'
+
+# Streaming extraction: characters held back at the end of each chunk until
+# the next page arrives (a match plus its 1000-character remarks window), and
+# characters of settled text kept as left context for the next chunk
+STREAM_LOOKAHEAD = 1500
+STREAM_LOOKBEHIND = 1200
+
+# Bump when a change to extraction code should invalidate cached events; the
+# pattern set is fingerprinted separately
+EXTRACTOR_VERSION = '6'
+
+# Event type whose matches take a delay period from their line
+WEATHER_TYPE = 'weather'
+
+# Pipeline components _extract_with_nlp never reads (it only uses doc.sents
+# and doc.ents); lean mode excludes them and splits sentences with senter
+LEAN_NLP_EXCLUDE = ['tagger', 'parser', 'attribute_ruler', 'lemmatizer']
+NLP_MODES = ('full', 'lean')
+
+
+def spacy_model_available(model_name: str) -> bool:
+    """Whether spaCy and the model package (or model directory) are installed, without importing them"""
+    if importlib.util.find_spec('spacy') is None:
+        return False
+    if os.path.isdir(model_name):
+        return True
+    try:
+        return importlib.util.find_spec(model_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def iter_page_blocks(text: str) -> Iterator[str]:
+    """Split DocumentProcessor output back into its ``--- Page N ---`` blocks"""
+    starts = [match.start() for match in PAGE_MARKER_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        block = text[start:end].rstrip('\n')
+        if block:
+            yield block
+
+
+def parse_event_time(time_str: Optional[str], date_str: Optional[str]) -> Optional[datetime]:
+    """
+    Parse a matched time ("0800"/"08:00") and date ("31/08/2025") into a datetime
+    
+    SoF dates are day-first; a date whose month field is over 12 is read as
+    month-first. "2400" is midnight at the end of the day. SoF times give port
+    local time without a zone, so the result is naive and stored as-is.
+    Documents repeat the same dates, so parsing goes through the cached
+    tokenizer in ``datetime_parser``.
+    
+    Returns:
+        The datetime (midnight if there is no time), or None without a valid date
+    """
+    if not date_str:
+        return None
+    parts = parse_parts(f"{time_str} {date_str}" if time_str else date_str)
+    if parts is None or parts.year is None or (time_str and parts.hour is None):
+        return None
+    try:
+        parsed = datetime(parts.year, parts.month, parts.day)
+    except ValueError:
+        return None
+    if parts.hour == 24:
+        return parsed + timedelta(days=1)
+    if parts.hour is not None:
+        parsed = parsed.replace(hour=parts.hour, minute=parts.minute)
+    return parsed
+
+
+def parse_period(line: str) -> Optional[Tuple[str, str, Optional[str], int]]:
+    """
+    Find a delay period ("11:00 - 13:00", "1410-1810 HRS") on an SoF line
+    
+    A period ending at or before its start runs past midnight.
+    
+    Returns:
+        (start "HH:MM", end "HH:MM", date or None, length in minutes), or
+        None if the line has no valid period
+    """
+    match = PERIOD_RE.search(line)
+    if not match:
+        return None
+    clocks = []
+    for value in match.group(1, 2):
+        hours, minutes = int(value[:-2].rstrip(':')), int(value[-2:])
+        if hours > 24 or minutes > 59 or (hours == 24 and minutes):
+            return None
+        clocks.append((hours, minutes))
+    (start_hours, start_minutes), (end_hours, end_minutes) = clocks
+    length = (end_hours * 60 + end_minutes - start_hours * 60 - start_minutes) % (24 * 60)
+    if not length:
+        return None
+    return (f"{start_hours:02d}:{start_minutes:02d}", f"{end_hours:02d}:{end_minutes:02d}",
+            match.group(3), length)
+
+
+def analyze_header(text: str) -> Dict[str, Optional[str]]:
+    """
+    Document-level metadata: vessel, IMO number, port, terminal and berth
+    
+    These are constant per document, so they are read once per document
+    (and stored on it) rather than attached to every event.
+    
+    Returns:
+        A value (or None) for each of ``HEADER_FIELDS``
+    """
+    header = {field: None for field in HEADER_FIELDS}
+    if not text:
+        return header
+    for field, patterns in HEADER_PATTERNS.items():
+        for pattern in patterns:
+            match = pattern.search(text)
+            if match and len(match.group(1).strip()) >= HEADER_MIN_LENGTH.get(field, 1):
+                header[field] = match.group(1).strip()
+                break
+    header['imo_number'] = extract_imo_number(text)
+    return header
+
+
+class RemarksSpan:
+    """Lazy remarks: character offsets into the document, joined into a string on demand"""
+    
+    __slots__ = ('text', 'start', 'end', 'leading', 'trailing')
+    
+    def __init__(self, text: str, start: int, end: int, leading: bool, trailing: bool):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.leading = leading
+        self.trailing = trailing
+    
+    def __str__(self) -> str:
+        context = ' '.join(self.text[self.start:self.end].split())
+        if self.leading:
+            context = f"... {context}"
+        if self.trailing:
+            context = f"{context} ..."
+        return context
+
+
+class EventRecord:
+    """
+    One extracted event
+    
+    Slotted rather than a dict, since reprocessing an archive holds every
+    event of a document (of a whole batch in ``extract_events_batch``) at
+    once. Attribute names follow the ``Event`` columns, so records go to the
+    database and the summary as they are; ``to_dict``/``from_dict`` convert
+    at the API and cache boundary.
+    """
+    
+    __slots__ = ('event_type', 'event_name', 'confidence', 'start_time', 'start_at',
+                 'end_time', 'end_at', 'duration', 'location', 'remarks', 'raw_match',
+                 'time_raw', 'date_raw', 'extraction_method')
+    
+    def __init__(self, event_type: str, event_name: str, confidence: float,
+                 start_time: Optional[str] = None, start_at: Optional[datetime] = None,
+                 location: Optional[str] = None, remarks=None, raw_match: Optional[str] = None,
+                 time_raw: Optional[str] = None, date_raw: Optional[str] = None,
+                 extraction_method: str = 'pattern_matching', end_time: Optional[str] = None,
+                 end_at: Optional[datetime] = None, duration: Optional[str] = None):
+        self.event_type = event_type
+        self.event_name = event_name
+        self.confidence = confidence
+        self.start_time = start_time
+        self.start_at = start_at
+        self.end_time = end_time
+        self.end_at = end_at
+        self.duration = duration  # 'H:MM'
+        self.location = location
+        self.remarks = remarks  # str, or a RemarksSpan until materialized
+        self.raw_match = raw_match
+        self.time_raw = time_raw
+        self.date_raw = date_raw
+        self.extraction_method = extraction_method
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'event_type': self.event_type,
+            'event': self.event_name,
+            'confidence': self.confidence,
+            'start_time': self.start_time,
+            'start_at': self.start_at.isoformat() if self.start_at else None,
+            'end_time': self.end_time,
+            'end_at': self.end_at.isoformat() if self.end_at else None,
+            'duration': self.duration,
+            'location': self.location,
+            'remarks': str(self.remarks) if self.remarks is not None else None,
+            'raw_match': self.raw_match,
+            'time_raw': self.time_raw,
+            'date_raw': self.date_raw,
+            'extraction_method': self.extraction_method
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'EventRecord':
+        start_at = data.get('start_at')
+        end_at = data.get('end_at')
+        return cls(
+            event_type=data['event_type'],
+            event_name=data['event'],
+            confidence=data.get('confidence', 0.0),
+            start_time=data.get('start_time'),
+            start_at=datetime.fromisoformat(start_at) if start_at else None,
+            location=data.get('location'),
+            remarks=data.get('remarks'),
+            raw_match=data.get('raw_match'),
+            time_raw=data.get('time_raw'),
+            date_raw=data.get('date_raw'),
+            extraction_method=data.get('extraction_method', 'pattern_matching'),
+            end_time=data.get('end_time'),
+            end_at=datetime.fromisoformat(end_at) if end_at else None,
+            duration=data.get('duration')
+        )
+    
+    def __repr__(self) -> str:
+        return f"EventRecord({self.event_name!r}, {self.event_type!r}, start_time={self.start_time!r})"
+
+
+class WordIndex:
+    """Start/end offsets of every word in a document, built once per extraction"""
+    
+    __slots__ = ('text', 'starts', 'ends')
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.starts = array('l')
+        self.ends = array('l')
+        for match in WORD_RE.finditer(text):
+            self.starts.append(match.start())
+            self.ends.append(match.end())
+    
+    def context_span(self, match_start: int, match_end: int,
+                     radius: int = 150, char_window: int = 1000) -> RemarksSpan:
+        """
+        Locate the words around a match without re-tokenizing the document
+        
+        Mirrors splitting ``text[match_start - char_window:match_end + char_window]``
+        and keeping ``radius`` words either side of the match, including the
+        word counts taken from ``text[:offset].split()``.
+        """
+        context_start = max(0, match_start - char_window)
+        context_end = min(len(self.text), match_end + char_window)
+        
+        # Words overlapping the character window (possibly clipped at its edges)
+        first = bisect_right(self.ends, context_start)
+        word_count = bisect_left(self.starts, context_end) - first
+        
+        words_before_window = bisect_left(self.starts, context_start)
+        relative_match_start = bisect_left(self.starts, match_start) - words_before_window
+        relative_match_end = bisect_left(self.starts, match_end) - words_before_window
+        
+        words_before = max(0, relative_match_start - radius)
+        words_after = min(word_count, relative_match_end + radius)
+        
+        if words_before < words_after:
+            start = max(self.starts[first + words_before], context_start)
+            end = min(self.ends[first + words_after - 1], context_end)
+        else:
+            start = end = match_start
+        
+        return RemarksSpan(self.text, start, end, words_before > 0, words_after < word_count)
+
 
 class EnhancedMaritimeExtractor:
     """Enhanced maritime event extractor with comprehensive patterns and NLP"""
     
-    def __init__(self):
-        # Load spaCy model for NLP processing
-        try:
-            self.nlp = spacy.load("en_core_web_sm")
-            logger.info("✅ Loaded spaCy model for NLP processing")
-        except OSError:
-            logger.warning("⚠️ spaCy model not available, using fallback patterns")
-            self.nlp = None
+    def __init__(self, nlp_mode: str = 'full', model_name: str = "en_core_web_sm",
+                 pattern_stats=None):
+        """
+        Args:
+            nlp_mode: 'full' loads the complete spaCy pipeline; 'lean' loads
+                only sentence segmentation (senter) and NER
+            model_name: spaCy model package or path
+            pattern_stats: Optional per-pattern hit/cost recorder (see
+                ``PatternEngine``), e.g. ``metrics.patterns``
+        """
+        if nlp_mode not in NLP_MODES:
+            raise ValueError(f"Unknown NLP mode: {nlp_mode}")
+        
+        # The spaCy model loads on first use (or on warmup) through the shared
+        # registry, so constructing an extractor is cheap and every extractor
+        # with the same model and mode uses one copy of it
+        self.nlp_model = f"spacy:{model_name}:{nlp_mode}"
+        model_registry.register(self.nlp_model, lambda: self._load_nlp_logged(model_name, nlp_mode))
         
         # Comprehensive maritime event patterns
         self.event_patterns = self._initialize_patterns()
         
+        # Compile every pattern once and route matching through anchor literals
+        self.pattern_engine = PatternEngine(self.event_patterns, stats=pattern_stats)
+        
+        # Cache key for extracted events: code version, pattern set and NLP
+        # setup (whether the model is installed, so the key is known before
+        # the model is loaded)
+        fingerprint = hashlib.sha256(json.dumps({
+            'patterns': self.event_patterns,
+            'nlp': [nlp_mode, model_name] if spacy_model_available(model_name) else None
+        }, sort_keys=True).encode('utf-8')).hexdigest()
+        self.version = f"{EXTRACTOR_VERSION}-{fingerprint[:16]}"
+        
         # Maritime keywords and entities
         self.maritime_keywords = self._initialize_keywords()
         
@@ -40,6 +385,49 @@ class EnhancedMaritimeExtractor:
             'keyword_match': 0.65
         }
     
+    @property
+    def nlp(self):
+        """The spaCy pipeline, loaded on first access; None if it is not available"""
+        try:
+            return model_registry.get(self.nlp_model)
+        except (OSError, ImportError):
+            return None
+    
+    @classmethod
+    def _load_nlp_logged(cls, model_name: str, nlp_mode: str):
+        try:
+            nlp = cls._load_nlp(model_name, nlp_mode)
+        except (OSError, ImportError):
+            logger.warning("⚠️ spaCy model not available, using fallback patterns")
+            raise
+        logger.info(f"✅ Loaded spaCy model for NLP processing ({nlp_mode}: {', '.join(nlp.pipe_names)})")
+        return nlp
+    
+    @staticmethod
+    def _load_nlp(model_name: str, nlp_mode: str):
+        """Load the spaCy pipeline, trimmed to senter + NER in lean mode"""
+        import spacy
+        
+        if nlp_mode == 'full':
+            return spacy.load(model_name)
+        if nlp_mode != 'lean':
+            raise ValueError(f"Unknown NLP mode: {nlp_mode}")
+        
+        nlp = spacy.load(model_name, exclude=LEAN_NLP_EXCLUDE)
+        
+        # en_core_web_sm ships senter disabled because the parser sets sentences
+        if 'senter' in nlp.disabled:
+            nlp.enable_pipe('senter')
+        elif not nlp.has_pipe('senter'):
+            nlp.add_pipe('sentencizer', first=True)
+        
+        # The shared tok2vec only feeds the excluded tagger/parser in the small
+        # English models; drop it if nothing left is listening to it
+        if nlp.has_pipe('tok2vec') and not nlp.get_pipe('tok2vec').listening_components:
+            nlp.remove_pipe('tok2vec')
+        
+        return nlp
+    
     def _initialize_patterns(self) -> List[Dict[str, Any]]:
         """Initialize comprehensive maritime event patterns"""
         return [
@@ -231,10 +619,10 @@ class EnhancedMaritimeExtractor:
                 'type': 'weather',
                 'name': 'Weather Delay',
                 'patterns': [
-                    r'(?i)(?:heavy\s+)?(?:rain|storm|fog|wind)(?:\s+caused\s+delay)?',
-                    r'(?i)weather\s+delay',
-                    r'(?i)operations?\s+suspended\s+due\s+to\s+weather',
-                    r'(?i)rain\s+stopped\s+work',
+                    r'(?i)\b(?:heavy\s+)?(?:rain|storm|fog|wind)s?\b(?:\s+caused\s+delay)?',
+                    r'(?i)\bweather\s+delay',
+                    r'(?i)\boperations?\s+suspended\s+due\s+to\s+weather',
+                    r'(?i)\brain\s+stopped\s+work',
                 ],
                 'keywords': ['weather delay', 'rain delay', 'storm delay', 'fog delay'],
                 'confidence': 0.90
@@ -302,55 +690,243 @@ class EnhancedMaritimeExtractor:
             ]
         }
     
-    def extract_events(self, text: str) -> List[Dict[str, Any]]:
-        """Extract events from text using enhanced pattern matching and NLP"""
+    @metrics.timed('extract_events')
+    def extract_events(self, text: str, lazy_remarks: bool = False) -> List[EventRecord]:
+        """
+        Extract events from text using enhanced pattern matching and NLP
+        
+        Pattern events carry their remarks as a ``RemarksSpan`` until the end
+        of extraction, so duplicates are dropped before any string is built.
+        Pass ``lazy_remarks=True`` to keep the spans and call ``str()`` on
+        them only when the events are serialized or persisted.
+        """
         if not text or len(text.strip()) < 10:
             logger.warning("Text too short for meaningful event extraction")
             return []
         
+        # Use NLP for additional context-based extraction
+        nlp_events = self._extract_with_nlp(text) if self.nlp else []
+        
+        return self._assemble_events(text, nlp_events, lazy_remarks)
+    
+    def extract_events_batch(self, texts: Iterable[str], n_process: int = 1,
+                             batch_size: int = 8) -> Iterator[List[EventRecord]]:
+        """
+        Extract events from many documents, running spaCy through ``nlp.pipe``
+        
+        Batching amortizes model overhead across documents, and ``n_process``
+        spreads the NLP work over several cores. Pattern matching runs in this
+        process as each parsed document comes back.
+        
+        Args:
+            texts: Document texts
+            n_process: Number of spaCy worker processes
+            batch_size: Documents per spaCy batch
+            
+        Yields:
+            The events of each document, in input order (as ``extract_events``)
+        """
+        if not self.nlp:
+            for text in texts:
+                yield self.extract_events(text)
+            return
+        
+        max_length = self.nlp.max_length
+        
+        def pipe_inputs():
+            for text in texts:
+                text = text or ''
+                if len(text.strip()) < 10:
+                    yield '', (text, False)
+                elif len(text) > max_length:
+                    # spaCy refuses these outright; keep the pattern events
+                    logger.warning(f"Document of {len(text)} characters exceeds spaCy max_length, skipping NLP")
+                    yield '', (text, True)
+                else:
+                    yield text, (text, True)
+        
+        docs = self.nlp.pipe(pipe_inputs(), as_tuples=True, n_process=n_process, batch_size=batch_size)
+        for doc, (text, extract) in docs:
+            if not extract:
+                logger.warning("Text too short for meaningful event extraction")
+                yield []
+                continue
+            nlp_events = self._extract_with_nlp(text, doc) if len(doc) else []
+            yield self._assemble_events(text, nlp_events)
+    
+    def _assemble_events(self, text: str, nlp_events: List[EventRecord],
+                         lazy_remarks: bool = False) -> List[EventRecord]:
+        """Combine pattern and NLP events into the final, de-duplicated timeline"""
         events = []
         logger.info(f"Extracting events from {len(text)} characters")
         
-        # Extract events using all patterns
-        for pattern_info in self.event_patterns:
-            events.extend(self._extract_with_patterns(text, pattern_info))
+        # Word offsets shared by every remarks window of this document
+        word_index = WordIndex(text)
         
-        # Use NLP for additional context-based extraction
-        if self.nlp:
-            nlp_events = self._extract_with_nlp(text)
-            events.extend(nlp_events)
+        # Extract events using all patterns in a single anchor scan
+        events.extend(self._extract_with_patterns(text, word_index))
+        events.extend(nlp_events)
         
         # Remove duplicates and sort by time
         events = self._remove_duplicates(events)
         events = self._sort_events_by_time(events)
         
-        # Enhance events with additional context
-        events = self._enhance_events_with_context(events, text)
+        if not lazy_remarks:
+            self.materialize_remarks(events)
         
         logger.info(f"Total events extracted: {len(events)}")
         return events
     
-    def _extract_with_patterns(self, text: str, pattern_info: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Extract events using multiple patterns for a single event type"""
-        events = []
+    @staticmethod
+    def materialize_remarks(events: List[EventRecord]) -> List[EventRecord]:
+        """Replace lazy ``RemarksSpan`` remarks with their strings, in place"""
+        for event in events:
+            if isinstance(event.remarks, RemarksSpan):
+                event.remarks = str(event.remarks)
+        return events
+    
+    def extract_events_stream(self, pages: Iterable[str]) -> Iterator[EventRecord]:
+        """
+        Extract events from a document supplied page by page
+        
+        Consumes page-sized chunks, such as the ``--- Page N ---`` blocks
+        DocumentProcessor emits (see ``iter_page_blocks``), and yields events
+        as soon as they are settled. Only the current page plus a bounded
+        overlap is held in memory, and NLP runs per page, so spaCy's
+        ``max_length`` applies to a page rather than the whole document.
+        
+        The last ``STREAM_LOOKAHEAD`` characters of every chunk are carried
+        into the next one before their matches are settled, so events and
+        remarks spanning a page break are matched in full.
+        
+        Unlike ``extract_events``, events are yielded in document order
+        rather than sorted by time, and of duplicate events the first in
+        document order is kept.
+        """
+        seen = set()
+        previous = None  # last timestamp settled, for dating delay periods
+        carry = ''
+        carry_offset = 0  # absolute offset of carry[0]
+        settled = 0  # matches starting before this absolute offset were handled
+        consumed = 0
         
-        for pattern in pattern_info['patterns']:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+        for page in pages:
+            if not page:
+                continue
+            if consumed:
+                page = PAGE_SEPARATOR + page
+            
+            buffer = carry + page
+            buffer_offset = carry_offset
+            consumed += len(page)
+            
+            boundary = max(settled - buffer_offset, len(buffer) - STREAM_LOOKAHEAD)
+            events, previous = self._settle_chunk(buffer, settled - buffer_offset, boundary, seen, previous)
+            if self.nlp:
+                events.extend(self._unseen(self._extract_with_nlp(page), seen))
+            yield from self.materialize_remarks(events)
             
-            for match in matches:
-                event_data = self._extract_structured_event(match, pattern_info, text)
-                if event_data:
-                    events.append(event_data)
-                    logger.info(f"Found event: {event_data['event']} ({event_data['event_type']}) at {event_data['start_time']}")
+            settled = buffer_offset + boundary
+            keep_from = max(0, boundary - STREAM_LOOKBEHIND)
+            carry = buffer[keep_from:]
+            carry_offset = buffer_offset + keep_from
         
-        return events
+        if carry:
+            events, previous = self._settle_chunk(carry, settled - carry_offset, len(carry), seen, previous)
+            yield from self.materialize_remarks(events)
     
-    def _extract_with_nlp(self, text: str) -> List[Dict[str, Any]]:
-        """Extract events using NLP analysis"""
+    def _settle_chunk(self, buffer: str, start: int, end: int, seen: set,
+                      previous: Optional[datetime]) -> Tuple[List[EventRecord], Optional[datetime]]:
+        """
+        Extract unseen pattern events whose match starts within ``[start, end)`` of the buffer
+        
+        Returns:
+            (events, last timestamp); ``previous`` is the last timestamp of
+            the chunks before, carried on for dating delay periods
+        """
+        located = [
+            (match_start, event)
+            for match_start, event in self._iter_pattern_events(buffer, WordIndex(buffer), start, end)
+        ]
+        located.sort(key=lambda item: item[0])
+        events = [event for _, event in located]
+        previous = self._date_periods(events, previous)
+        return self._unseen(events, seen), previous
+    
+    def _unseen(self, events: List[EventRecord], seen: set) -> List[EventRecord]:
+        """Drop events whose duplicate key has already been seen in this stream"""
+        unique_events = []
+        for event in events:
+            key = self._duplicate_key(event)
+            if key not in seen:
+                seen.add(key)
+                unique_events.append(event)
+        return unique_events
+    
+    @metrics.timed('patterns')
+    def _extract_with_patterns(self, text: str, word_index: WordIndex = None) -> List[EventRecord]:
+        """Extract events for every pattern entry using the compiled pattern engine"""
+        word_index = word_index or WordIndex(text)
+        located = list(self._iter_pattern_events(text, word_index))
+        self._date_periods([event for _, event in sorted(located, key=lambda item: item[0])])
+        return [event for _, event in located]
+    
+    @staticmethod
+    def _date_periods(events: List[EventRecord], previous: Optional[datetime] = None) -> Optional[datetime]:
+        """
+        Date undated delay periods ("RAIN 11:00 - 13:00") in place
+        
+        SoFs give the date once and then only times, so a period takes the
+        date of the previous dated event, moving to the next day when it
+        starts earlier than that event (a watch past midnight). A period
+        whose line gave a date that does not parse stays undated.
+        
+        Args:
+            events: Events in document order
+            previous: Last timestamp of the text before these events
+            
+        Returns:
+            The last timestamp, for the text after these events
+        """
+        for event in events:
+            if (event.start_at is None and event.end_time and event.date_raw is None
+                    and previous is not None):
+                parts = parse_parts(event.time_raw) if event.time_raw else None
+                if parts is None or not parts.has_time:
+                    continue
+                start_at = datetime.combine(previous.date(), datetime.min.time()) + timedelta(
+                    hours=parts.hour, minutes=parts.minute
+                )
+                if start_at < previous:
+                    start_at += timedelta(days=1)
+                hours, minutes = map(int, event.duration.split(':'))
+                event.start_at = start_at
+                event.end_at = start_at + timedelta(hours=hours, minutes=minutes)
+                event.start_time = event.start_at.strftime('%H:%M %d/%m/%Y')
+                event.end_time = event.end_at.strftime('%H:%M %d/%m/%Y')
+            if event.start_at is not None:
+                previous = event.start_at
+        return previous
+    
+    def _iter_pattern_events(self, text: str, word_index: WordIndex, start: int = 0,
+                             end: Optional[int] = None) -> Iterator[Tuple[int, EventRecord]]:
+        """Yield ``(match_start, event)`` for pattern matches starting within ``[start, end)``"""
+        for pattern_info, match in self.pattern_engine.iter_matches(text):
+            if match.start() < start or (end is not None and match.start() >= end):
+                continue
+            event_data = self._extract_structured_event(match, pattern_info, text, word_index)
+            if event_data:
+                logger.info(f"Found event: {event_data.event_name} ({event_data.event_type}) at {event_data.start_time}")
+                yield match.start(), event_data
+    
+    @metrics.timed('nlp')
+    def _extract_with_nlp(self, text: str, doc=None) -> List[EventRecord]:
+        """Extract events using NLP analysis, reusing ``doc`` if already parsed"""
         events = []
         
         try:
-            doc = self.nlp(text)
+            if doc is None:
+                doc = self.nlp(text)
             
             # Extract time entities
             time_entities = [ent.text for ent in doc.ents if ent.label_ in ['TIME', 'DATE']]
@@ -375,15 +951,13 @@ class EnhancedMaritimeExtractor:
                     # Try to identify event type from context
                     event_type = self._identify_event_type_from_context(sent_text)
                     if event_type:
-                        events.append({
-                            'event_type': event_type,
-                            'event': f"NLP Detected {event_type.title()}",
-                            'confidence': 0.70,
-                            'start_time': None,
-                            'location': None,
-                            'remarks': sent.text,
-                            'extraction_method': 'nlp_context'
-                        })
+                        events.append(EventRecord(
+                            event_type=event_type,
+                            event_name=f"NLP Detected {event_type.title()}",
+                            confidence=0.70,
+                            remarks=sent.text,
+                            extraction_method='nlp_context'
+                        ))
             
         except Exception as e:
             logger.warning(f"NLP extraction failed: {e}")
@@ -413,7 +987,8 @@ class EnhancedMaritimeExtractor:
         
         return None
     
-    def _extract_structured_event(self, match, pattern_info: Dict[str, Any], text: str) -> Dict[str, Any]:
+    def _extract_structured_event(self, match, pattern_info: Dict[str, Any], text: str,
+                                  word_index: WordIndex = None) -> Optional[EventRecord]:
         """Extract structured event data from regex match"""
         try:
             full_match = match.group(0)
@@ -429,39 +1004,56 @@ class EnhancedMaritimeExtractor:
                 for group in groups:
                     if group:
                         # Check if it's a time (HH:MM or HHMM)
-                        if re.match(r'^\d{1,2}:\d{2}$', group) or re.match(r'^\d{4}$', group):
+                        if TIME_GROUP_RE.match(group):
                             time_info = group
                         # Check if it's a date (DD/MM/YYYY, DD.MM.YYYY, etc.)
-                        elif re.match(r'^\d{1,2}[\.\/\-]\d{1,2}[\.\/\-]\d{4}$', group):
+                        elif DATE_GROUP_RE.match(group):
                             date_info = group
                         # Check if it's a location (port, berth, etc.)
-                        elif re.match(r'^[A-Za-z\s]+$', group) and len(group.strip()) > 2:
+                        elif LOCATION_GROUP_RE.match(group) and len(group.strip()) > 2:
                             location_info = group.strip()
             
+            # A weather delay without a matched time takes the period on its
+            # line; an undated period is dated by ``_date_periods``
+            end_info = end_time = end_at = duration = None
+            if pattern_info['type'] == WEATHER_TYPE and time_info is None:
+                line_start = text.rfind('\n', 0, match.start()) + 1
+                line_end = text.find('\n', match.end())
+                period = parse_period(text[line_start:line_end if line_end != -1 else len(text)])
+                if period:
+                    time_info, end_info, period_date, minutes = period
+                    date_info = date_info or period_date
+                    duration = f"{minutes // 60}:{minutes % 60:02d}"
+            
             # Format time and date
             formatted_time = self._format_time_date(time_info, date_info) if time_info or date_info else None
+            start_at = parse_event_time(time_info, date_info)
+            if end_info:
+                end_time = self._format_time_date(end_info, date_info)
+                if start_at:
+                    end_at = start_at + timedelta(minutes=minutes)
             
             # Get context around the match
-            context = self._get_context_around_match(match, text)
+            context = self._get_context_around_match(match, text, word_index)
             
             # Calculate confidence based on match quality
             confidence = self._calculate_confidence(pattern_info, full_match, groups)
             
-            event = {
-                'event_type': pattern_info['type'],
-                'event': pattern_info['name'],
-                'confidence': confidence,
-                'start_time': formatted_time,
-                'location': location_info,
-                'remarks': context,
-                'raw_match': full_match,
-                'timestamp': formatted_time,  # For sorting
-                'time_raw': time_info,
-                'date_raw': date_info,
-                'extraction_method': 'pattern_matching'
-            }
-            
-            return event
+            return EventRecord(
+                event_type=pattern_info['type'],
+                event_name=pattern_info['name'],
+                confidence=confidence,
+                start_time=formatted_time,
+                start_at=start_at,
+                location=location_info,
+                remarks=context,
+                raw_match=full_match,
+                time_raw=time_info,
+                date_raw=date_info,
+                end_time=end_time,
+                end_at=end_at,
+                duration=duration
+            )
             
         except Exception as e:
             logger.warning(f"Error extracting event from match: {e}")
@@ -501,7 +1093,7 @@ class EnhancedMaritimeExtractor:
             # Format date
             if date_str:
                 # Convert various separators to standard format
-                date_formatted = re.sub(r'[\.\/\-]', '/', date_str)
+                date_formatted = DATE_SEPARATOR_RE.sub('/', date_str)
                 formatted_parts.append(date_formatted)
             
             return ' '.join(formatted_parts) if formatted_parts else None
@@ -510,124 +1102,30 @@ class EnhancedMaritimeExtractor:
             logger.warning(f"Error formatting time/date: {e}")
             return f"{time_str} {date_str}" if time_str and date_str else None
     
-    def _get_context_around_match(self, match, text: str) -> str:
+    def _get_context_around_match(self, match, text: str, word_index: WordIndex = None):
         """Get context around the regex match - extended to 300 words"""
         try:
-            match_start = match.start()
-            match_end = match.end()
-            
-            # Get 300 words before and after the match
-            # First, get a larger character window to ensure we capture enough words
-            char_window = 1000  # Start with 1000 characters to ensure we get enough words
-            
-            context_start = max(0, match_start - char_window)
-            context_end = min(len(text), match_end + char_window)
-            
-            # Extract the text within the character window
-            context_text = text[context_start:context_end].strip()
+            word_index = word_index or WordIndex(text)
             
-            # Split into words and get 300 words around the match
-            words = context_text.split()
-            match_word_start = len(text[:match_start].split())
-            match_word_end = len(text[:match_end].split())
-            
-            # Calculate word positions relative to the context window
-            relative_match_start = match_word_start - len(text[:context_start].split())
-            relative_match_end = match_word_end - len(text[:context_start].split())
-            
-            # Get 150 words before and 150 words after the match
-            words_before = max(0, relative_match_start - 150)
-            words_after = min(len(words), relative_match_end + 150)
-            
-            # Extract the 300-word context
-            context_words = words[words_before:words_after]
-            context = ' '.join(context_words)
-            
-            # Clean up context
-            context = re.sub(r'\s+', ' ', context)  # Replace multiple spaces with single space
-            context = context.replace('\n', ' ')  # Replace newlines with spaces
-            
-            # Add context indicators
-            if words_before > 0:
-                context = f"... {context}"
-            if words_after < len(words):
-                context = f"{context} ..."
-            
-            return context
+            # 150 words before and after the match, within a 1000 character window
+            return word_index.context_span(match.start(), match.end())
             
         except Exception as e:
             logger.warning(f"Error getting context: {e}")
             # Fallback: return first 500 characters if error
             return text[:500]
     
-    def _enhance_events_with_context(self, events: List[Dict[str, Any]], text: str) -> List[Dict[str, Any]]:
-        """Enhance events with additional context and information"""
-        enhanced_events = []
-        
-        for event in events:
-            enhanced_event = event.copy()
-            
-            # Try to extract vessel name if not present
-            if not enhanced_event.get('vessel'):
-                vessel_name = self._extract_vessel_name(text)
-                if vessel_name:
-                    enhanced_event['vessel'] = vessel_name
-            
-            # Try to extract port name if not present
-            if not enhanced_event.get('port'):
-                port_name = self._extract_port_name(text)
-                if port_name:
-                    enhanced_event['port'] = port_name
-            
-            # Add document metadata
-            enhanced_event['document_length'] = len(text)
-            enhanced_event['extraction_timestamp'] = datetime.now().isoformat()
-            
-            enhanced_events.append(enhanced_event)
-        
-        return enhanced_events
-    
-    def _extract_vessel_name(self, text: str) -> str:
-        """Extract vessel name from text"""
-        vessel_patterns = [
-            r'(?i)vessel\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|IMO|FLAG)',
-            r'(?i)name\s+of\s+the\s+vessel\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|IMO|FLAG)',
-            r'(?i)mv\.?\s+([A-Za-z\s\.\-]+?)(?:\n|$|IMO|FLAG)',
-        ]
-        
-        for pattern in vessel_patterns:
-            match = re.search(pattern, text)
-            if match:
-                vessel_name = match.group(1).strip()
-                if len(vessel_name) > 2:
-                    return vessel_name
-        
-        return None
-    
-    def _extract_port_name(self, text: str) -> str:
-        """Extract port name from text"""
-        port_patterns = [
-            r'(?i)port\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|TERMINAL|BERTH)',
-            r'(?i)port\s+of\s+(?:loading|discharge)\s*[:=]\s*([A-Za-z\s\.\-]+?)(?:\n|$|TERMINAL|BERTH)',
-        ]
-        
-        for pattern in port_patterns:
-            match = re.search(pattern, text)
-            if match:
-                port_name = match.group(1).strip()
-                if len(port_name) > 2:
-                    return port_name
-        
-        return None
+    def analyze_header(self, text: str) -> Dict[str, Optional[str]]:
+        """Vessel, IMO number, port, terminal and berth of a document (see ``analyze_header``)"""
+        return analyze_header(text)
     
-    def _remove_duplicates(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _remove_duplicates(self, events: List[EventRecord]) -> List[EventRecord]:
         """Remove duplicate events based on type, time, and location"""
         seen = set()
         unique_events = []
         
         for event in events:
-            # Create a key based on event type, time, and location
-            key = (event['event_type'], event['start_time'], event['location'])
+            key = self._duplicate_key(event)
             
             if key not in seen:
                 seen.add(key)
@@ -635,24 +1133,28 @@ class EnhancedMaritimeExtractor:
         
         return unique_events
     
-    def _sort_events_by_time(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Sort events by timestamp if available"""
+    @staticmethod
+    def _duplicate_key(event: EventRecord) -> Tuple:
+        """Key two events are considered duplicates on: type, time, and location"""
+        return (event.event_type, event.start_time, event.location)
+    
+    def _sort_events_by_time(self, events: List[EventRecord]) -> List[EventRecord]:
+        """Sort events chronologically, then events with only a partial timestamp"""
         try:
-            # Filter events with valid timestamps
-            events_with_time = [e for e in events if e.get('timestamp')]
-            events_without_time = [e for e in events if not e.get('timestamp')]
+            events_with_date = [e for e in events if e.start_at]
+            events_with_time = [e for e in events if not e.start_at and e.start_time]
+            events_without_time = [e for e in events if not e.start_at and not e.start_time]
             
-            # Sort events with time by timestamp
-            events_with_time.sort(key=lambda x: x['timestamp'] or '')
+            events_with_date.sort(key=lambda x: x.start_at)
+            events_with_time.sort(key=lambda x: x.start_time)
             
-            # Return sorted events with time first, then events without time
-            return events_with_time + events_without_time
+            return events_with_date + events_with_time + events_without_time
             
         except Exception as e:
             logger.warning(f"Error sorting events: {e}")
             return events
     
-    def get_extraction_summary(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def get_extraction_summary(self, events: List[EventRecord]) -> Dict[str, Any]:
         """Generate summary of extracted events"""
         if not events:
             return {"message": "No events extracted"}
@@ -660,23 +1162,23 @@ class EnhancedMaritimeExtractor:
         # Count events by type
         event_counts = defaultdict(int)
         for event in events:
-            event_counts[event['event_type']] += 1
+            event_counts[event.event_type] += 1
         
         # Calculate average confidence
-        confidences = [event.get('confidence', 0) for event in events]
+        confidences = [event.confidence or 0 for event in events]
         avg_confidence = sum(confidences) / len(confidences) if confidences else 0
         
         # Find events with highest confidence
-        high_confidence_events = [e for e in events if e.get('confidence', 0) >= 0.9]
+        high_confidence_events = [e for e in events if (e.confidence or 0) >= 0.9]
         
         return {
             "total_events": len(events),
             "event_types": dict(event_counts),
             "average_confidence": round(avg_confidence, 3),
             "high_confidence_events": len(high_confidence_events),
-            "extraction_methods": list(set(e.get('extraction_method', 'unknown') for e in events)),
-            "time_coverage": len([e for e in events if e.get('start_time')]),
-            "location_coverage": len([e for e in events if e.get('location')])
+            "extraction_methods": list(set(e.extraction_method for e in events)),
+            "time_coverage": len([e for e in events if e.start_time]),
+            "location_coverage": len([e for e in events if e.location])
         }
 
 if __name__ == "__main__":
@@ -704,11 +1206,11 @@ if __name__ == "__main__":
         events = extractor.extract_events(text)
         
         for j, event in enumerate(events):
-            print(f"  Event {j+1}: {event['event']} ({event['event_type']})")
-            print(f"    Time: {event['start_time']}")
-            print(f"    Location: {event['location']}")
-            print(f"    Confidence: {event['confidence']}")
-            print(f"    Method: {event.get('extraction_method', 'unknown')}")
+            print(f"  Event {j+1}: {event.event_name} ({event.event_type})")
+            print(f"    Time: {event.start_time}")
+            print(f"    Location: {event.location}")
+            print(f"    Confidence: {event.confidence}")
+            print(f"    Method: {event.extraction_method}")
     
     # Test with a longer document
     print(f"\n📊 Testing with longer document...")
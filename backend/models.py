@@ -5,12 +5,29 @@ Database models for SoF Event Extractor
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from itertools import groupby
+import json
+import logging
 import uuid
 
+try:
+    from backend.utils.datetime_parser import normalize_timestamps, parse_sof_datetime
+except ImportError:
+    from utils.datetime_parser import normalize_timestamps, parse_sof_datetime
+
+logger = logging.getLogger(__name__)
+
 
 db = SQLAlchemy()
 
 
+def _parse_iso(value):
+    """Parse an ISO timestamp from an event dict, passing datetimes and None through"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
 class Document(db.Model):
     """Document model for storing uploaded files"""
     __tablename__ = 'documents'
@@ -29,12 +46,25 @@ class Document(db.Model):
     text_content = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
+    # Header metadata, read once per document at processing time; events
+    # refer to it through their document rather than carrying a copy
+    vessel_name = db.Column(db.String(255), index=True)
+    imo_number = db.Column(db.String(10), index=True)
+    port_name = db.Column(db.String(255))
+    terminal = db.Column(db.String(255))
+    berth = db.Column(db.String(100))
     
     # Relationship
     events = db.relationship(
         'Event', 
         backref='document', 
         lazy=True, 
+        cascade='all, delete-orphan',
+        order_by='Event.sequence'
+    )
+    summary = db.relationship(
+        'DocumentSummary',
+        uselist=False,
         cascade='all, delete-orphan'
     )
     
@@ -50,13 +80,35 @@ class Document(db.Model):
             ),
             'processed_at': (
                 self.processed_at.isoformat() if self.processed_at else None
-            )
+            ),
+            'vessel_name': self.vessel_name,
+            'imo_number': self.imo_number,
+            'port_name': self.port_name,
+            'terminal': self.terminal,
+            'berth': self.berth
         }
+    
+    def apply_header(self, header):
+        """Store header metadata (as returned by ``analyze_header``); missing fields are cleared"""
+        for field in HEADER_COLUMNS:
+            value = header.get(field)
+            length = Document.__table__.c[field].type.length
+            setattr(self, field, value[:length] if value else None)
+
+
+# Document columns filled from the document header
+HEADER_COLUMNS = ('vessel_name', 'imo_number', 'port_name', 'terminal', 'berth')
 
 
 class Event(db.Model):
     """Event model for storing extracted events"""
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_document_type', 'document_id', 'event_type'),
+        db.Index('ix_events_document_start', 'document_id', 'start_time'),
+        db.Index('ix_events_document_sequence', 'document_id', 'sequence'),
+        db.Index('ix_events_type_start_at', 'event_type', 'start_at'),
+    )
     
     id = db.Column(
         db.String(36), 
@@ -76,10 +128,49 @@ class Event(db.Model):
     location = db.Column(db.String(255))
     remarks = db.Column(db.Text)
     confidence = db.Column(db.Float, default=0.0)
+    # Normalized timestamps parsed at extraction time (SoF times carry no
+    # zone; they are stored as written)
+    start_at = db.Column(db.DateTime, index=True)
+    end_at = db.Column(db.DateTime)
+    # Position in the extractor's (timeline-sorted) output
+    sequence = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
+    @classmethod
+    def bulk_insert(cls, document_id: str, events):
+        """
+        Insert extracted events for a document in one executemany
+        
+        Args:
+            document_id: Owning document
+            events: ``EventRecord``s as produced by the extractor, in order
+            
+        Returns:
+            Number of rows inserted
+        """
+        rows = [
+            {
+                'document_id': document_id,
+                'event_type': event.event_type,
+                'event_name': event.event_name,
+                'start_time': event.start_time,
+                'end_time': event.end_time,
+                'duration': event.duration,
+                'location': event.location,
+                'remarks': str(event.remarks) if event.remarks is not None else None,
+                'confidence': event.confidence or 0.0,
+                'start_at': event.start_at,
+                'end_at': event.end_at,
+                'sequence': sequence
+            }
+            for sequence, event in enumerate(events)
+        ]
+        if rows:
+            db.session.execute(db.insert(cls), rows)
+        return len(rows)
+    
+    def to_dict(self, include_remarks: bool = True):
+        data = {
             'id': self.id,
             'event': self.event_name,
             'event_type': self.event_type,
@@ -87,6 +178,366 @@ class Event(db.Model):
             'end_time': self.end_time,
             'duration': self.duration,
             'location': self.location,
-            'remarks': self.remarks,
-            'confidence': self.confidence
+            'confidence': self.confidence,
+            'start_at': self.start_at.isoformat() if self.start_at else None,
+            'end_at': self.end_at.isoformat() if self.end_at else None
         }
+        # Reading remarks loads the column if the query deferred it
+        if include_remarks:
+            data['remarks'] = self.remarks
+        return data
+
+
+class DocumentSummary(db.Model):
+    """
+    Aggregates over a document's events, kept up to date as events are saved
+    
+    Summary and chat answers read this one row instead of walking every
+    event. All fields are running totals (or min/max), so new events can be
+    folded in with ``add_events`` without re-reading the existing ones.
+    """
+    __tablename__ = 'document_summaries'
+    
+    document_id = db.Column(
+        db.String(36),
+        db.ForeignKey('documents.id'),
+        primary_key=True
+    )
+    total_events = db.Column(db.Integer, default=0, nullable=False)
+    event_types = db.Column(db.Text, default='{}', nullable=False)
+    confidence_total = db.Column(db.Float, default=0.0, nullable=False)
+    first_event_at = db.Column(db.DateTime)
+    last_event_at = db.Column(db.DateTime)
+    loading_started_at = db.Column(db.DateTime)
+    loading_completed_at = db.Column(db.DateTime)
+    weather_delays = db.Column(db.Integer, default=0, nullable=False)
+    weather_delay_hours = db.Column(db.Float, default=0.0, nullable=False)
+    total_duration_minutes = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def rebuild(cls, document_id: str, events):
+        """
+        Reset a document's summary to the given events
+        
+        Args:
+            document_id: Owning document
+            events: Extractor ``EventRecord``s, Event rows or event dicts
+            
+        Returns:
+            The summary, added to the session
+        """
+        summary = db.session.get(cls, document_id)
+        if summary is None:
+            summary = cls(document_id=document_id)
+            db.session.add(summary)
+        summary.reset()
+        summary.add_events(events)
+        return summary
+    
+    @classmethod
+    def for_document(cls, document):
+        """The document's summary, built from its events if it has none yet"""
+        if document.summary is None:
+            document.summary = cls.rebuild(document.id, document.events)
+            db.session.commit()
+        return document.summary
+    
+    def reset(self):
+        self.total_events = 0
+        self.event_types = '{}'
+        self.confidence_total = 0.0
+        self.first_event_at = self.last_event_at = None
+        self.loading_started_at = self.loading_completed_at = None
+        self.weather_delays = 0
+        self.weather_delay_hours = 0.0
+        self.total_duration_minutes = 0
+    
+    def add_events(self, events):
+        """Fold events (event dicts, or EventRecords/Event rows) into the aggregates"""
+        histogram = json.loads(self.event_types or '{}')
+        for event in events:
+            if isinstance(event, dict):
+                event_type, name = event['event_type'], event['event']
+                confidence = event.get('confidence') or 0.0
+                duration = event.get('duration')
+                start_at = _parse_iso(event.get('start_at'))
+                end_at = _parse_iso(event.get('end_at'))
+            else:
+                event_type, name = event.event_type, event.event_name
+                confidence = event.confidence or 0.0
+                duration = event.duration
+                start_at, end_at = event.start_at, event.end_at
+            
+            self.total_events = (self.total_events or 0) + 1
+            histogram[event_type] = histogram.get(event_type, 0) + 1
+            self.confidence_total = (self.confidence_total or 0.0) + confidence
+            
+            duration_hours = _duration_hours(duration)
+            self.total_duration_minutes = (
+                (self.total_duration_minutes or 0) + int(round(duration_hours * 60))
+            )
+            
+            if start_at is not None:
+                self.first_event_at = _earliest(self.first_event_at, start_at)
+                self.last_event_at = _latest(self.last_event_at, end_at or start_at)
+                if name == 'Loading Commenced':
+                    self.loading_started_at = _earliest(self.loading_started_at, start_at)
+                elif name == 'Loading Completed':
+                    self.loading_completed_at = _latest(self.loading_completed_at, start_at)
+            
+            if event_type == 'weather':
+                self.weather_delays = (self.weather_delays or 0) + 1
+                if start_at is not None and end_at is not None:
+                    duration_hours = (end_at - start_at).total_seconds() / 3600
+                self.weather_delay_hours = (self.weather_delay_hours or 0.0) + duration_hours
+        self.event_types = json.dumps(histogram, sort_keys=True)
+    
+    @property
+    def average_confidence(self) -> float:
+        return self.confidence_total / self.total_events if self.total_events else 0.0
+    
+    @property
+    def loading_hours(self):
+        """Loading commenced to loading completed, if both times are known"""
+        if self.loading_started_at is None or self.loading_completed_at is None:
+            return None
+        return max((self.loading_completed_at - self.loading_started_at).total_seconds() / 3600, 0.0)
+    
+    def to_dict(self):
+        loading_hours = self.loading_hours
+        return {
+            'total_events': self.total_events,
+            'event_distribution': json.loads(self.event_types or '{}'),
+            'average_confidence': self.average_confidence,
+            'first_event': (
+                self.first_event_at.isoformat() if self.first_event_at else None
+            ),
+            'last_event': (
+                self.last_event_at.isoformat() if self.last_event_at else None
+            ),
+            'loading_hours': round(loading_hours, 2) if loading_hours is not None else None,
+            'weather_delays': self.weather_delays,
+            'weather_delay_hours': round(self.weather_delay_hours, 2),
+            'total_duration_minutes': self.total_duration_minutes
+        }
+
+
+def _duration_hours(duration) -> float:
+    """Hours in an 'H:MM' or 'H:MM:SS' duration string; 0 if missing or unparseable"""
+    if not duration:
+        return 0.0
+    try:
+        parts = duration.split(':')
+        if len(parts) < 2:
+            return 0.0
+        return float(parts[0]) + float(parts[1]) / 60
+    except ValueError:
+        return 0.0
+
+
+def _earliest(current, value):
+    return value if current is None or value < current else current
+
+
+def _latest(current, value):
+    return value if current is None or value > current else current
+
+
+class ProcessingJob(db.Model):
+    """Background processing job, also serving as the persistent job queue"""
+    __tablename__ = 'processing_jobs'
+    
+    id = db.Column(
+        db.String(36), 
+        primary_key=True, 
+        default=lambda: str(uuid.uuid4())
+    )
+    document_id = db.Column(
+        db.String(36), 
+        db.ForeignKey('documents.id'), 
+        nullable=False
+    )
+    status = db.Column(db.String(20), default='queued', index=True)
+    stage = db.Column(db.String(50))
+    stage_progress = db.Column(db.Text, default='{}')
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Lease: the claiming worker ("host:pid") renews heartbeat_at while the
+    # job runs; a running job whose lease expired lost its worker
+    worker = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0)
+    
+    def to_dict(self):
+        stages = json.loads(self.stage_progress or '{}')
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'status': self.status,
+            'stage': self.stage,
+            'stages': stages,
+            'progress': (
+                round(sum(stages.values()) / len(stages), 3) if stages else 0.0
+            ),
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'attempts': self.attempts or 0,
+            'created_at': (
+                self.created_at.isoformat() if self.created_at else None
+            ),
+            'started_at': (
+                self.started_at.isoformat() if self.started_at else None
+            ),
+            'finished_at': (
+                self.finished_at.isoformat() if self.finished_at else None
+            )
+        }
+
+
+class TextCacheEntry(db.Model):
+    """Extracted text of a file (per page for PDFs), keyed by content hash"""
+    __tablename__ = 'text_cache'
+    __table_args__ = (
+        db.UniqueConstraint('file_hash', 'processor_version'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_hash = db.Column(db.String(64), nullable=False, index=True)
+    processor_version = db.Column(db.String(64), nullable=False)
+    text_content = db.Column(db.Text, nullable=False)
+    pages = db.Column(db.Text, default='[]')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class EventCacheEntry(db.Model):
+    """Events extracted from a cached text layer, keyed by content hash"""
+    __tablename__ = 'event_cache'
+    __table_args__ = (
+        db.UniqueConstraint('file_hash', 'processor_version', 'extractor_version'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_hash = db.Column(db.String(64), nullable=False, index=True)
+    processor_version = db.Column(db.String(64), nullable=False)
+    extractor_version = db.Column(db.String(64), nullable=False)
+    events = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RetrievalIndexEntry(db.Model):
+    """A document's serialized chat retrieval index (see services/retrieval.py)"""
+    __tablename__ = 'retrieval_indexes'
+    
+    document_id = db.Column(
+        db.String(36),
+        db.ForeignKey('documents.id'),
+        primary_key=True
+    )
+    version = db.Column(db.String(16), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def pending_schema_changes():
+    """
+    Tables and columns of the models that the database lacks
+    
+    Only reads the schema, so it is cheap enough to run at startup;
+    ``upgrade_schema`` (``flask --app app db-upgrade``) applies them.
+    
+    Returns:
+        'table' and 'table.column' names; empty when the schema is current
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    pending = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            pending.append(table.name)
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        pending.extend(
+            f"{table.name}.{column.name}" for column in table.columns if column.name not in columns
+        )
+    return pending
+
+
+def upgrade_schema():
+    """
+    Bring an existing database up to the current models
+    
+    ``db.create_all`` creates missing tables but never alters existing ones;
+    this adds missing (nullable) columns and indexes to tables created by
+    older versions, and fills the added event timeline columns from the
+    stored event times. It can take a while on a large database, so it runs
+    from ``flask --app app db-upgrade`` rather than at import.
+    """
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    added = set()
+    
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    connection.execute(db.text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+                    added.add((table.name, column.name))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        
+        if added & {('events', 'start_at'), ('events', 'end_at'), ('events', 'sequence')}:
+            _backfill_event_timeline(connection)
+
+
+def _backfill_event_timeline(connection):
+    """
+    Fill start_at/end_at/sequence for events saved before those columns
+    existed, so older documents take part in range queries and sorting
+    
+    Events keep the order they were inserted in (the extractor's output
+    order) as their sequence; start times are normalized per document in
+    that order, as at extraction time. Summaries of the touched documents
+    are dropped and rebuilt from the events on next use.
+    """
+    events = Event.__table__
+    rows = connection.execute(
+        db.select(events.c.id, events.c.document_id, events.c.start_time, events.c.end_time)
+        .order_by(events.c.document_id, events.c.created_at, events.c.id)
+    ).all()
+    
+    updates = []
+    document_ids = []
+    for document_id, document_rows in groupby(rows, key=lambda row: row.document_id):
+        document_rows = list(document_rows)
+        document_ids.append(document_id)
+        starts = normalize_timestamps([row.start_time for row in document_rows])
+        for sequence, (row, start_at) in enumerate(zip(document_rows, starts)):
+            updates.append({
+                'event_id': row.id,
+                'start_at': start_at,
+                'end_at': parse_sof_datetime(row.end_time, start_at.date() if start_at else None),
+                'sequence': sequence
+            })
+    
+    if updates:
+        connection.execute(
+            events.update().where(events.c.id == db.bindparam('event_id')).values(
+                start_at=db.bindparam('start_at'),
+                end_at=db.bindparam('end_at'),
+                sequence=db.bindparam('sequence')
+            ),
+            updates
+        )
+        summaries = DocumentSummary.__table__
+        connection.execute(summaries.delete().where(summaries.c.document_id.in_(document_ids)))
+        logger.info(f"Backfilled timestamps of {len(updates)} events in {len(document_ids)} documents")
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Compiled Pattern Engine
+Precompiled, anchor-routed regex matching for maritime event patterns
+"""
+
+import re
+import time
+import heapq
+import logging
+from string import ascii_lowercase, ascii_uppercase
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
+try:
+    import ahocorasick  # type: ignore
+except ImportError:
+    ahocorasick = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+# Characters that ``re.IGNORECASE`` treats as equal to an ASCII letter.
+# Folding the text through this table lets the anchor scanner run
+# case-sensitively (much faster) while finding exactly the same offsets,
+# and unlike str.lower() it never changes the length of the text.
+_CASE_FOLD = {
+    ord(char): letter
+    for letter in ascii_lowercase
+    for char in ascii_uppercase + 'İıſK'
+    if re.fullmatch(letter, char, re.IGNORECASE)
+}
+
+_INLINE_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+_OPTIONAL_WORD = re.compile(r'\(\?:([A-Za-z]+)\\s[+*]\)\?')
+_WORD_ALTERNATION = re.compile(r'\(\?:([A-Za-z]+(?:\|[A-Za-z]+)*)\)')
+_LEADING_WORD = re.compile(r'[A-Za-z]+')
+_QUANTIFIERS = ('?', '*', '{')
+_WORD_BOUNDARY = r'\b'
+
+
+def derive_anchors(pattern: str) -> Optional[Tuple[str, ...]]:
+    """
+    Derive the literals a match of ``pattern`` must start with
+
+    Handles the shapes used in the extractor's pattern table: a leading
+    word (``pilot\\s+...``), optional leading words (``(?:vessel\\s+)?...``)
+    and word alternations (``(?:rain|storm|fog)``), each optionally
+    after a ``\\b`` word boundary.
+
+    Args:
+        pattern: Regular expression source
+
+    Returns:
+        Lower-cased anchor literals, or None if they cannot be derived
+        safely (the pattern is then scanned in full)
+    """
+    if _has_top_level_alternation(pattern):
+        return None
+
+    rest = pattern
+    flags = _INLINE_FLAGS.match(rest)
+    if flags:
+        rest = rest[flags.end():]
+    if rest.startswith(_WORD_BOUNDARY):
+        # Zero-width, so the match still starts with the same literal
+        rest = rest[len(_WORD_BOUNDARY):]
+
+    anchors = []
+    optional = _OPTIONAL_WORD.match(rest)
+    while optional:
+        anchors.append(optional.group(1).lower())
+        rest = rest[optional.end():]
+        optional = _OPTIONAL_WORD.match(rest)
+
+    alternation = _WORD_ALTERNATION.match(rest)
+    if alternation:
+        if rest[alternation.end():alternation.end() + 1] in _QUANTIFIERS:
+            return None
+        anchors.extend(word.lower() for word in alternation.group(1).split('|'))
+        return tuple(anchors)
+
+    word = _LEADING_WORD.match(rest)
+    if not word:
+        return None
+    literal = word.group(0)
+    if rest[word.end():word.end() + 1] in _QUANTIFIERS:
+        # e.g. ``operations?`` - the last letter is optional
+        literal = literal[:-1]
+    if not literal:
+        return None
+
+    anchors.append(literal.lower())
+    return tuple(anchors)
+
+
+def _has_top_level_alternation(pattern: str) -> bool:
+    """Check for a ``|`` outside any group or character class"""
+    depth = 0
+    in_class = False
+    escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            if char == ']':
+                in_class = False
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            return True
+    return False
+
+
+def _build_trie_regex(literals: List[str]) -> str:
+    """Build a prefix-factored alternation so the scanner branches per character"""
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [
+            re.escape(char) + emit(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = '(?:' + '|'.join(branches) + ')'
+        return body + '?' if '' in node else body
+
+    return emit(trie)
+
+
+class CompiledPattern:
+    """A single compiled event pattern and the literals it is anchored on"""
+
+    __slots__ = ('source', 'regex', 'anchors')
+
+    def __init__(self, source: str, flags: int = re.IGNORECASE):
+        self.source = source
+        self.regex = re.compile(source, flags)
+        self.anchors = derive_anchors(source)
+
+
+class AnchorIndex:
+    """
+    Multi-literal automaton over case-folded text
+
+    Uses pyahocorasick when it is installed; otherwise falls back to a
+    prefix-factored lookahead regex. Both backends report every occurrence
+    of every literal, including overlapping ones, in one pass.
+    """
+
+    def __init__(self, literals: Iterable[str]):
+        """
+        Args:
+            literals: Lower-cased literals to find
+        """
+        literals = sorted(set(literals))
+
+        self._automaton = None
+        self._scanner = None
+        if ahocorasick is not None and literals:
+            self._automaton = ahocorasick.Automaton()
+            for literal in literals:
+                self._automaton.add_word(literal, literal)
+            self._automaton.make_automaton()
+        elif literals:
+            # A match of the scanner reports the longest literal at an
+            # offset; every literal that is a prefix of it starts there too.
+            self._prefixes = {
+                literal: [other for other in literals if literal.startswith(other)]
+                for literal in literals
+            }
+            self._scanner = re.compile('(?=(%s))' % _build_trie_regex(literals))
+
+    @property
+    def backend(self) -> str:
+        return 'ahocorasick' if self._automaton is not None else 'regex'
+
+    def iter_hits(self, folded_text: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(start, literal)`` for every literal occurrence"""
+        if self._automaton is not None:
+            for end, literal in self._automaton.iter(folded_text):
+                yield end - len(literal) + 1, literal
+        elif self._scanner is not None:
+            for match in self._scanner.finditer(folded_text):
+                start = match.start()
+                for literal in self._prefixes[match.group(1)]:
+                    yield start, literal
+
+
+class PatternEngine:
+    """
+    Matches every event pattern against a document in a single anchor scan
+
+    All patterns are compiled once at construction. The anchor index holds
+    the anchor literals every match of a pattern must start with. ``scan``
+    folds the text and makes one pass over it, collecting the offsets of
+    every hit. ``iter_matches`` tries each anchored pattern only at the
+    offsets of its own anchors, so the anchors alone decide which patterns
+    run and where; text without a hit is never touched by an anchored regex.
+    An entry's ``keywords`` are not indexed, and there are no candidate
+    windows around keyword hits: the keyword lists do not cover every
+    pattern (the weather entry matches a bare "rain"), so they could not
+    gate matching without losing matches, and a keyword hit without an
+    anchor hit gives no offset to try a pattern at.
+
+    Matches are produced in exactly the order (and with exactly the spans)
+    that running ``re.finditer`` for every pattern of every entry would
+    give.
+    """
+
+    def __init__(self, event_patterns: List[Dict[str, Any]], flags: int = re.IGNORECASE,
+                 stats=None):
+        """
+        Args:
+            event_patterns: The extractor's pattern entries
+            flags: Regex flags for every pattern
+            stats: Optional recorder with ``record(entry, index, source, hits,
+                seconds)``, called once per pattern tried on a document
+        """
+        self.event_patterns = event_patterns
+        self.stats = stats
+        self.compiled = [
+            (pattern_info, [CompiledPattern(p, flags) for p in pattern_info['patterns']])
+            for pattern_info in event_patterns
+        ]
+
+        self.anchor_index = AnchorIndex(
+            anchor for _, patterns in self.compiled for compiled in patterns
+            for anchor in compiled.anchors or ()
+        )
+
+        unanchored = [c.source for _, patterns in self.compiled for c in patterns if c.anchors is None]
+        if unanchored:
+            logger.info(f"{len(unanchored)} patterns have no anchor literal and are scanned in full")
+
+    def scan(self, text: str) -> Dict[str, List[int]]:
+        """Offsets of every anchor hit, per anchor literal, in one pass"""
+        hits: Dict[str, List[int]] = {}
+        for start, literal in self.anchor_index.iter_hits(text.translate(_CASE_FOLD)):
+            hits.setdefault(literal, []).append(start)
+        return hits
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[Dict[str, Any], 're.Match']]:
+        """Yield ``(pattern_info, match)`` for every pattern match in the text"""
+        hits = self.scan(text)
+
+        for index, (pattern_info, patterns) in enumerate(self.compiled):
+            for pattern_index, compiled in enumerate(patterns):
+                if compiled.anchors is None:
+                    matches = compiled.regex.finditer(text)
+                elif any(anchor in hits for anchor in compiled.anchors):
+                    matches = self._match_at(compiled, text, hits)
+                else:
+                    continue
+
+                if self.stats is not None:
+                    # Match eagerly so the time measured is the regex's alone
+                    started = time.perf_counter()
+                    matches = list(matches)
+                    self.stats.record(
+                        pattern_info.get('name', str(index)), pattern_index,
+                        compiled.source, len(matches), time.perf_counter() - started
+                    )
+                for match in matches:
+                    yield pattern_info, match
+
+    @staticmethod
+    def _match_at(compiled: CompiledPattern, text: str,
+                  hits: Dict[str, List[int]]) -> Iterator['re.Match']:
+        """Emulate ``finditer`` by trying the pattern only at its anchor offsets"""
+        offsets = [hits[anchor] for anchor in compiled.anchors if anchor in hits]
+        if not offsets:
+            return
+
+        candidates = offsets[0] if len(offsets) == 1 else heapq.merge(*offsets)
+        search_from = 0
+        for start in candidates:
+            if start < search_from:
+                continue
+            match = compiled.regex.match(text, start)
+            if match:
+                yield match
+                search_from = max(match.end(), start + 1)
@@ -5,12 +5,24 @@ Handles chat functionality and intelligent responses about maritime documents
 
 import os
 import json
-import csv
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import tempfile
 import re
+import html
+
+from backend.models import DocumentSummary, Event
+
+try:
+    from backend.services.retrieval import RetrievalStore, best_excerpt, query_terms, EVENT
+except ImportError:
+    RetrievalStore = None  # type: ignore
+
+try:
+    from backend.services.laytime import LaytimeEngine, format_hours
+except ImportError:
+    LaytimeEngine = None  # type: ignore
+    format_hours = None  # type: ignore
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +31,9 @@ class AIService:
     
     def __init__(self):
         self.chat_context = {}
+        self.laytime_engine = LaytimeEngine() if LaytimeEngine is not None else None
+        self.retrieval = RetrievalStore() if RetrievalStore is not None else None
+        self.retrieval_top_k = 5
         self.response_templates = self._initialize_response_templates()
         
     def generate_response(self, message: str, document=None) -> str:
@@ -42,9 +57,9 @@ class AIService:
             query_type = self._classify_query(processed_message)
             
             # Generate response based on query type and document context
-            if document and document.events:
+            if document and self._document_summary(document).total_events:
                 response = self._generate_contextual_response(
-                    processed_message, query_type, document
+                    processed_message, query_type, document, message
                 )
             else:
                 response = self._generate_generic_response(processed_message, query_type)
@@ -133,55 +148,79 @@ class AIService:
         else:
             return 'general'
     
-    def _generate_contextual_response(self, message: str, query_type: str, document) -> str:
+    def _generate_contextual_response(self, message: str, query_type: str, document,
+                                      original_message: Optional[str] = None) -> str:
         """Generate response using document context"""
-        events = document.events
+        # Aggregate answers come from the summary row; the events are only
+        # loaded for answers that list individual events
+        summary = self._document_summary(document)
+        
+        # Every answer is backed by the passages that best match the
+        # question. Retrieval works on the user's own words; the
+        # preprocessed message has abbreviations expanded by substring
+        passages = self._retrieve_passages(original_message or message, document)
         
         if query_type == 'loading_time':
-            return self._generate_loading_time_response(events)
+            response = self._generate_loading_time_response(summary)
         elif query_type == 'arrival':
-            return self._generate_arrival_response(events)
+            response = self._generate_arrival_response(document.events)
         elif query_type == 'weather_delay':
-            return self._generate_weather_delay_response(events)
+            if not summary.weather_delays:
+                response = "No weather delays were detected in this SoF document."
+            else:
+                response = self._generate_weather_delay_response(document.events)
         elif query_type == 'pilot_operations':
-            return self._generate_pilot_operations_response(events)
+            response = self._generate_pilot_operations_response(document.events)
         elif query_type == 'summary':
-            return self._generate_summary_response(events, document)
+            response = self._generate_summary_response(summary, document)
         elif query_type == 'demurrage':
-            return self._generate_demurrage_response(events)
+            response = self._generate_demurrage_response(document.events)
+        elif any(phrase in message for phrase in ('how many', 'number of')):
+            response = self._generate_count_response(message, summary)
+        elif passages:
+            return (
+                "Here's what the document says that best matches your question:<br><br>"
+                + "<br>".join(passages)
+            )
         else:
-            return self._generate_general_contextual_response(message, events)
+            return self._generate_general_contextual_response(message, summary)
+        
+        if passages:
+            response += "<br><br><strong>From the document:</strong><br>" + "<br>".join(passages)
+        return response
+    
+    def _document_summary(self, document) -> DocumentSummary:
+        """The document's stored summary, or one computed in memory from its events"""
+        if document.summary is not None:
+            return document.summary
+        summary = DocumentSummary()
+        summary.reset()
+        summary.add_events(document.events)
+        return summary
     
-    def _generate_loading_time_response(self, events) -> str:
+    def _generate_loading_time_response(self, summary: DocumentSummary) -> str:
         """Generate response about loading time"""
-        loading_events = [e for e in events if e.event_type == 'loading']
-        
-        if not loading_events:
+        loading_hours = summary.loading_hours
+        if loading_hours is None:
             return "No loading operations were found in this document."
         
-        total_hours = 0
-        loading_details = []
+        loading_details = [
+            f"• Loading Commenced: {summary.loading_started_at.strftime('%Y-%m-%d %H:%M')}",
+            f"• Loading Completed: {summary.loading_completed_at.strftime('%Y-%m-%d %H:%M')}"
+        ]
         
-        for event in loading_events:
-            if event.duration:
-                try:
-                    # Parse duration (assuming format like "1:30:00")
-                    parts = event.duration.split(':')
-                    if len(parts) >= 2:
-                        hours = float(parts[0]) + float(parts[1]) / 60
-                        total_hours += hours
-                        loading_details.append(f"• {event.event_name}: {event.duration}")
-                except:
-                    loading_details.append(f"• {event.event_name}: Duration not specified")
-        
-        weather_delays = [e for e in events if e.event_type == 'weather']
         additional_info = ""
-        if weather_delays:
-            additional_info = f"The weather delay caused a <strong>{weather_delays[0].duration or '1.5 hour'}</strong> interruption."
+        if summary.weather_delay_hours:
+            additional_info = (
+                f"Weather delays account for <strong>{summary.weather_delay_hours:.1f} hours</strong> "
+                f"over {summary.weather_delays} reported delay{'s' if summary.weather_delays > 1 else ''}."
+            )
+        elif summary.weather_delays:
+            additional_info = f"{summary.weather_delays} weather delay(s) were reported without a recorded duration."
         
         return self.response_templates['loading_time']['template'].format(
-            total_hours=f"{total_hours:.1f}",
-            loading_details="<br>".join(loading_details) if loading_details else "• Loading operations detected",
+            total_hours=f"{loading_hours:.1f}",
+            loading_details="<br>".join(loading_details),
             additional_info=additional_info
         )
     
@@ -275,104 +314,172 @@ class AIService:
             pilot_details="".join(pilot_details)
         )
     
-    def _generate_summary_response(self, events, document) -> str:
+    def _generate_summary_response(self, summary: DocumentSummary, document) -> str:
         """Generate summary response"""
-        total_events = len(events)
-        
-        # Group events by type
-        event_types = {}
-        for event in events:
-            event_types[event.event_type] = event_types.get(event.event_type, 0) + 1
+        event_types = json.loads(summary.event_types or '{}')
         
         # Generate operations summary
         operations_summary = []
-        arrival_events = [e for e in events if e.event_type == 'arrival']
-        if arrival_events:
-            operations_summary.append(f"• Arrival: {arrival_events[0].start_time or 'Time not specified'}")
-        
-        berthing_events = [e for e in events if e.event_type == 'berthing']
-        if berthing_events:
-            operations_summary.append(f"• Berthing: {berthing_events[0].start_time or 'Time not specified'}")
-        
-        loading_events = [e for e in events if e.event_type == 'loading']
-        if loading_events:
-            total_loading_time = sum(
-                self._parse_duration_to_hours(e.duration) for e in loading_events 
-                if e.duration
+        vessel_name = getattr(document, 'vessel_name', None)
+        if vessel_name:
+            imo = f" (IMO {document.imo_number})" if document.imo_number else ""
+            operations_summary.append(f"• Vessel: {vessel_name}{imo}")
+        port_name = getattr(document, 'port_name', None)
+        if port_name:
+            berth = ", ".join(part for part in (document.terminal, document.berth) if part)
+            operations_summary.append(f"• Port: {port_name}{f' ({berth})' if berth else ''}")
+        if summary.first_event_at and summary.last_event_at:
+            operations_summary.append(
+                f"• Timeline: {summary.first_event_at.strftime('%Y-%m-%d %H:%M')} to "
+                f"{summary.last_event_at.strftime('%Y-%m-%d %H:%M')}"
             )
-            operations_summary.append(f"• Loading: {total_loading_time:.1f}+ hours")
+        for event_type in ('arrival', 'berthing', 'cargo', 'departure'):
+            if event_types.get(event_type):
+                operations_summary.append(f"• {event_type.title()}: {event_types[event_type]} event(s)")
         
-        departure_events = [e for e in events if e.event_type == 'departure']
-        if departure_events:
-            operations_summary.append(f"• Departure: {departure_events[0].start_time or 'Time not specified'}")
+        loading_hours = summary.loading_hours
+        if loading_hours is not None:
+            operations_summary.append(f"• Loading: {loading_hours:.1f} hours")
         
         # Generate issues summary
         issues_summary = []
-        weather_events = [e for e in events if e.event_type == 'weather']
-        if weather_events:
-            issues_summary.append(f"• {len(weather_events)} weather delay(s)")
+        if summary.weather_delays:
+            delay_hours = f", {summary.weather_delay_hours:.1f} hours" if summary.weather_delay_hours else ""
+            issues_summary.append(f"• {summary.weather_delays} weather delay(s){delay_hours}")
         
         issues_summary.append("• All operations completed successfully")
         
         # Calculate average confidence
-        avg_confidence = sum(e.confidence for e in events) / len(events) if events else 0
-        issues_summary.append(f"• High confidence scores ({avg_confidence*100:.0f}% average)")
+        issues_summary.append(f"• High confidence scores ({summary.average_confidence*100:.0f}% average)")
         
         return self.response_templates['summary']['template'].format(
-            total_events=total_events,
+            total_events=summary.total_events,
             operations_summary="<br>".join(operations_summary),
             issues_summary="<br>".join(issues_summary)
         )
     
     def _generate_demurrage_response(self, events) -> str:
         """Generate demurrage calculation response"""
-        # Calculate various time components
-        total_port_time = "2d 10h 15m"  # Default values
-        operating_time = "1d 19h 45m"
-        weather_delays = "0h 00m"
-        waiting_time = "12h 30m"
-        
-        # Try to calculate from actual events
-        weather_events = [e for e in events if e.event_type == 'weather']
-        if weather_events:
-            total_weather_delay = sum(
-                self._parse_duration_to_hours(e.duration) for e in weather_events 
-                if e.duration
+        if self.laytime_engine is None:
+            return "Laytime calculation is not available on this server."
+        
+        result = self.laytime_engine.compute_document(events)
+        if result['status'] != 'complete':
+            return (
+                f"I couldn't calculate laytime for this document ({result['reason']}). Laytime needs NOR tendered (or cargo "
+                "commencement) and completion of cargo operations with their times."
             )
-            weather_delays = f"{int(total_weather_delay)}h {int((total_weather_delay % 1) * 60)}m"
         
-        return self.response_templates['demurrage']['template'].format(
-            total_port_time=total_port_time,
-            operating_time=operating_time,
-            weather_delays=weather_delays,
-            waiting_time=waiting_time
+        response = self.response_templates['demurrage']['template'].format(
+            total_port_time=format_hours(result['port_hours']),
+            operating_time=format_hours(result['laytime_used_hours']),
+            weather_delays=format_hours(result['excluded_hours']),
+            waiting_time=format_hours(result['waiting_hours'])
         )
+        
+        terms = result['terms']
+        if result['on_demurrage']:
+            outcome = (
+                f"With {format_hours(terms['allowed_hours'])} laytime allowed, the vessel was on "
+                f"demurrage for <strong>{format_hours(result['demurrage_hours'])}</strong>."
+            )
+        else:
+            outcome = (
+                f"With {format_hours(terms['allowed_hours'])} laytime allowed, "
+                f"<strong>{format_hours(result['despatch_hours'])}</strong> of laytime was saved."
+            )
+        return response.replace('<br><br><em>', f"<br><br>{outcome}<br><br><em>", 1)
     
-    def _generate_general_contextual_response(self, message: str, events) -> str:
+    def _generate_count_response(self, message: str, summary: DocumentSummary) -> str:
+        """Answer "how many" questions from the summary's event counts"""
+        event_types = json.loads(summary.event_types or '{}')
+        asked = [event_type for event_type in event_types if event_type in message]
+        if asked:
+            counts = [
+                f"• {event_type.title()}: <strong>{event_types[event_type]}</strong> event(s)"
+                for event_type in asked
+            ]
+            return "Counted in this document:<br><br>" + "<br>".join(counts)
+        
+        counts = [
+            f"• {event_type.title()}: {count}"
+            for event_type, count in sorted(event_types.items(), key=lambda item: -item[1])
+        ]
+        return (
+            f"This document has <strong>{summary.total_events} events</strong>:<br><br>"
+            + "<br>".join(counts)
+        )
+    
+    def _retrieve_passages(self, message: str, document) -> List[str]:
+        """
+        The document's events and page text that best match the question
+        (BM25 over the document's retrieval index), formatted as bullets
+        
+        Returns:
+            One HTML line per passage, best first; empty if nothing matches
+        """
+        if self.retrieval is None:
+            return []
+        
+        index = self.retrieval.get(document)
+        hits = index.search(message, self.retrieval_top_k)
+        if not hits:
+            return []
+        
+        terms = query_terms(message)
+        sequences = [hit.ref for hit in hits if hit.kind == EVENT]
+        events = {}
+        if sequences:
+            events = {
+                event.sequence: event
+                for event in Event.query.filter(
+                    Event.document_id == document.id, Event.sequence.in_(sequences)
+                )
+            }
+        
+        details = []
+        seen_excerpts = set()
+        for hit in hits:
+            if hit.kind == EVENT:
+                event = events.get(hit.ref)
+                if event is None:
+                    continue
+                excerpt = best_excerpt(event.remarks or '', terms)
+                detail = f"• <strong>{html.escape(event.event_name)}</strong>"
+                if event.start_time:
+                    detail += f" at {html.escape(event.start_time)}"
+                if event.location:
+                    detail += f" ({html.escape(event.location)})"
+            else:
+                excerpt = best_excerpt((document.text_content or '')[hit.start:hit.end], terms)
+                detail = f"• Page {hit.ref}"
+            if excerpt:
+                if excerpt in seen_excerpts:
+                    continue
+                seen_excerpts.add(excerpt)
+                detail += f"<br>&nbsp;&nbsp;<em>\"{html.escape(excerpt)}\"</em>"
+            details.append(detail)
+        return details
+    
+    def _generate_general_contextual_response(self, message: str, summary: DocumentSummary) -> str:
         """Generate general response using document context"""
-        total_events = len(events)
+        total_events = summary.total_events
         
         # Get time range
-        start_times = [e.start_time for e in events if e.start_time]
-        if start_times:
-            first_event = min(start_times)
-            last_event = max(start_times)
-            time_range = f"from <strong>{first_event.split()[0] if ' ' in first_event else first_event}</strong> to <strong>{last_event.split()[0] if ' ' in last_event else last_event}</strong>"
+        if summary.first_event_at and summary.last_event_at:
+            time_range = (
+                f"from <strong>{summary.first_event_at.date().isoformat()}</strong> "
+                f"to <strong>{summary.last_event_at.date().isoformat()}</strong>"
+            )
         else:
             time_range = "over the documented period"
         
-        # Generate contextual response
-        responses = [
-            f"I'm analyzing your question about \"{message}\".<br><br>Based on the extracted events, I can see operations spanning {time_range} with <strong>{total_events} total events</strong>.<br><br>Could you be more specific about what you'd like to know?",
-            
-            f"That's an interesting question about your SoF document.<br><br>I have data on <strong>{total_events} events</strong> including arrivals, loading operations, and departures.<br><br>Could you rephrase your question or try one of the suggested queries?",
-            
-            f"I'd be happy to help with that!<br><br>Your document contains detailed information about vessel operations spanning {time_range}.<br><br>Try asking about specific events, timelines, or operational aspects for more detailed insights."
-        ]
-        
-        # Select response based on message content
-        import random
-        return random.choice(responses)
+        # Nothing in the document matched the question
+        return (
+            f"I couldn't find anything about \"{html.escape(message)}\" in this document.<br><br>"
+            f"It covers <strong>{total_events} events</strong> spanning {time_range}.<br><br>"
+            "Try asking about specific events, timelines, or operational aspects for more detailed insights."
+        )
     
     def _generate_generic_response(self, message: str, query_type: str) -> str:
         """Generate generic response when no document context is available"""
@@ -394,155 +501,3 @@ class AIService:
     def _get_error_response(self) -> str:
         """Get error response when something goes wrong"""
         return "I apologize, but I'm having trouble processing your request right now. Please try rephrasing your question or contact support if the issue persists."
-    
-    def _parse_duration_to_hours(self, duration_str: str) -> float:
-        """Parse duration string to hours"""
-        try:
-            if not duration_str:
-                return 0.0
-            
-            # Handle format like "1:30:00" or "1:30"
-            parts = duration_str.split(':')
-            if len(parts) >= 2:
-                hours = float(parts[0])
-                minutes = float(parts[1])
-                return hours + minutes / 60
-            
-            return 0.0
-        except:
-            return 0.0
-    
-    def export_to_csv(self, document, include_confidence=True, 
-                     include_remarks=True, include_metadata=False) -> str:
-        """
-        Export document events to CSV format
-        
-        Args:
-            document: Document object with events
-            include_confidence: Include confidence scores
-            include_remarks: Include remarks
-            include_metadata: Include document metadata
-            
-        Returns:
-            Path to generated CSV file
-        """
-        try:
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(
-                mode='w', suffix='.csv', delete=False, encoding='utf-8'
-            )
-            
-            writer = csv.writer(temp_file)
-            
-            # Write header
-            header = ['Event', 'Event Type', 'Start Time', 'End Time', 'Duration', 'Location']
-            if include_confidence:
-                header.append('Confidence')
-            if include_remarks:
-                header.append('Remarks')
-            
-            writer.writerow(header)
-            
-            # Write events
-            for event in document.events:
-                row = [
-                    event.event_name or '',
-                    event.event_type or '',
-                    event.start_time or '',
-                    event.end_time or '',
-                    event.duration or '',
-                    event.location or ''
-                ]
-                
-                if include_confidence:
-                    row.append(f"{event.confidence * 100:.0f}%" if event.confidence else '')
-                
-                if include_remarks:
-                    row.append(event.remarks or '')
-                
-                writer.writerow(row)
-            
-            # Add metadata if requested
-            if include_metadata:
-                writer.writerow([])  # Empty row
-                writer.writerow(['Document Metadata:'])
-                writer.writerow(['Original Filename', document.original_filename or 'Unknown'])
-                writer.writerow(['Processing Date', datetime.utcnow().isoformat()])
-                writer.writerow(['Total Events', len(document.events)])
-                writer.writerow(['File Size', f"{document.file_size} bytes" if document.file_size else 'Unknown'])
-            
-            temp_file.close()
-            
-            logger.info(f"CSV export completed: {temp_file.name}")
-            return temp_file.name
-            
-        except Exception as e:
-            logger.error(f"CSV export failed: {str(e)}")
-            raise
-    
-    def export_to_json(self, document, include_confidence=True, 
-                      include_remarks=True, include_metadata=False) -> str:
-        """
-        Export document events to JSON format
-        
-        Args:
-            document: Document object with events
-            include_confidence: Include confidence scores
-            include_remarks: Include remarks
-            include_metadata: Include document metadata
-            
-        Returns:
-            Path to generated JSON file
-        """
-        try:
-            # Create temporary file
-            temp_file = tempfile.NamedTemporaryFile(
-                mode='w', suffix='.json', delete=False, encoding='utf-8'
-            )
-            
-            # Prepare export data
-            export_data = {
-                'events': []
-            }
-            
-            # Add events
-            for event in document.events:
-                event_data = {
-                    'event': event.event_name,
-                    'event_type': event.event_type,
-                    'start_time': event.start_time,
-                    'end_time': event.end_time,
-                    'duration': event.duration,
-                    'location': event.location
-                }
-                
-                if include_confidence:
-                    event_data['confidence'] = event.confidence
-                
-                if include_remarks:
-                    event_data['remarks'] = event.remarks
-                
-                # Remove None values
-                event_data = {k: v for k, v in event_data.items() if v is not None}
-                export_data['events'].append(event_data)
-            
-            # Add metadata if requested
-            if include_metadata:
-                export_data['metadata'] = {
-                    'original_filename': document.original_filename,
-                    'processing_date': datetime.utcnow().isoformat(),
-                    'total_events': len(document.events),
-                    'file_size': document.file_size,
-                    'extraction_method': 'hybrid_nlp_regex'
-                }
-            
-            # Write JSON
-            json.dump(export_data, temp_file, indent=2, ensure_ascii=False)
-            temp_file.close()
-            
-            logger.info(f"JSON export completed: {temp_file.name}")
-            return temp_file.name
-            
-        except Exception as e:
-            logger.error(f"JSON export failed: {str(e)}")
-            raise
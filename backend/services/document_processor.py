@@ -4,37 +4,165 @@ Handles text extraction from PDF, DOC, and DOCX files
 """
 
 import os
+import re
+import time
 import logging
-from typing import Dict, Any
-try:
-    import PyPDF2  # type: ignore
-except Exception:
-    PyPDF2 = None  # type: ignore
-try:
-    from docx import Document as DocxDocument  # type: ignore
-except Exception:
-    DocxDocument = None  # type: ignore
+import multiprocessing
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 import tempfile
 import subprocess
 from pathlib import Path
 
+from backend.utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+# Bump when a change to text extraction should invalidate cached text
+PROCESSOR_VERSION = '2'
+
+# PDF text layers, fastest first
+PDF_TEXT_LAYERS = ('pymupdf', 'pypdf2', 'pdfplumber')
+
+# A page whose text layer has fewer letters/digits than this is treated as
+# an image and OCRed
+MIN_PAGE_ALNUM = 10
+# Share of readable characters below which a text layer is garbage (broken
+# font encodings come out as (cid:NN) runs, replacement chars or symbols)
+MIN_READABLE_RATIO = 0.75
+CID_RE = re.compile(r'\(cid:\d+\)')
+READABLE_PUNCTUATION = set('.,:;-/()[]&%#@\'"+*=_!?|<>~')
+
+# Messages extract_text returns instead of text when OCR could not run
+OCR_FAILURE_PREFIXES = ('OCR_UNAVAILABLE:', 'OCR_FAILED:', 'OCR_ERROR:')
+# Page method of a page whose OCR raised an error
+OCR_FAILED_METHOD = 'ocr:failed'
+
+
+class PageText:
+    """Text of one PDF page and the method that produced it"""
+    
+    __slots__ = ('page_number', 'text', 'method', 'elapsed')
+    
+    def __init__(self, page_number: int, text: str = '', method: str = 'none',
+                 elapsed: float = 0.0):
+        self.page_number = page_number
+        self.text = text
+        self.method = method
+        self.elapsed = elapsed
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'page_number': self.page_number,
+            'text': self.text,
+            'method': self.method,
+            'elapsed': round(self.elapsed, 4)
+        }
+
+
+def classify_page_text(text: Optional[str]) -> str:
+    """
+    Classify a page's text layer
+    
+    Returns:
+        'ok', 'empty' (no usable text - an image page) or 'garbage'
+        (text is there but unreadable)
+    """
+    stripped = CID_RE.sub('\ufffd', (text or '').strip())
+    alnum = sum(1 for char in stripped if char.isalnum())
+    if alnum < MIN_PAGE_ALNUM:
+        return 'garbage' if '\ufffd' in stripped else 'empty'
+    
+    readable = sum(
+        1 for char in stripped
+        if char.isalnum() or char.isspace() or char in READABLE_PUNCTUATION
+    )
+    return 'ok' if readable / len(stripped) >= MIN_READABLE_RATIO else 'garbage'
+
+
+def summarize_page_methods(pages: List[PageText]) -> Dict[str, Dict[str, Any]]:
+    """Pages and seconds spent per extraction method"""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for page in pages:
+        entry = summary.setdefault(page.method, {'pages': 0, 'seconds': 0.0})
+        entry['pages'] += 1
+        entry['seconds'] += page.elapsed
+    for entry in summary.values():
+        entry['seconds'] = round(entry['seconds'], 3)
+    return summary
+
+
+def text_is_final(text_content: str, pages: List[PageText]) -> bool:
+    """
+    Whether extracted text is worth caching
+    
+    It is not when extraction returned an OCR failure message, or when a
+    page that needed OCR has no text because OCR was unavailable or failed
+    on it (e.g. Tesseract missing, or a worker crash): installing OCR or
+    simply retrying would give a different result.
+    """
+    if text_content.startswith(OCR_FAILURE_PREFIXES):
+        return False
+    return not any(
+        page.method in ('none', OCR_FAILED_METHOD) or page.method.endswith(':garbage')
+        for page in pages
+    )
+
+
+def _init_ocr_worker():
+    """Keep each Tesseract process single-threaded; the pool supplies the parallelism"""
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+
+def _ocr_page(task: Tuple[str, int, int]) -> Tuple[int, str, Optional[str], float]:
+    """
+    Render and OCR a single PDF page (runs in an OCR worker process)
+    
+    Returns:
+        (page_number, stripped text, error message or None, seconds taken)
+    """
+    file_path, page_number, dpi = task
+    started = time.perf_counter()
+    try:
+        import pytesseract
+        from pdf2image import convert_from_path
+        
+        images = convert_from_path(
+            file_path, dpi=dpi, first_page=page_number, last_page=page_number
+        )
+        text = '\n'.join(
+            pytesseract.image_to_string(image, lang='eng') for image in images
+        )
+        return page_number, text.strip(), None, time.perf_counter() - started
+    except Exception as e:
+        return page_number, '', str(e), time.perf_counter() - started
+
 
 class DocumentProcessor:
     """Service for processing and extracting text from various document formats"""
     
-    def __init__(self):
+    def __init__(self, ocr_workers: Optional[int] = None, ocr_dpi: int = 300):
         self.supported_formats = {
             '.pdf', '.doc', '.docx', '.txt'
         }
+        # OCR runs one page per worker process, sized to the cores by default
+        self.ocr_workers = ocr_workers or os.cpu_count() or 1
+        self.ocr_dpi = ocr_dpi
+    
+    @property
+    def version(self) -> str:
+        """Identifies the text this processor produces, for the extraction cache"""
+        return f"{PROCESSOR_VERSION}-dpi{self.ocr_dpi}"
         
-    def extract_text(self, file_path: str) -> str:
+    def extract_text(self, file_path: str, page_report: Optional[List[PageText]] = None) -> str:
         """
         Extract text content from document
         
         Args:
             file_path: Path to the document file
+            page_report: Optional list that receives a PageText per PDF
+                page, recording the method used and the time it took
             
         Returns:
             Extracted text content
@@ -53,123 +181,159 @@ class DocumentProcessor:
             
             logger.info(f"Extracting text from {file_extension} file: {file_path}")
             
-            if file_extension == '.pdf':
-                if PyPDF2 is None:
-                    raise ImportError("PyPDF2 is required to process PDF files")
-                return self._extract_from_pdf(file_path)
-            elif file_extension == '.docx':
-                if DocxDocument is None:
-                    raise ImportError("python-docx is required to process DOCX files")
-                return self._extract_from_docx(file_path)
-            elif file_extension == '.doc':
-                return self._extract_from_doc(file_path)
-            elif file_extension == '.txt':
-                return self._extract_from_txt(file_path)
+            with metrics.stage('extract_text', file_extension.lstrip('.')):
+                if file_extension == '.pdf':
+                    return self._extract_from_pdf(file_path, page_report)
+                elif file_extension == '.docx':
+                    return self._extract_from_docx(file_path)
+                elif file_extension == '.doc':
+                    return self._extract_from_doc(file_path)
+                elif file_extension == '.txt':
+                    return self._extract_from_txt(file_path)
             
         except Exception as e:
             logger.error(f"Text extraction failed for {file_path}: {str(e)}")
             raise
     
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file using multiple methods"""
+    def _extract_from_pdf(self, file_path: str,
+                          page_report: Optional[List[PageText]] = None) -> str:
+        """Extract text from PDF file, choosing the extraction method per page"""
         try:
-            # Method 1: Try PyPDF2 first
-            if PyPDF2 is not None:
-                try:
-                    text_content = []
-                    with open(file_path, 'rb') as file:
-                        pdf_reader = PyPDF2.PdfReader(file)
-                        
-                        for page_num, page in enumerate(pdf_reader.pages):
-                            try:
-                                page_text = page.extract_text()
-                                if page_text.strip():
-                                    text_content.append(
-                                        f"--- Page {page_num + 1} ---\n{page_text}"
-                                    )
-                            except Exception as e:
-                                logger.warning(
-                                    f"Failed to extract text from page "
-                                    f"{page_num + 1}: {str(e)}"
-                                )
-                                continue
-                    
-                    if text_content:
-                        logger.info("PyPDF2 extraction successful")
-                        return '\n\n'.join(text_content)
-                except Exception as e:
-                    logger.warning(f"PyPDF2 extraction failed: {str(e)}")
+            pages = self.extract_pdf_pages(file_path)
+            if pages is None:
+                # No text layer library could open the file
+                logger.warning("All direct text extraction methods failed, trying OCR")
+                return self._try_ocr_extraction(file_path, page_report)
+            
+            if page_report is not None:
+                page_report.extend(pages)
+            
+            text_content = [
+                f"--- Page {page.page_number} ---\n{page.text}"
+                for page in pages if page.text.strip()
+            ]
+            if text_content:
+                return '\n\n'.join(text_content)
+            
+            return (
+                self._ocr_unavailable_reason()
+                or "OCR_FAILED: Text extraction failed for all document pages."
+            )
             
-            # Method 2: Try PyMuPDF (fitz)
-            try:
-                import fitz
-                text_content = []
-                doc = fitz.open(file_path)
-                
-                for page_num in range(len(doc)):
+        except Exception as e:
+            logger.error(f"PDF extraction error: {str(e)}")
+            raise
+    
+    def extract_pdf_pages(self, file_path: str) -> Optional[List[PageText]]:
+        """
+        Extract each PDF page with the cheapest method that yields usable text
+        
+        Pages are read from the fastest available text layer. A page with
+        garbage text is retried on the next layer; pages with no usable
+        text (scanned images) are OCRed together in the worker pool.
+        
+        Args:
+            file_path: Path to the PDF file
+            
+        Returns:
+            One PageText per page in page order, or None if no text layer
+            library could open the file
+        """
+        with ExitStack() as stack:
+            opened: Dict[str, Optional[Tuple[int, Any]]] = {}
+            
+            def open_layer(method):
+                # Slower layers are only opened once a page needs them
+                if method not in opened:
+                    opened[method] = None
                     try:
-                        page = doc.load_page(page_num)
-                        page_text = page.get_text()
-                        if page_text.strip():
-                            text_content.append(
-                                f"--- Page {page_num + 1} ---\n{page_text}"
-                            )
+                        opened[method] = getattr(self, f'_open_{method}')(file_path, stack)
+                    except ImportError:
+                        logger.info(f"{method} not available")
                     except Exception as e:
-                        logger.warning(
-                            f"PyMuPDF failed for page {page_num + 1}: {str(e)}"
-                        )
+                        logger.warning(f"{method} could not open PDF: {str(e)}")
+                return opened[method]
+            
+            total_pages = next(
+                (layer[0] for layer in map(open_layer, PDF_TEXT_LAYERS) if layer), None
+            )
+            if total_pages is None:
+                return None
+            
+            pages = []
+            needs_ocr = []
+            for index in range(total_pages):
+                page = PageText(index + 1)
+                for method in PDF_TEXT_LAYERS:
+                    layer = open_layer(method)
+                    if layer is None or index >= layer[0]:
                         continue
+                    get_text = layer[1]
+                    started = time.perf_counter()
+                    try:
+                        text = get_text(index) or ''
+                    except Exception as e:
+                        logger.warning(f"{method} failed for page {index + 1}: {str(e)}")
+                        text = ''
+                    elapsed = time.perf_counter() - started
+                    page.elapsed += elapsed
+                    metrics.stage_seconds.observe(elapsed, stage='pdf_page', backend=method)
+                    
+                    quality = classify_page_text(text)
+                    if quality == 'ok':
+                        page.text, page.method = text, method
+                        break
+                    if quality == 'garbage' and not page.text:
+                        # Kept in case OCR does no better
+                        page.text, page.method = text, f'{method}:garbage'
+                    if quality == 'empty':
+                        # Other text layers will not find text on an image page
+                        break
                 
-                doc.close()
-                
-                if text_content:
-                    logger.info("PyMuPDF extraction successful")
-                    return '\n\n'.join(text_content)
-            except ImportError:
-                logger.info("PyMuPDF not available")
-            except Exception as e:
-                logger.warning(f"PyMuPDF extraction failed: {str(e)}")
-            
-            # Method 3: Try pdfplumber
-            try:
-                import pdfplumber
-                text_content = []
-                
-                with pdfplumber.open(file_path) as pdf:
-                    for page_num, page in enumerate(pdf.pages):
-                        try:
-                            page_text = page.extract_text()
-                            if page_text and page_text.strip():
-                                text_content.append(
-                                    f"--- Page {page_num + 1} ---\n{page_text}"
-                                )
-                        except Exception as e:
-                            logger.warning(
-                                f"pdfplumber failed for page {page_num + 1}: {str(e)}"
-                            )
-                            continue
-                
-                if text_content:
-                    logger.info("pdfplumber extraction successful")
-                    return '\n\n'.join(text_content)
-            except ImportError:
-                logger.info("pdfplumber not available")
-            except Exception as e:
-                logger.warning(f"pdfplumber extraction failed: {str(e)}")
-            
-            # Method 4: Try OCR as final fallback
-            logger.warning("All direct text extraction methods failed, trying OCR")
-            return self._try_ocr_extraction(file_path)
-            
-        except Exception as e:
-            logger.error(f"PDF extraction error: {str(e)}")
-            raise
+                if page.method not in PDF_TEXT_LAYERS:
+                    needs_ocr.append(page)
+                pages.append(page)
+        
+        if needs_ocr:
+            reason = self._ocr_unavailable_reason()
+            if reason:
+                logger.warning(f"{len(needs_ocr)} pages need OCR but it is unavailable")
+            else:
+                logger.info(f"OCR needed for pages: {[page.page_number for page in needs_ocr]}")
+                ocr_pages = self._ocr_pages(file_path, [page.page_number for page in needs_ocr])
+                for page, ocr_page in zip(needs_ocr, ocr_pages):
+                    page.elapsed += ocr_page.elapsed
+                    if ocr_page.text or not page.text:
+                        # A blank page OCRs to nothing; a failed one stays 'ocr:failed'
+                        page.text, page.method = ocr_page.text, ocr_page.method
+        
+        logger.info(f"PDF page methods: {summarize_page_methods(pages)}")
+        return pages
+    
+    def _open_pymupdf(self, file_path: str, stack: ExitStack):
+        import fitz
+        doc = fitz.open(file_path)
+        stack.callback(doc.close)
+        return len(doc), lambda index: doc.load_page(index).get_text()
+    
+    def _open_pypdf2(self, file_path: str, stack: ExitStack):
+        import PyPDF2
+        pdf_reader = PyPDF2.PdfReader(stack.enter_context(open(file_path, 'rb')))
+        return len(pdf_reader.pages), lambda index: pdf_reader.pages[index].extract_text()
+    
+    def _open_pdfplumber(self, file_path: str, stack: ExitStack):
+        import pdfplumber
+        pdf = stack.enter_context(pdfplumber.open(file_path))
+        return len(pdf.pages), lambda index: pdf.pages[index].extract_text()
     
     def _extract_from_docx(self, file_path: str) -> str:
         """Extract text from DOCX file"""
         try:
-            if DocxDocument is None:
-                raise ImportError("python-docx is not installed")
+            from docx import Document as DocxDocument
+        except ImportError:
+            raise ImportError("python-docx is required to process DOCX files")
+        
+        try:
             doc = DocxDocument(file_path)
             text_content = []
             
@@ -287,45 +451,52 @@ class DocumentProcessor:
             logger.error(f"TXT extraction error: {str(e)}")
             raise
     
-    def _try_ocr_extraction(self, file_path: str) -> str:
-        """Try OCR extraction for image-based PDFs"""
+    def _ocr_unavailable_reason(self) -> Optional[str]:
+        """Return an OCR_UNAVAILABLE message if OCR cannot run, else None"""
         try:
             import pytesseract
-            from pdf2image import convert_from_path
-            from PIL import Image
-            
+            import pdf2image  # noqa: F401
+        except ImportError as e:
+            logger.error(f"OCR libraries not available: {str(e)}")
+            return "OCR_UNAVAILABLE: OCR processing requires pytesseract, pdf2image, and Pillow libraries. Please install them for image-based PDF processing."
+        
+        # Check if Tesseract is available
+        try:
+            tesseract_version = pytesseract.get_tesseract_version()
+            logger.info(f"Tesseract version: {tesseract_version}")
+        except Exception as e:
+            logger.error(f"Tesseract not available: {str(e)}")
+            return "OCR_UNAVAILABLE: Tesseract OCR engine is not installed. Please install Tesseract for Windows to enable OCR processing of image-based PDFs. Download from: https://github.com/UB-Mannheim/tesseract/wiki"
+        return None
+    
+    def _try_ocr_extraction(self, file_path: str,
+                            page_report: Optional[List[PageText]] = None) -> str:
+        """Try OCR extraction for image-based PDFs"""
+        try:
             logger.info("Attempting OCR extraction for image-based PDF")
             
-            # Check if Tesseract is available
-            try:
-                tesseract_version = pytesseract.get_tesseract_version()
-                logger.info(f"Tesseract version: {tesseract_version}")
-            except Exception as e:
-                logger.error(f"Tesseract not available: {str(e)}")
-                return "OCR_UNAVAILABLE: Tesseract OCR engine is not installed. Please install Tesseract for Windows to enable OCR processing of image-based PDFs. Download from: https://github.com/UB-Mannheim/tesseract/wiki"
+            reason = self._ocr_unavailable_reason()
+            if reason:
+                return reason
             
-            # Convert PDF pages to images
+            # Pages are rendered one at a time by the OCR workers, so only
+            # the page count is needed up front
             try:
-                images = convert_from_path(file_path, dpi=300)
-                logger.info(f"Converted PDF to {len(images)} images for OCR")
+                from pdf2image import pdfinfo_from_path
+                page_count = int(pdfinfo_from_path(file_path)['Pages'])
+                logger.info(f"Running OCR on {page_count} pages")
             except Exception as e:
                 logger.warning(f"PDF to image conversion failed: {str(e)}")
                 return "OCR_FAILED: Unable to convert PDF pages to images for OCR processing. This may be due to missing Poppler utilities."
             
-            # Extract text from each image using OCR
-            extracted_texts = []
-            for i, image in enumerate(images):
-                try:
-                    # Use pytesseract for OCR
-                    text = pytesseract.image_to_string(image, lang='eng')
-                    if text.strip():
-                        extracted_texts.append(f"--- Page {i+1} ---\n{text.strip()}")
-                        logger.info(f"OCR successful for page {i+1}")
-                    else:
-                        logger.warning(f"OCR returned empty text for page {i+1}")
-                except Exception as e:
-                    logger.warning(f"OCR failed for page {i+1}: {str(e)}")
-                    continue
+            pages = self._ocr_pages(file_path, range(1, page_count + 1))
+            if page_report is not None:
+                page_report.extend(pages)
+            
+            extracted_texts = [
+                f"--- Page {page.page_number} ---\n{page.text}"
+                for page in pages if page.text
+            ]
             
             if extracted_texts:
                 full_text = '\n\n'.join(extracted_texts)
@@ -335,13 +506,57 @@ class DocumentProcessor:
                 logger.warning("OCR extraction failed for all pages")
                 return "OCR_FAILED: Text extraction failed for all document pages."
                 
-        except ImportError as e:
-            logger.error(f"OCR libraries not available: {str(e)}")
-            return "OCR_UNAVAILABLE: OCR processing requires pytesseract, pdf2image, and Pillow libraries. Please install them for image-based PDF processing."
         except Exception as e:
             logger.error(f"OCR extraction error: {str(e)}")
             return f"OCR_ERROR: OCR processing failed with error: {str(e)}"
     
+    def _ocr_pages(self, file_path: str, page_numbers: Iterable[int]) -> List[PageText]:
+        """
+        OCR the given pages of a PDF in a process pool
+        
+        Each worker renders a single page (first_page/last_page), OCRs it and
+        drops the image, so peak memory is a few pages however long the
+        document is.
+        
+        Args:
+            file_path: Path to the PDF file
+            page_numbers: 1-based page numbers to OCR
+            
+        Returns:
+            A PageText per requested page, in page order (empty text for
+            failed pages)
+        """
+        page_numbers = list(page_numbers)
+        workers = max(1, min(self.ocr_workers, len(page_numbers)))
+        tasks = [(file_path, page_number, self.ocr_dpi) for page_number in page_numbers]
+        
+        if workers == 1:
+            results = map(_ocr_page, tasks)
+        else:
+            # spawn rather than fork: the job queue calls this from a thread
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_ocr_worker
+            )
+            results = executor.map(_ocr_page, tasks)
+        
+        try:
+            pages = []
+            for page_number, text, error, elapsed in results:
+                if error:
+                    logger.warning(f"OCR failed for page {page_number}: {error}")
+                elif text:
+                    logger.info(f"OCR successful for page {page_number}")
+                else:
+                    logger.warning(f"OCR returned empty text for page {page_number}")
+                metrics.stage_seconds.observe(elapsed, stage='ocr_page', backend='tesseract')
+                pages.append(PageText(page_number, text, OCR_FAILED_METHOD if error else 'ocr', elapsed))
+            return pages
+        finally:
+            if workers > 1:
+                executor.shutdown()
+    
     def get_document_metadata(self, file_path: str) -> Dict[str, Any]:
         """
         Extract metadata from document
@@ -384,6 +599,7 @@ class DocumentProcessor:
     def _get_pdf_metadata(self, file_path: str) -> Dict[str, Any]:
         """Extract PDF-specific metadata"""
         try:
+            import PyPDF2
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 
@@ -416,6 +632,7 @@ class DocumentProcessor:
     def _get_docx_metadata(self, file_path: str) -> Dict[str, Any]:
         """Extract DOCX-specific metadata"""
         try:
+            from docx import Document as DocxDocument
             doc = DocxDocument(file_path)
             
             metadata = {
@@ -0,0 +1,342 @@
+"""
+Export Service for SoF Event Extractor
+Streams event exports as CSV or JSON straight to the response
+"""
+
+import csv
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+from urllib.parse import quote
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+# Events per Parquet row group / Arrow record batch
+COLUMNAR_BATCH_SIZE = 50000
+
+# Per-document header columns of the columnar export, dictionary encoded
+# (a handful of distinct vessels/ports repeated on every event)
+DICTIONARY_COLUMNS = ('vessel_name', 'imo_number', 'port_name')
+
+
+class _ChunkSink:
+    """Write-only binary sink whose contents are drained between batches"""
+    
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class _RowBuffer:
+    """File-like object for csv.writer that hands each formatted row back"""
+    
+    def write(self, value: str) -> str:
+        return value
+
+
+class ExportService:
+    """
+    Builds CSV/JSON exports as generators of text chunks
+    
+    Rows are formatted one at a time from the (lazily loaded) events and
+    written to the socket by the streaming response, so an export never
+    touches disk and holds only one batch of events in memory.
+    """
+    
+    def iter_document_csv(self, document, events: Iterable, include_confidence: bool = True,
+                          include_remarks: bool = True, include_metadata: bool = False
+                          ) -> Iterator[str]:
+        """
+        Stream one document's events as CSV
+        
+        Args:
+            document: Document the events belong to
+            events: Events in timeline order (e.g. a yield_per query)
+            include_confidence: Include confidence scores
+            include_remarks: Include remarks
+            include_metadata: Append a document metadata block
+        """
+        writer = csv.writer(_RowBuffer())
+        
+        header = ['Event', 'Event Type', 'Start Time', 'End Time', 'Duration', 'Location']
+        if include_confidence:
+            header.append('Confidence')
+        if include_remarks:
+            header.append('Remarks')
+        yield writer.writerow(header)
+        
+        total_events = 0
+        for event in events:
+            total_events += 1
+            yield writer.writerow(self._csv_row(event, include_confidence, include_remarks))
+        
+        if include_metadata:
+            yield writer.writerow([])  # Empty row
+            yield writer.writerow(['Document Metadata:'])
+            yield writer.writerow(['Original Filename', document.original_filename or 'Unknown'])
+            yield writer.writerow(['Vessel', document.vessel_name or 'Unknown'])
+            yield writer.writerow(['IMO Number', document.imo_number or 'Unknown'])
+            yield writer.writerow(['Port', document.port_name or 'Unknown'])
+            yield writer.writerow(['Processing Date', datetime.utcnow().isoformat()])
+            yield writer.writerow(['Total Events', total_events])
+            yield writer.writerow(['File Size', f"{document.file_size} bytes" if document.file_size else 'Unknown'])
+        
+        logger.info(f"CSV export streamed: {total_events} events")
+    
+    def iter_document_json(self, document, events: Iterable, include_confidence: bool = True,
+                           include_remarks: bool = True, include_metadata: bool = False
+                           ) -> Iterator[str]:
+        """Stream one document's events as a JSON object (same options as CSV)"""
+        yield '{"events": ['
+        total_events = 0
+        for event in events:
+            event_data = self._json_event(event, include_confidence, include_remarks)
+            yield (',\n' if total_events else '\n') + json.dumps(event_data, ensure_ascii=False)
+            total_events += 1
+        yield '\n]'
+        
+        if include_metadata:
+            metadata = {
+                'original_filename': document.original_filename,
+                'vessel_name': document.vessel_name,
+                'imo_number': document.imo_number,
+                'port_name': document.port_name,
+                'processing_date': datetime.utcnow().isoformat(),
+                'total_events': total_events,
+                'file_size': document.file_size,
+                'extraction_method': 'hybrid_nlp_regex'
+            }
+            yield ', "metadata": ' + json.dumps(metadata, ensure_ascii=False)
+        yield '}\n'
+        
+        logger.info(f"JSON export streamed: {total_events} events")
+    
+    def iter_bulk_csv(self, rows: Iterable, include_confidence: bool = True,
+                      include_remarks: bool = False) -> Iterator[str]:
+        """
+        Stream events of many documents as one CSV
+        
+        Args:
+            rows: (event, document) pairs ordered by document and timeline
+        """
+        writer = csv.writer(_RowBuffer())
+        
+        header = ['Document ID', 'Original Filename', 'Event', 'Event Type', 'Start Time',
+                  'End Time', 'Duration', 'Location']
+        if include_confidence:
+            header.append('Confidence')
+        if include_remarks:
+            header.append('Remarks')
+        yield writer.writerow(header + ['Start At'])
+        
+        for event, document in rows:
+            row = [document.id, document.original_filename or '']
+            row.extend(self._csv_row(event, include_confidence, include_remarks))
+            row.append(event.start_at.isoformat() if event.start_at else '')
+            yield writer.writerow(row)
+    
+    def iter_bulk_ndjson(self, rows: Iterable, include_confidence: bool = True,
+                         include_remarks: bool = False) -> Iterator[str]:
+        """Stream events of many documents as newline-delimited JSON"""
+        for event, document in rows:
+            event_data = self._json_event(event, include_confidence, include_remarks)
+            event_data['document_id'] = document.id
+            event_data['original_filename'] = document.original_filename
+            if event.start_at:
+                event_data['start_at'] = event.start_at.isoformat()
+            yield json.dumps(event_data, ensure_ascii=False) + '\n'
+    
+    @staticmethod
+    def attachment_headers(filename: str) -> Dict[str, str]:
+        """Content-Disposition header for a download, safe for non-ASCII names"""
+        return {
+            'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"
+        }
+    
+    @staticmethod
+    def _csv_row(event, include_confidence: bool, include_remarks: bool):
+        row = [
+            event.event_name or '',
+            event.event_type or '',
+            event.start_time or '',
+            event.end_time or '',
+            event.duration or '',
+            event.location or ''
+        ]
+        
+        if include_confidence:
+            row.append(f"{event.confidence * 100:.0f}%" if event.confidence else '')
+        
+        if include_remarks:
+            row.append(event.remarks or '')
+        
+        return row
+    
+    @staticmethod
+    def _json_event(event, include_confidence: bool, include_remarks: bool) -> Dict[str, Any]:
+        event_data: Dict[str, Optional[Any]] = {
+            'event': event.event_name,
+            'event_type': event.event_type,
+            'start_time': event.start_time,
+            'end_time': event.end_time,
+            'duration': event.duration,
+            'location': event.location
+        }
+        
+        if include_confidence:
+            event_data['confidence'] = event.confidence
+        
+        if include_remarks:
+            event_data['remarks'] = event.remarks
+        
+        # Remove None values
+        return {k: v for k, v in event_data.items() if v is not None}
+    
+    def iter_columnar(self, rows: Iterable, file_format: str = 'parquet',
+                      include_remarks: bool = False,
+                      batch_size: int = COLUMNAR_BATCH_SIZE) -> Iterator[bytes]:
+        """
+        Stream events of many documents as Parquet or an Arrow IPC file
+        
+        Each ``batch_size`` events become one Parquet row group / Arrow record
+        batch and are yielded as soon as they are encoded, so memory holds a
+        single batch. The Arrow IPC file format (not the stream format) is
+        used so downstream tools can memory-map the download.
+        
+        Args:
+            rows: (event, document) pairs ordered by document and timeline
+            file_format: 'parquet' or 'arrow'
+            include_remarks: Include the remarks column
+            batch_size: Events per row group / record batch
+            
+        Raises:
+            ImportError: If pyarrow is not installed
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet/Arrow export")
+        
+        schema = self.columnar_schema(include_remarks)
+        sink = _ChunkSink()
+        output = pa.PythonFile(sink, mode='w')
+        if file_format == 'parquet':
+            writer = pq.ParquetWriter(output, schema, compression='zstd')
+        else:
+            # The dictionaries only grow, so later batches extend them as
+            # deltas (an IPC file can't replace a dictionary)
+            writer = pa.ipc.new_file(
+                output, schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            )
+        
+        columns = {name: [] for name in schema.names}
+        # Value -> code, shared by all batches
+        dictionaries = {name: {} for name in DICTIONARY_COLUMNS}
+        total_events = 0
+        for event, document in rows:
+            columns['document_id'].append(document.id)
+            columns['original_filename'].append(document.original_filename)
+            columns['processed_at'].append(document.processed_at)
+            for name in DICTIONARY_COLUMNS:
+                value = getattr(document, name)
+                columns[name].append(
+                    None if value is None
+                    else dictionaries[name].setdefault(value, len(dictionaries[name]))
+                )
+            columns['event_id'].append(event.id)
+            columns['sequence'].append(event.sequence)
+            columns['event_type'].append(event.event_type)
+            columns['event'].append(event.event_name)
+            columns['start_time'].append(event.start_time)
+            columns['end_time'].append(event.end_time)
+            columns['start_at'].append(event.start_at)
+            columns['end_at'].append(event.end_at)
+            columns['duration'].append(event.duration)
+            columns['location'].append(event.location)
+            columns['confidence'].append(event.confidence)
+            if include_remarks:
+                columns['remarks'].append(event.remarks)
+            total_events += 1
+            
+            if len(columns['event_id']) >= batch_size:
+                self._write_batch(writer, schema, columns, dictionaries)
+                yield sink.drain()
+        
+        if columns['event_id']:
+            self._write_batch(writer, schema, columns, dictionaries)
+        writer.close()
+        output.close()
+        yield sink.drain()
+        
+        logger.info(f"{file_format} export streamed: {total_events} events")
+    
+    @staticmethod
+    def columnar_schema(include_remarks: bool = False):
+        """Arrow schema of the columnar event export"""
+        fields = [
+            ('document_id', pa.string()),
+            ('original_filename', pa.string()),
+            ('processed_at', pa.timestamp('us')),
+            ('vessel_name', pa.dictionary(pa.int32(), pa.string())),
+            ('imo_number', pa.dictionary(pa.int32(), pa.string())),
+            ('port_name', pa.dictionary(pa.int32(), pa.string())),
+            ('event_id', pa.string()),
+            ('sequence', pa.int32()),
+            ('event_type', pa.string()),
+            ('event', pa.string()),
+            ('start_time', pa.string()),
+            ('end_time', pa.string()),
+            ('start_at', pa.timestamp('us')),
+            ('end_at', pa.timestamp('us')),
+            ('duration', pa.string()),
+            ('location', pa.string()),
+            ('confidence', pa.float64()),
+        ]
+        if include_remarks:
+            fields.append(('remarks', pa.string()))
+        return pa.schema(fields)
+    
+    @staticmethod
+    def _write_batch(writer, schema, columns: Dict[str, list], dictionaries: Dict[str, dict]):
+        arrays = []
+        for field in schema:
+            if field.name in dictionaries:
+                # Codes into the dictionary as built so far (insertion order)
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(columns[field.name], type=pa.int32()),
+                    pa.array(list(dictionaries[field.name]), type=pa.string())
+                ))
+            else:
+                arrays.append(pa.array(columns[field.name], type=field.type))
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        # One row group (Parquet) / record batch (Arrow) per call
+        writer.write_batch(batch)
+        for values in columns.values():
+            values.clear()
@@ -0,0 +1,88 @@
+"""
+Extraction Cache Service
+Content-addressed cache for extracted text and events
+"""
+
+import json
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from backend.models import db, TextCacheEntry, EventCacheEntry
+from backend.enhanced_maritime_extractor import EventRecord
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """
+    Two-layer cache of extraction results keyed by file hash
+    
+    The text layer (OCR / text extraction, the expensive part) is keyed by
+    (file_hash, processor_version); text with an OCR failure in it is not
+    stored (see ``text_is_final``), so a retry can succeed. The event layer is keyed by the text
+    layer's key plus the extractor version, which fingerprints the pattern
+    set - so editing a pattern re-runs event extraction on cached text
+    instead of re-running OCR.
+    """
+    
+    def get_text(self, file_hash: str, processor_version: str
+                 ) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """
+        Look up the text layer
+        
+        Returns:
+            (text_content, pages) or None on a miss; pages holds
+            page_number/method/elapsed/text per PDF page
+        """
+        entry = TextCacheEntry.query.filter_by(
+            file_hash=file_hash, processor_version=processor_version
+        ).first()
+        if entry is None:
+            return None
+        return entry.text_content, json.loads(entry.pages or '[]')
+    
+    def put_text(self, file_hash: str, processor_version: str, text_content: str,
+                 pages: Optional[List[Dict[str, Any]]] = None):
+        """Store the text layer"""
+        self._put(TextCacheEntry(
+            file_hash=file_hash,
+            processor_version=processor_version,
+            text_content=text_content,
+            pages=json.dumps(pages or [])
+        ))
+    
+    def get_events(self, file_hash: str, processor_version: str,
+                   extractor_version: str) -> Optional[List[EventRecord]]:
+        """Look up the event layer; returns the events or None on a miss"""
+        entry = EventCacheEntry.query.filter_by(
+            file_hash=file_hash,
+            processor_version=processor_version,
+            extractor_version=extractor_version
+        ).first()
+        if entry is None:
+            return None
+        return [EventRecord.from_dict(event) for event in json.loads(entry.events)]
+    
+    def put_events(self, file_hash: str, processor_version: str,
+                   extractor_version: str, events: List[EventRecord]):
+        """Store the event layer"""
+        self._put(EventCacheEntry(
+            file_hash=file_hash,
+            processor_version=processor_version,
+            extractor_version=extractor_version,
+            events=json.dumps([event.to_dict() for event in events])
+        ))
+    
+    @staticmethod
+    def _put(entry):
+        # A savepoint, so a duplicate only undoes this insert and the
+        # caller's transaction (the document being processed) carries on;
+        # the entry is committed with it
+        try:
+            with db.session.begin_nested():
+                db.session.add(entry)
+        except IntegrityError:
+            # Another worker cached the same result first
+            logger.info(f"Cache entry already stored for {entry.file_hash}")
@@ -0,0 +1,334 @@
+"""
+Job Queue Service
+Database-backed background job queue with an in-process worker pool
+"""
+
+import os
+import json
+import socket
+import logging
+import time
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional
+
+from backend.models import db, ProcessingJob
+from backend.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Signature of the function that does the work for a job:
+# handler(document_id, report_progress, hold_lease) -> result dict. The
+# handler calls hold_lease() after making its writes and before committing
+# them. Both raise LeaseLost if the job has been reclaimed meanwhile;
+# report_progress writes on its own connection, not the handler's session.
+JobHandler = Callable[[str, Callable[[str, float], None], Callable[[], None]], Optional[Dict[str, Any]]]
+
+# Called with the document id of a job given up after its worker died
+AbandonedHandler = Callable[[str], None]
+
+job_seconds = metrics.histogram(
+    'sof_job_duration_seconds',
+    'Processing job run time, from claim to completion',
+    ('status',)
+)
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and the job was requeued or claimed by another worker"""
+
+
+class JobQueue:
+    """
+    Background job queue stored in the application database
+
+    Jobs are rows in ``processing_jobs``, so the queue needs no broker: with
+    SQLite locally (or PostgreSQL in production) every worker process can
+    claim work from the same table. Each process runs a small pool of worker
+    threads, started lazily on the first request so that gunicorn workers
+    forked from a preloaded master get their own threads.
+
+    A claimed job is leased to its worker process, which renews the lease
+    (``heartbeat_at``) from a heartbeat thread while the job runs. If the
+    process dies (a crash, OOM kill, gunicorn recycle or deploy) the lease
+    runs out, and any process of the app puts the job back in the queue, or
+    marks it failed once it has been claimed ``max_attempts`` times. A worker
+    that lost its lease must not write the job's work: the handler checks
+    the lease with ``hold_lease`` in the same transaction as its writes.
+    """
+
+    def __init__(self, app=None, handler: JobHandler = None, workers: int = 2,
+                 poll_interval: float = 2.0, lease_seconds: float = 300.0,
+                 max_attempts: int = 3, on_abandoned: AbandonedHandler = None):
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.on_abandoned = on_abandoned
+        self.app = None
+        self.worker_id = None
+
+        self._threads: List[threading.Thread] = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        # Jobs this process is running, whose leases the heartbeat renews
+        self._active = set()
+
+        if app is not None:
+            self.init_app(app, handler)
+
+    def init_app(self, app, handler: JobHandler = None):
+        """Bind the queue to the Flask app and start workers on the first request"""
+        self.app = app
+        if handler is not None:
+            self.handler = handler
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', self.poll_interval)
+        self.lease_seconds = app.config.get('JOB_LEASE_SECONDS', self.lease_seconds)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', self.max_attempts)
+        app.before_request(self.ensure_started)
+
+    def enqueue(self, document_id: str, stages: List[str]) -> ProcessingJob:
+        """
+        Queue a document for processing
+
+        Args:
+            document_id: Document to process
+            stages: Stage names the handler will report progress for
+
+        Returns:
+            The new job, or the document's queued/running job if it has one
+        """
+        # A running job whose worker died doesn't count as running
+        self.recover_stale()
+        active = ProcessingJob.query.filter(
+            ProcessingJob.document_id == document_id,
+            ProcessingJob.status.in_(['queued', 'running'])
+        ).first()
+        if active:
+            return active
+
+        job = ProcessingJob(
+            document_id=document_id,
+            status='queued',
+            stage_progress=json.dumps({stage: 0.0 for stage in stages})
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self.ensure_started()
+        self._wakeup.set()
+        logger.info(f"Queued job {job.id} for document {document_id}")
+        return job
+
+    def ensure_started(self):
+        """Start this process's worker threads if they are not running yet"""
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.worker_id = f"{socket.gethostname()}:{self._pid}"
+            self._active = set()
+            self._stopping.clear()
+
+            # Jobs left running by a process that is gone (e.g. the one this
+            # process replaced) go back to the queue before workers start
+            with self.app.app_context():
+                try:
+                    self.recover_stale()
+                except Exception as e:
+                    logger.error(f"Stale job recovery failed: {str(e)}")
+
+            self._threads = [
+                threading.Thread(
+                    target=self._worker_loop,
+                    name=f"job-worker-{i + 1}",
+                    daemon=True
+                )
+                for i in range(self.workers)
+            ]
+            self._threads.append(threading.Thread(
+                target=self._heartbeat_loop, name='job-heartbeat', daemon=True
+            ))
+            for thread in self._threads:
+                thread.start()
+            logger.info(f"Started {self.workers} job workers in process {self._pid}")
+
+    def stop(self, timeout: float = 5.0):
+        """Ask the worker threads to exit after their current job"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._pid = None
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    job_id = self._claim()
+                    if job_id:
+                        self._run(job_id)
+                        continue
+            except Exception as e:
+                logger.error(f"Job worker error: {str(e)}")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _heartbeat_loop(self):
+        # Renew well within the lease, so one slow round doesn't expire it
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self._stopping.wait(interval):
+            try:
+                with self.app.app_context():
+                    self._renew_leases()
+                    self.recover_stale()
+            except Exception as e:
+                logger.error(f"Job heartbeat error: {str(e)}")
+
+    def _renew_leases(self):
+        active = list(self._active)
+        if not active:
+            return
+        ProcessingJob.query.filter(
+            ProcessingJob.id.in_(active),
+            ProcessingJob.status == 'running',
+            ProcessingJob.worker == self.worker_id
+        ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+
+    def recover_stale(self) -> int:
+        """
+        Requeue running jobs whose lease expired (their worker died), or mark
+        them failed once they have used up ``max_attempts``
+
+        Returns:
+            Number of jobs recovered
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        stale = db.and_(
+            ProcessingJob.status == 'running',
+            db.func.coalesce(ProcessingJob.heartbeat_at, ProcessingJob.started_at) < cutoff
+        )
+        recovered = 0
+        for job in ProcessingJob.query.filter(stale).all():
+            # The commit below expires the instance; keep what we report
+            job_id, document_id, worker = job.id, job.document_id, job.worker
+            if (job.attempts or 0) >= self.max_attempts:
+                values = {
+                    'status': 'failed',
+                    'error': f"Worker {worker} stopped responding ({job.attempts} attempts)",
+                    'finished_at': datetime.utcnow()
+                }
+            else:
+                values = {'status': 'queued', 'worker': None, 'heartbeat_at': None}
+            # Another process may be recovering the same job
+            updated = ProcessingJob.query.filter(ProcessingJob.id == job_id, stale).update(
+                values, synchronize_session=False
+            )
+            db.session.commit()
+            if not updated:
+                continue
+            recovered += 1
+            logger.warning(
+                f"Job {job_id} lost its worker {worker}; "
+                f"{'failed' if values['status'] == 'failed' else 'requeued'}"
+            )
+            if values['status'] == 'failed' and self.on_abandoned is not None:
+                self.on_abandoned(document_id)
+        if recovered:
+            self._wakeup.set()
+        return recovered
+
+    def _claim(self) -> Optional[str]:
+        """Atomically move the oldest queued job to running; returns its id"""
+        job = ProcessingJob.query.filter_by(status='queued').order_by(
+            ProcessingJob.created_at
+        ).first()
+        if job is None:
+            return None
+
+        # Another worker (thread or process) may have claimed it meanwhile
+        now = datetime.utcnow()
+        claimed = ProcessingJob.query.filter_by(id=job.id, status='queued').update(
+            {
+                'status': 'running',
+                'started_at': now,
+                'heartbeat_at': now,
+                'worker': self.worker_id,
+                'attempts': db.func.coalesce(ProcessingJob.attempts, 0) + 1
+            },
+            synchronize_session=False
+        )
+        db.session.commit()
+        return job.id if claimed == 1 else None
+
+    def _run(self, job_id: str):
+        job = db.session.get(ProcessingJob, job_id)
+        document_id = job.document_id
+        stages = json.loads(job.stage_progress or '{}')
+        logger.info(f"Running job {job_id} for document {document_id}")
+
+        # This claim of the job; if the lease expired and the job was
+        # requeued (and maybe claimed again), writes under it match nothing
+        claim = db.and_(
+            ProcessingJob.id == job_id,
+            ProcessingJob.status == 'running',
+            ProcessingJob.worker == self.worker_id,
+            ProcessingJob.attempts == job.attempts
+        )
+
+        def report_progress(stage: str, fraction: float):
+            # On its own connection, so it never commits the handler's writes
+            stages[stage] = round(min(1.0, max(0.0, fraction)), 3)
+            with db.engine.begin() as connection:
+                reported = connection.execute(
+                    ProcessingJob.__table__.update().where(claim).values(
+                        stage=stage, stage_progress=json.dumps(stages), heartbeat_at=datetime.utcnow()
+                    )
+                ).rowcount
+            if not reported:
+                raise LeaseLost(f"Job {job_id} was reclaimed after its lease expired")
+
+        def hold_lease():
+            # Renewing the lease inside the handler's open transaction locks
+            # the job row until that transaction commits, so the job cannot
+            # be reclaimed between this check and the handler's commit
+            held = ProcessingJob.query.filter(claim).update(
+                {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+            )
+            if not held:
+                raise LeaseLost(f"Job {job_id} was reclaimed after its lease expired")
+
+        self._active.add(job_id)
+        started = time.perf_counter()
+        try:
+            result = self.handler(document_id, report_progress, hold_lease)
+            values = {
+                'status': 'completed',
+                'result': json.dumps(result) if result is not None else None
+            }
+        except LeaseLost as e:
+            logger.warning(f"{str(e)}; abandoning this run's writes")
+            db.session.rollback()
+            values = {'status': 'failed', 'error': str(e)}
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            db.session.rollback()
+            values = {'status': 'failed', 'error': str(e)}
+        finally:
+            self._active.discard(job_id)
+
+        values['finished_at'] = datetime.utcnow()
+        finished = ProcessingJob.query.filter(claim).update(values, synchronize_session=False)
+        db.session.commit()
+        if not finished:
+            logger.warning(f"Job {job_id} was reclaimed after its lease expired; dropping this run's result")
+        job_seconds.observe(time.perf_counter() - started, status=values['status'] if finished else 'reclaimed')
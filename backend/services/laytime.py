@@ -0,0 +1,340 @@
+"""
+Laytime Service
+Laytime, demurrage and despatch from the extracted event timeline
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Event names (as produced by the extractor) that drive the calculation
+NOR_TENDERED = 'NOR Tendered'
+NOR_ACCEPTED = 'NOR Accepted'
+CARGO_COMMENCED = ('Loading Commenced', 'Discharging Commenced')
+CARGO_COMPLETED = ('Loading Completed', 'Discharging Completed')
+WEATHER_TYPE = 'weather'
+
+# Per-document band (seconds, ~34 years) keeping documents apart in the batch
+# arrays: far longer than any port call, small enough to stay exact in float64
+_DOCUMENT_SPAN = 2 ** 30
+
+_HOUR = 3600.0
+
+
+class LaytimeTerms:
+    """Charter party terms the calculation is run against"""
+
+    __slots__ = ('allowed_hours', 'notice_hours', 'demurrage_rate', 'despatch_rate')
+
+    def __init__(self, allowed_hours: float = 72.0, notice_hours: float = 6.0,
+                 demurrage_rate: float = 0.0, despatch_rate: Optional[float] = None):
+        """
+        Args:
+            allowed_hours: Laytime allowed for the cargo operation
+            notice_hours: Notice (turn) time after NOR before laytime counts
+            demurrage_rate: Demurrage per day
+            despatch_rate: Despatch per day of laytime saved (default half
+                the demurrage rate)
+        """
+        self.allowed_hours = allowed_hours
+        self.notice_hours = notice_hours
+        self.demurrage_rate = demurrage_rate
+        self.despatch_rate = demurrage_rate / 2 if despatch_rate is None else despatch_rate
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            'allowed_hours': self.allowed_hours,
+            'notice_hours': self.notice_hours,
+            'demurrage_rate': self.demurrage_rate,
+            'despatch_rate': self.despatch_rate
+        }
+
+
+class Timeline:
+    """
+    The events of one document that laytime depends on, as epoch seconds
+
+    Built from Event rows or extractor dicts; only the event name/type and
+    the normalized start_at/end_at timestamps are read.
+    """
+
+    __slots__ = ('document_id', 'nor_tendered', 'nor_accepted', 'commenced',
+                 'completed', 'first_event', 'last_event', 'exclusions')
+
+    def __init__(self, document_id: Optional[str] = None):
+        self.document_id = document_id
+        self.nor_tendered: Optional[float] = None
+        self.nor_accepted: Optional[float] = None
+        self.commenced: Optional[float] = None
+        self.completed: Optional[float] = None
+        self.first_event: Optional[float] = None
+        self.last_event: Optional[float] = None
+        # (start, end or None) weather delays; open ends are closed by the
+        # next event in the timeline
+        self.exclusions: List[Tuple[float, Optional[float]]] = []
+
+    @classmethod
+    def from_events(cls, events: Iterable[Any], document_id: Optional[str] = None) -> 'Timeline':
+        timeline = cls(document_id)
+        starts = []
+        for event in events:
+            name = _field(event, 'event_name', 'event')
+            start = _epoch(_field(event, 'start_at'))
+            if start is None:
+                continue
+            end = _epoch(_field(event, 'end_at'))
+            starts.append(start)
+
+            if name == NOR_TENDERED:
+                timeline.nor_tendered = _min(timeline.nor_tendered, start)
+            elif name == NOR_ACCEPTED:
+                timeline.nor_accepted = _min(timeline.nor_accepted, start)
+            elif name in CARGO_COMMENCED:
+                timeline.commenced = _min(timeline.commenced, start)
+            elif name in CARGO_COMPLETED:
+                timeline.completed = max(timeline.completed or start, start)
+
+            if _field(event, 'event_type') == WEATHER_TYPE:
+                timeline.exclusions.append((start, end))
+
+        if starts:
+            starts.sort()
+            timeline.first_event, timeline.last_event = starts[0], starts[-1]
+            # Close open-ended delays at the next event after them
+            closed = []
+            for start, end in timeline.exclusions:
+                if end is None:
+                    index = np.searchsorted(starts, start, side='right')
+                    end = starts[index] if index < len(starts) else start
+                closed.append((start, end))
+            timeline.exclusions = closed
+        return timeline
+
+    def laytime_window(self, terms: LaytimeTerms) -> Tuple[Optional[float], Optional[float]]:
+        """Laytime start (NOR + notice time, unless sooner commenced) and end (completion)"""
+        start = None
+        if self.nor_tendered is not None:
+            start = self.nor_tendered + terms.notice_hours * _HOUR
+        if self.commenced is not None:
+            start = _min(start, self.commenced)
+        end = self.completed
+        if start is None or end is None or end <= start:
+            return None, None
+        return start, end
+
+
+class LaytimeEngine:
+    """
+    Interval-arithmetic laytime calculator, vectorized across documents
+
+    For every document, laytime runs from NOR tendered plus notice time (or
+    commencement of cargo operations, if sooner) to completion of cargo
+    operations. Weather delays are excluded periods: overlapping delays are
+    merged, clipped to the laytime window, and only count until laytime
+    expires ("once on demurrage, always on demurrage").
+
+    ``compute`` lays the intervals of all documents out in flat arrays,
+    each document shifted into its own time band, so merging, clipping and
+    finding the moment laytime expires are whole-array numpy operations
+    whatever the number of documents.
+    """
+
+    def __init__(self, terms: Optional[LaytimeTerms] = None):
+        self.terms = terms or LaytimeTerms()
+
+    def compute_document(self, events: Iterable[Any], document_id: Optional[str] = None) -> Dict[str, Any]:
+        """Laytime statement for a single document's events"""
+        return self.compute([Timeline.from_events(events, document_id)])[0]
+
+    def compute(self, timelines: List[Timeline]) -> List[Dict[str, Any]]:
+        """
+        Laytime statements for many documents at once
+
+        Returns:
+            One result dict per timeline, in order; 'status' is 'complete'
+            or 'incomplete' (no laytime start or no completion found)
+        """
+        terms = self.terms
+        n = len(timelines)
+        allowed = terms.allowed_hours * _HOUR
+
+        windows = [timeline.laytime_window(terms) for timeline in timelines]
+        valid = np.array([start is not None for start, _ in windows], dtype=bool)
+        base = np.array([start or 0.0 for start, _ in windows], dtype=np.float64)
+        # Document-relative seconds keep every value small and exact
+        start = np.zeros(n)
+        end = np.array([(end - b) if end is not None else 0.0
+                        for (_, end), b in zip(windows, base)], dtype=np.float64)
+        offset = np.arange(n, dtype=np.float64) * _DOCUMENT_SPAN
+
+        # Flatten exclusions: document index, start, end (relative seconds)
+        doc_index, ex_start, ex_end = [], [], []
+        for i, timeline in enumerate(timelines):
+            if not valid[i]:
+                continue
+            for a, b in timeline.exclusions:
+                doc_index.append(i)
+                ex_start.append(a - base[i])
+                ex_end.append(b - base[i])
+        doc_index = np.array(doc_index, dtype=np.int64)
+        ex_start = np.array(ex_start, dtype=np.float64)
+        ex_end = np.array(ex_end, dtype=np.float64)
+
+        # Clip to each document's laytime window and drop empty intervals
+        ex_start = np.maximum(ex_start, start[doc_index])
+        ex_end = np.minimum(ex_end, end[doc_index])
+        keep = ex_end > ex_start
+        doc_index, ex_start, ex_end = doc_index[keep], ex_start[keep], ex_end[keep]
+
+        # Merge overlaps: in band coordinates one sort and one running max
+        # handle every document, since bands never overlap
+        order = np.lexsort((ex_start, doc_index))
+        doc_index, ex_start, ex_end = doc_index[order], ex_start[order], ex_end[order]
+        running_end = np.maximum.accumulate(ex_end + offset[doc_index]) if len(ex_end) else ex_end
+        new_group = np.ones(len(ex_start), dtype=bool)
+        new_group[1:] = ex_start[1:] + offset[doc_index[1:]] > running_end[:-1]
+        groups = np.flatnonzero(new_group)
+        group_last = np.append(groups[1:] - 1, len(ex_start) - 1)[:len(groups)]
+        merged_doc = doc_index[groups]
+        merged_start = ex_start[groups]
+        merged_end = running_end[group_last] - offset[merged_doc]
+        merged_length = merged_end - merged_start
+
+        # Counted time at the start of each merged exclusion: elapsed since
+        # laytime start minus the document's exclusions before it
+        prefix = np.concatenate(([0.0], np.cumsum(merged_length)))
+        doc_first = np.searchsorted(merged_doc, np.arange(n), side='left')
+        doc_last = np.searchsorted(merged_doc, np.arange(n), side='right')
+        excluded_before = prefix[:-1] - prefix[doc_first][merged_doc]
+        counted_at = merged_start - excluded_before
+
+        # Laytime expires in the gap before the first exclusion that starts
+        # after it is used up; exclusions from there on no longer count
+        first_reached = np.full(n, -1, dtype=np.int64)
+        reached = np.flatnonzero(counted_at >= allowed)
+        if len(reached):
+            docs_reached, first_positions = np.unique(merged_doc[reached], return_index=True)
+            first_reached[docs_reached] = reached[first_positions]
+
+        excluded_total = prefix[doc_last] - prefix[doc_first]
+        excluded = np.where(
+            first_reached >= 0,
+            np.append(excluded_before, 0.0)[first_reached],
+            excluded_total
+        )
+
+        gross = end - start
+        counted = gross - excluded
+        used = np.minimum(counted, allowed)
+        demurrage = np.maximum(counted - allowed, 0.0)
+        saved = np.maximum(allowed - counted, 0.0)
+
+        results = []
+        for i, timeline in enumerate(timelines):
+            if not valid[i]:
+                results.append({
+                    'document_id': timeline.document_id,
+                    'status': 'incomplete',
+                    'reason': self._incomplete_reason(timeline),
+                    'terms': terms.to_dict()
+                })
+                continue
+
+            periods = [
+                {
+                    'start': _iso(merged_start[j] + base[i]),
+                    'end': _iso(merged_end[j] + base[i]),
+                    'hours': round(merged_length[j] / _HOUR, 2),
+                    'counted_as_exclusion': bool(first_reached[i] < 0 or j < first_reached[i])
+                }
+                for j in range(doc_first[i], doc_last[i])
+            ]
+            results.append({
+                'document_id': timeline.document_id,
+                'status': 'complete',
+                'laytime_start': _iso(base[i]),
+                'laytime_end': _iso(end[i] + base[i]),
+                'nor_tendered': _iso(timeline.nor_tendered) if timeline.nor_tendered is not None else None,
+                'port_hours': round((timeline.last_event - timeline.first_event) / _HOUR, 2),
+                'waiting_hours': round(max(base[i] - (timeline.nor_tendered or base[i]), 0.0) / _HOUR, 2),
+                'gross_hours': round(gross[i] / _HOUR, 2),
+                'excluded_hours': round(excluded[i] / _HOUR, 2),
+                'laytime_used_hours': round(used[i] / _HOUR, 2),
+                'demurrage_hours': round(demurrage[i] / _HOUR, 2),
+                'despatch_hours': round(saved[i] / _HOUR, 2),
+                'demurrage_amount': round(demurrage[i] / 86400 * terms.demurrage_rate, 2),
+                'despatch_amount': round(saved[i] / 86400 * terms.despatch_rate, 2),
+                'on_demurrage': bool(demurrage[i] > 0),
+                'excluded_periods': periods,
+                'terms': terms.to_dict()
+            })
+        return results
+
+    def portfolio_report(self, timelines: List[Timeline]) -> Dict[str, Any]:
+        """Demurrage exposure across many documents"""
+        results = self.compute(timelines)
+        complete = [r for r in results if r['status'] == 'complete']
+        on_demurrage = [r for r in complete if r['on_demurrage']]
+
+        return {
+            'terms': self.terms.to_dict(),
+            'documents': len(results),
+            'complete': len(complete),
+            'incomplete': len(results) - len(complete),
+            'on_demurrage': len(on_demurrage),
+            'total_demurrage_hours': round(sum(r['demurrage_hours'] for r in complete), 2),
+            'total_demurrage_amount': round(sum(r['demurrage_amount'] for r in complete), 2),
+            'total_despatch_amount': round(sum(r['despatch_amount'] for r in complete), 2),
+            'total_excluded_hours': round(sum(r['excluded_hours'] for r in complete), 2),
+            'results': [
+                {key: value for key, value in r.items() if key not in ('excluded_periods', 'terms')}
+                for r in results
+            ]
+        }
+
+    @staticmethod
+    def _incomplete_reason(timeline: Timeline) -> str:
+        if timeline.nor_tendered is None and timeline.commenced is None:
+            return 'No NOR tendered or cargo commencement found'
+        if timeline.completed is None:
+            return 'No completion of cargo operations found'
+        return 'Cargo completed before laytime commenced'
+
+
+def format_hours(hours: float) -> str:
+    """Format hours as '2d 10h 15m'"""
+    minutes = int(round(hours * 60))
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{days}d {hours}h {minutes:02d}m" if days else f"{hours}h {minutes:02d}m"
+
+
+def _field(event: Any, *names: str) -> Any:
+    """Read the first present field from an Event row or an event dict"""
+    for name in names:
+        if isinstance(event, dict):
+            if name in event:
+                return event[name]
+        elif hasattr(event, name):
+            return getattr(event, name)
+    return None
+
+
+def _epoch(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def _iso(seconds: float) -> str:
+    return (datetime(1970, 1, 1) + timedelta(seconds=float(seconds))).isoformat()
+
+
+def _min(current: Optional[float], value: float) -> float:
+    return value if current is None else min(current, value)
@@ -0,0 +1,148 @@
+"""
+Model Registry
+Thread-safe, load-once access to heavyweight models (spaCy pipelines)
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Model states reported by status()
+NOT_LOADED = 'not_loaded'
+LOADING = 'loading'
+LOADED = 'loaded'
+FAILED = 'failed'
+
+
+class _Entry:
+    """One registered model and its load state"""
+
+    __slots__ = ('loader', 'model', 'error', 'state', 'seconds', 'lock')
+
+    def __init__(self, loader: Callable[[], Any]):
+        self.loader = loader
+        self.model = None
+        self.error: Optional[BaseException] = None
+        self.state = NOT_LOADED
+        self.seconds: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Named models, each loaded at most once per process on first use
+
+    Importing the app only registers loaders, so a worker answers
+    ``/api/health`` straight away; the first request that needs a model (or
+    a warmup thread) pays the load. Concurrent callers wait on a per-model
+    lock instead of loading twice, and a failed load is remembered so
+    callers fall back without retrying it on every document.
+
+    Under gunicorn with ``preload_app`` the master loads the models before
+    forking, so the workers share the model memory copy-on-write. A load
+    still in progress when a process forks is abandoned in the child, which
+    loads the model again on first use.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register a loader under a name; an existing registration is kept"""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(loader)
+
+    def get(self, name: str) -> Any:
+        """
+        The model registered as ``name``, loading it on first use
+
+        Raises:
+            KeyError: Nothing is registered under the name
+            Exception: Whatever the loader raised (again on later calls)
+        """
+        entry = self._entries[name]
+        if entry.state is not LOADED:
+            with entry.lock:
+                if entry.state is NOT_LOADED:
+                    self._load(name, entry)
+        if entry.error is not None:
+            raise entry.error
+        return entry.model
+
+    def _load(self, name: str, entry: _Entry):
+        entry.state = LOADING
+        started = time.perf_counter()
+        try:
+            entry.model = entry.loader()
+            entry.state = LOADED
+            logger.info(f"Loaded model {name} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            entry.error = e
+            entry.state = FAILED
+            logger.warning(f"Model {name} could not be loaded: {str(e)}")
+        finally:
+            entry.seconds = round(time.perf_counter() - started, 3)
+
+    def is_loaded(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.state is LOADED
+
+    def warmup(self, names: Optional[Iterable[str]] = None,
+               background: bool = True) -> Optional[threading.Thread]:
+        """
+        Load models ahead of the first request
+
+        Args:
+            names: Models to load (default: all registered)
+            background: Load in a daemon thread instead of blocking
+
+        Returns:
+            The warmup thread, or None when loading in the foreground
+        """
+        names = list(self._entries) if names is None else list(names)
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass  # recorded on the entry and logged by _load
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Load state per model, without triggering any loads"""
+        return {
+            name: {
+                'state': entry.state,
+                'seconds': entry.seconds,
+                'error': str(entry.error) if entry.error is not None else None
+            }
+            for name, entry in list(self._entries.items())
+        }
+
+    def _after_fork(self):
+        # Locks held by a thread of the parent (e.g. a warmup thread part-way
+        # through a load) would never be released in the child
+        self._lock = threading.Lock()
+        for entry in self._entries.values():
+            entry.lock = threading.Lock()
+            if entry.state is LOADING:
+                entry.state = NOT_LOADED
+
+
+# Process-wide registry shared by the extractor and the app
+model_registry = ModelRegistry()
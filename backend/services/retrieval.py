@@ -0,0 +1,332 @@
+"""
+Retrieval Service
+Per-document BM25 index over events, remarks and page text for grounded chat answers
+"""
+
+import io
+import re
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from backend.models import db, RetrievalIndexEntry
+
+logger = logging.getLogger(__name__)
+
+# Bump when tokenization or passage splitting changes; older stored indexes
+# are rebuilt on first use
+RETRIEVAL_VERSION = '1'
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Page text is indexed in passages of up to this many lines / characters
+PASSAGE_LINES = 4
+PASSAGE_CHARS = 400
+
+# Passage kinds
+EVENT = 0
+TEXT = 1
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+LINE_RE = re.compile(r'[^\n]+')
+PAGE_MARKER_RE = re.compile(r'^--- Page (\d+) ---$')
+
+STOPWORDS = frozenset((
+    'a', 'about', 'an', 'and', 'any', 'are', 'as', 'at', 'be', 'by', 'can', 'did',
+    'do', 'does', 'for', 'from', 'had', 'has', 'have', 'how', 'i', 'in', 'is', 'it',
+    'me', 'of', 'on', 'or', 'show', 'tell', 'that', 'the', 'there', 'this', 'to',
+    'was', 'were', 'what', 'when', 'where', 'which', 'who', 'why', 'with'
+))
+
+# Query abbreviations and the words SoFs also spell them out with
+QUERY_EXPANSIONS = {
+    'nor': ('notice', 'readiness'),
+    'eta': ('estimated', 'arrival'),
+    'etd': ('estimated', 'departure'),
+    'sof': ('statement', 'facts'),
+    'pob': ('pilot', 'board'),
+}
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Strip common English suffixes so "stopped"/"stops"/"stopping" share a term"""
+    for suffix in ('ing', 'ed', 'es', 's', 'e'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith('ss'):
+            word = word[:-len(suffix)]
+            if suffix in ('ing', 'ed') and word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+            break
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased, stemmed terms of a text, without stopwords"""
+    return [stem(word) for word in TOKEN_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct terms of a chat query, with abbreviations expanded (and spelled-out forms abbreviated)"""
+    words = [word for word in TOKEN_RE.findall(query.lower()) if word not in STOPWORDS]
+    for abbreviation, expansion in QUERY_EXPANSIONS.items():
+        if abbreviation in words:
+            words.extend(expansion)
+        elif all(word in words for word in expansion):
+            words.append(abbreviation)
+    return list(dict.fromkeys(stem(word) for word in words))
+
+
+def best_excerpt(text: str, terms: Iterable[str], max_chars: int = 220) -> str:
+    """The line of a passage sharing the most terms with the query, shortened"""
+    terms = set(terms)
+    best, best_hits = '', -1
+    for line in LINE_RE.findall(text):
+        line = line.strip()
+        if not line or PAGE_MARKER_RE.match(line):
+            continue
+        hits = len(terms.intersection(tokenize(line)))
+        if hits > best_hits:
+            best, best_hits = line, hits
+    if len(best) > max_chars:
+        best = best[:max_chars].rsplit(' ', 1)[0] + '…'
+    return best
+
+
+def split_passages(text: str) -> List[Tuple[int, int, int]]:
+    """
+    Split DocumentProcessor output into small passages of page text
+
+    Returns:
+        (page_number, start, end) character ranges, never crossing a
+        ``--- Page N ---`` marker
+    """
+    passages = []
+    page = 1
+    start = end = None
+    lines = 0
+    for match in LINE_RE.finditer(text):
+        line = match.group()
+        marker = PAGE_MARKER_RE.match(line.strip())
+        if marker or (start is not None and (
+            lines >= PASSAGE_LINES or match.end() - start > PASSAGE_CHARS
+        )):
+            if start is not None:
+                passages.append((page, start, end))
+                start = None
+            if marker:
+                page = int(marker.group(1))
+                continue
+        if not line.strip():
+            continue
+        if start is None:
+            start, lines = match.start(), 0
+        end = match.end()
+        lines += 1
+    if start is not None:
+        passages.append((page, start, end))
+    return passages
+
+
+def event_text(event) -> str:
+    """The searchable text of an event: its name, type, time, location and remarks"""
+    parts = (event.event_name, event.event_type, event.start_time, event.location, event.remarks)
+    return '\n'.join(str(part) for part in parts if part)
+
+
+class Hit(NamedTuple):
+    """One retrieved passage"""
+    kind: int
+    ref: int  # event sequence for EVENT, page number for TEXT
+    start: int  # character range in the document text (TEXT only)
+    end: int
+    score: float
+
+
+class RetrievalIndex:
+    """
+    BM25 over one document's passages, as NumPy sparse columns
+
+    Every event (name, time, location and remarks) and every few lines of
+    page text is a passage. Each term's postings are a slice of
+    ``indices``/``weights`` (compressed sparse columns): the passages that
+    contain it and their precomputed BM25 term weights. A query adds the
+    slices of its terms into a score vector and takes the top k, so it
+    costs the postings of the query terms, not the size of the document.
+    """
+
+    __slots__ = ('vocabulary', 'indptr', 'indices', 'weights', 'kinds', 'refs', 'starts', 'ends')
+
+    def __init__(self, vocabulary, indptr, indices, weights, kinds, refs, starts, ends):
+        self.vocabulary = vocabulary  # term -> column
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.kinds = kinds
+        self.refs = refs
+        self.starts = starts
+        self.ends = ends
+
+    @property
+    def size(self) -> int:
+        return len(self.kinds)
+
+    @classmethod
+    def build(cls, text_content: Optional[str], events) -> 'RetrievalIndex':
+        """
+        Index a document
+
+        Args:
+            text_content: Extracted document text
+            events: ``EventRecord``s or Event rows, in sequence order
+        """
+        kinds, refs, starts, ends, documents = [], [], [], [], []
+        for sequence, event in enumerate(events):
+            kinds.append(EVENT)
+            refs.append(sequence)
+            starts.append(-1)
+            ends.append(-1)
+            documents.append(tokenize(event_text(event)))
+        for page, start, end in split_passages(text_content or ''):
+            kinds.append(TEXT)
+            refs.append(page)
+            starts.append(start)
+            ends.append(end)
+            documents.append(tokenize(text_content[start:end]))
+
+        vocabulary = {}
+        term_ids = [
+            np.fromiter((vocabulary.setdefault(term, len(vocabulary)) for term in terms),
+                        dtype=np.int64, count=len(terms))
+            for terms in documents
+        ]
+        n_passages = len(documents)
+        lengths = np.array([len(terms) for terms in documents], dtype=np.float64)
+
+        if vocabulary and lengths.sum():
+            passage_ids = np.repeat(np.arange(n_passages, dtype=np.int64), lengths.astype(np.int64))
+            # One key per (term, passage) pair, term-major, so the sorted
+            # unique keys are already laid out column by column
+            keys, tf = np.unique(np.concatenate(term_ids) * n_passages + passage_ids, return_counts=True)
+            columns, indices = np.divmod(keys, n_passages)
+            df = np.bincount(columns, minlength=len(vocabulary))
+            idf = np.log1p((n_passages - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[indices] / lengths.mean())
+            weights = idf[columns] * tf * (BM25_K1 + 1) / (tf + norm)
+            indptr = np.concatenate(([0], np.cumsum(df)))
+        else:
+            indices = np.zeros(0, dtype=np.int64)
+            weights = np.zeros(0, dtype=np.float64)
+            indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+
+        return cls(
+            vocabulary,
+            indptr.astype(np.int32),
+            indices.astype(np.int32),
+            weights.astype(np.float32),
+            np.array(kinds, dtype=np.int8),
+            np.array(refs, dtype=np.int32),
+            np.array(starts, dtype=np.int32),
+            np.array(ends, dtype=np.int32)
+        )
+
+    def search(self, query: str, k: int = 5) -> List[Hit]:
+        """The k passages scoring highest for the query (only those matching a term)"""
+        columns = [self.vocabulary[term] for term in query_terms(query) if term in self.vocabulary]
+        if not columns:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        for column in columns:
+            start, end = self.indptr[column], self.indptr[column + 1]
+            # A term's postings name each passage once, so fancy += is safe
+            scores[self.indices[start:end]] += self.weights[start:end]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        # Best first; ties in document order
+        order = matched[np.lexsort((matched, -scores[matched]))]
+        return [
+            Hit(int(self.kinds[i]), int(self.refs[i]), int(self.starts[i]),
+                int(self.ends[i]), float(scores[i]))
+            for i in order
+        ]
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez(
+            buffer, terms=np.array(terms, dtype=str), indptr=self.indptr,
+            indices=self.indices, weights=self.weights, kinds=self.kinds,
+            refs=self.refs, starts=self.starts, ends=self.ends
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RetrievalIndex':
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            terms = arrays['terms'].tolist()
+            return cls(
+                dict(zip(terms, range(len(terms)))), arrays['indptr'], arrays['indices'],
+                arrays['weights'], arrays['kinds'], arrays['refs'], arrays['starts'], arrays['ends']
+            )
+
+
+class RetrievalStore:
+    """
+    Stored retrieval indexes, one row per document, with the most recently
+    used ones kept deserialized in memory
+
+    Indexes are written by ``index_document`` in the session that saves the
+    events. Documents processed before the index existed (or under an older
+    ``RETRIEVAL_VERSION``) are indexed on first use. The memory cache is
+    keyed on the document's ``processed_at``, so a document re-processed by
+    another worker process is reloaded rather than served stale.
+    """
+
+    def __init__(self, max_cached: int = 32):
+        self.max_cached = max_cached
+        self._cache: 'OrderedDict[str, Tuple[object, RetrievalIndex]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def index_document(self, document_id: str, text_content: Optional[str], events) -> RetrievalIndex:
+        """Build and store a document's index; committed by the caller"""
+        index = RetrievalIndex.build(text_content, events)
+        entry = db.session.get(RetrievalIndexEntry, document_id)
+        if entry is None:
+            entry = RetrievalIndexEntry(document_id=document_id)
+            db.session.add(entry)
+        entry.version = RETRIEVAL_VERSION
+        entry.data = index.to_bytes()
+        with self._lock:
+            self._cache.pop(document_id, None)
+        return index
+
+    def get(self, document) -> RetrievalIndex:
+        """The index of a processed document, loading or building it as needed"""
+        key = document.processed_at
+        with self._lock:
+            cached = self._cache.get(document.id)
+            if cached is not None and cached[0] == key:
+                self._cache.move_to_end(document.id)
+                return cached[1]
+
+        entry = db.session.get(RetrievalIndexEntry, document.id)
+        if entry is not None and entry.version == RETRIEVAL_VERSION:
+            index = RetrievalIndex.from_bytes(entry.data)
+        else:
+            index = self.index_document(document.id, document.text_content, document.events)
+            db.session.commit()
+            logger.info(f"Built retrieval index for document {document.id}: {index.size} passages")
+
+        with self._lock:
+            self._cache[document.id] = (key, index)
+            self._cache.move_to_end(document.id)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return index
@@ -0,0 +1,315 @@
+"""
+Search Index Service
+Full-text search across documents' extracted text and event remarks
+"""
+
+import re
+import html
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError
+
+from backend.models import db, Document, Event
+
+logger = logging.getLogger(__name__)
+
+# Kinds of indexed rows: a document's full text, or one event's remarks
+KINDS = ('document', 'event')
+
+# Snippet markup around matched terms
+MARK_START = '<mark>'
+MARK_END = '</mark>'
+
+# Placeholders the database puts around matched terms; the snippet is
+# HTML-escaped before they are swapped for the markup, so document text
+# can't inject any of its own
+SENTINEL_START = '\x02'
+SENTINEL_END = '\x03'
+STRIP_SENTINELS = str.maketrans('', '', SENTINEL_START + SENTINEL_END)
+
+# Documents indexed per transaction when filling a new index
+BACKFILL_BATCH = 50
+
+# Quoted phrases, OR, and bare words of a user query
+QUERY_TOKEN_RE = re.compile(r'"([^"]*)"|\b(OR)\b|([\w\']+)')
+
+SQLITE_SCHEMA = (
+    "CREATE VIRTUAL TABLE search_index USING fts5("
+    "document_id UNINDEXED, sequence UNINDEXED, kind UNINDEXED, content, "
+    "tokenize='porter unicode61')"
+)
+
+POSTGRES_SCHEMA = (
+    "CREATE TABLE search_index ("
+    "id BIGSERIAL PRIMARY KEY, "
+    "document_id VARCHAR(36) NOT NULL, "
+    "sequence INTEGER, "
+    "kind VARCHAR(16) NOT NULL, "
+    "content TEXT NOT NULL, "
+    "content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('english', content)) STORED)",
+    "CREATE INDEX ix_search_index_tsv ON search_index USING GIN (content_tsv)",
+    "CREATE INDEX ix_search_index_document ON search_index (document_id)",
+)
+
+
+def fts5_query(query: str) -> str:
+    """
+    Turn a user query into an FTS5 MATCH expression
+
+    Words and "quoted phrases" are all required; ``OR`` between two of them
+    makes either enough. Everything is quoted, so punctuation such as
+    ``NOR:`` or ``(rain)`` can't break the FTS5 query syntax.
+    """
+    parts = []
+    for phrase, or_keyword, word in QUERY_TOKEN_RE.findall(query):
+        if or_keyword:
+            if parts and parts[-1] != 'OR':
+                parts.append('OR')
+            continue
+        text = phrase.strip() if phrase else word
+        if text:
+            parts.append('"' + text.replace('"', '""') + '"')
+    if parts and parts[-1] == 'OR':
+        parts.pop()
+    return ' '.join(parts)
+
+
+class SearchIndex:
+    """
+    Ranked full-text search over ``Document.text_content`` and ``Event.remarks``
+
+    On SQLite the index is an FTS5 table ranked with bm25; on PostgreSQL it
+    is a table with a generated tsvector column under a GIN index, ranked
+    with ts_rank_cd. Rows are written by ``index_document`` in the session
+    that saves the events, so the index commits (or rolls back) with them.
+
+    An event's remarks are a window of its document's text, so one passage
+    can match the document row and several event rows. Each document is
+    returned once, as its best-matching row, with the number of its rows
+    that matched. Results are ordered by score (higher is better) then row
+    id, and paged with a keyset cursor on that pair. Snippets are only built
+    for the rows of the page returned.
+    """
+
+    def __init__(self):
+        self.available = False
+
+    @property
+    def dialect(self) -> str:
+        return db.engine.dialect.name
+
+    def check_schema(self) -> bool:
+        """
+        Enable search if the index table exists; needs an app context
+
+        Only looks the table up, so it runs at startup; ``ensure_schema``
+        creates it.
+        """
+        self.available = db.inspect(db.engine).has_table('search_index')
+        return self.available
+
+    def ensure_schema(self):
+        """
+        Create the index table if it is missing and fill it from the
+        documents processed so far; needs an app context
+
+        Runs from ``flask --app app db-upgrade``. If several upgrades run at
+        once, only the one whose CREATE succeeds fills the index.
+        """
+        if self.check_schema():
+            return
+
+        try:
+            with db.engine.begin() as connection:
+                if self.dialect == 'postgresql':
+                    for statement in POSTGRES_SCHEMA:
+                        connection.execute(db.text(statement))
+                else:
+                    connection.execute(db.text(SQLITE_SCHEMA))
+        except DBAPIError as e:
+            if db.inspect(db.engine).has_table('search_index'):
+                # Another worker created it first and fills it
+                self.available = True
+                return
+            # e.g. an SQLite build without FTS5
+            logger.warning(f"Full-text search unavailable: {str(e)}")
+            return
+        self.available = True
+        self.reindex()
+
+    def reindex(self) -> int:
+        """
+        Index the processed documents again, ``BACKFILL_BATCH`` per
+        transaction; each document's rows are replaced as it is reached,
+        so search keeps working meanwhile
+
+        Returns:
+            Number of documents indexed
+        """
+        indexed = 0
+        last_id = None
+        while True:
+            query = db.session.query(Document.id, Document.text_content).filter(
+                Document.status == 'processed'
+            )
+            if last_id is not None:
+                query = query.filter(Document.id > last_id)
+            documents = query.order_by(Document.id).limit(BACKFILL_BATCH).all()
+            if not documents:
+                break
+            for document_id, text_content in documents:
+                remarks = db.session.query(Event.sequence, Event.remarks).filter(
+                    Event.document_id == document_id
+                ).order_by(Event.sequence)
+                # A worker may have indexed it since the table was created
+                self._delete_rows(document_id)
+                self._insert_rows(document_id, text_content, remarks)
+            db.session.commit()
+            indexed += len(documents)
+            last_id = documents[-1][0]
+        if indexed:
+            logger.info(f"Indexed {indexed} existing documents for search")
+        return indexed
+
+    def index_document(self, document_id: str, text_content: Optional[str], events):
+        """
+        Replace a document's index rows; committed by the caller
+
+        Args:
+            document_id: The document
+            text_content: Its extracted text
+            events: Its ``EventRecord``s, in the order they were saved
+        """
+        if not self.available:
+            return
+        self._delete_rows(document_id)
+        self._insert_rows(document_id, text_content, (
+            (sequence, str(event.remarks) if event.remarks is not None else None)
+            for sequence, event in enumerate(events)
+        ))
+
+    @staticmethod
+    def _delete_rows(document_id: str):
+        db.session.execute(
+            db.text("DELETE FROM search_index WHERE document_id = :document_id"),
+            {'document_id': document_id}
+        )
+
+    def _insert_rows(self, document_id: str, text_content: Optional[str],
+                     remarks: Iterable[Tuple[int, Optional[str]]]):
+        rows = []
+        if text_content:
+            rows.append({
+                'document_id': document_id, 'sequence': None,
+                'kind': 'document', 'content': text_content.translate(STRIP_SENTINELS)
+            })
+        rows.extend(
+            {'document_id': document_id, 'sequence': sequence, 'kind': 'event',
+             'content': text.translate(STRIP_SENTINELS)}
+            for sequence, text in remarks if text
+        )
+        if rows:
+            db.session.execute(db.text(
+                "INSERT INTO search_index (document_id, sequence, kind, content) "
+                "VALUES (:document_id, :sequence, :kind, :content)"
+            ), rows)
+
+    def search(self, query: str, limit: int = 20, after: Optional[List[Any]] = None,
+               kind: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Ranked matches for a query
+
+        Args:
+            query: Words, "quoted phrases" and OR
+            limit: Page size
+            after: Cursor values ``[score, id]`` of the last row of the previous page
+            kind: Only 'document' or only 'event' rows
+
+        Returns:
+            (rows, has_more); one row per document, its best match, with id,
+            document_id, sequence, kind, score, matches (the document's
+            matching rows) and snippet
+
+        Raises:
+            ValueError: If the query has no searchable terms or the cursor
+                doesn't fit
+        """
+        if kind is not None and kind not in KINDS:
+            raise ValueError(f"type must be one of: {', '.join(KINDS)}")
+        if after is not None and (
+            len(after) != 2 or not all(isinstance(value, (int, float)) for value in after)
+        ):
+            raise ValueError("Invalid cursor")
+
+        if self.dialect == 'postgresql':
+            matches, snippets = self._postgres_statements()
+            match_query = query
+        else:
+            matches, snippets = self._sqlite_statements()
+            match_query = fts5_query(query)
+        if not match_query.strip():
+            raise ValueError("Query has no searchable terms")
+
+        params = {'query': match_query, 'limit': limit + 1, 'kind': kind}
+        kind_filter = "WHERE kind = :kind" if kind is not None else ''
+        page_filter = ''
+        if after is not None:
+            page_filter = "AND (score < :score OR (score = :score AND id > :id))"
+            params['score'], params['id'] = after
+
+        # The best row of each document stands for it
+        rows = db.session.execute(db.text(
+            "SELECT id, document_id, sequence, kind, score, matches FROM ("
+            "SELECT id, document_id, sequence, kind, score, "
+            "ROW_NUMBER() OVER (PARTITION BY document_id ORDER BY score DESC, id) AS position, "
+            "COUNT(*) OVER (PARTITION BY document_id) AS matches "
+            f"FROM ({matches}) AS matches {kind_filter}"
+            f") AS best WHERE position = 1 {page_filter} ORDER BY score DESC, id LIMIT :limit"
+        ), params).mappings().all()
+        has_more = len(rows) > limit
+        rows = [dict(row) for row in rows[:limit]]
+
+        if rows:
+            ids = [row['id'] for row in rows]
+            highlighted = dict(db.session.execute(
+                db.text(snippets).bindparams(db.bindparam('ids', expanding=True)),
+                {'query': match_query, 'ids': ids, 'start': SENTINEL_START, 'end': SENTINEL_END}
+            ).all())
+            for row in rows:
+                row['snippet'] = self._markup(highlighted.get(row['id']))
+        return rows, has_more
+
+    @staticmethod
+    def _markup(snippet: Optional[str]) -> Optional[str]:
+        """HTML-escape a snippet and mark its matched terms"""
+        if snippet is None:
+            return None
+        return html.escape(snippet).replace(SENTINEL_START, MARK_START).replace(SENTINEL_END, MARK_END)
+
+    @staticmethod
+    def _sqlite_statements() -> Tuple[str, str]:
+        # bm25() is lower for better matches
+        matches = (
+            "SELECT rowid AS id, document_id, sequence, kind, -bm25(search_index) AS score "
+            "FROM search_index WHERE search_index MATCH :query"
+        )
+        snippets = (
+            "SELECT rowid, snippet(search_index, 3, :start, :end, '…', 24) "
+            "FROM search_index WHERE search_index MATCH :query AND rowid IN :ids"
+        )
+        return matches, snippets
+
+    @staticmethod
+    def _postgres_statements() -> Tuple[str, str]:
+        matches = (
+            "SELECT id, document_id, sequence, kind, "
+            "ts_rank_cd(content_tsv, websearch_to_tsquery('english', :query)) AS score "
+            "FROM search_index WHERE content_tsv @@ websearch_to_tsquery('english', :query)"
+        )
+        snippets = (
+            "SELECT id, ts_headline('english', content, websearch_to_tsquery('english', :query), "
+            "'StartSel=' || :start || ', StopSel=' || :end || ', MaxWords=35, MinWords=15, MaxFragments=2') "
+            "FROM search_index WHERE id IN :ids"
+        )
+        return matches, snippets
@@ -9,7 +9,20 @@ from .helpers import (
     parse_datetime,
     sanitize_filename,
     validate_email,
-    generate_unique_id
+    generate_unique_id,
+    save_stream_hashed,
+    content_addressed_path,
+    contains_pattern
+)
+from .datetime_parser import (
+    parse_sof_datetime,
+    normalize_timestamps
+)
+from .pagination import (
+    encode_cursor,
+    decode_cursor,
+    parse_fields,
+    ndjson_response
 )
 
 __all__ = [
@@ -17,7 +30,16 @@ __all__ = [
     'get_file_hash',
     'format_duration',
     'parse_datetime',
+    'parse_sof_datetime',
+    'normalize_timestamps',
     'sanitize_filename',
     'validate_email',
-    'generate_unique_id'
+    'generate_unique_id',
+    'save_stream_hashed',
+    'content_addressed_path',
+    'contains_pattern',
+    'encode_cursor',
+    'decode_cursor',
+    'parse_fields',
+    'ndjson_response'
 ]
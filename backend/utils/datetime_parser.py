@@ -0,0 +1,225 @@
+"""
+Date/time parsing for Statement of Facts timestamps
+
+One compiled tokenizer covers the layouts found in SoF documents:
+``16.02.2024``, ``31/08/25``, ``2024-02-16 17:12``, ``9/Dec/23 05:30 HRS``,
+``16th February 2024``, ``Feb 16, 2024``, ``1712 HRS``, ``17:12``,
+``5:30 pm`` and ``08.15 hrs``. Dates are day-first (a month field over 12
+is read as month-first, as in ``parse_event_time``), two-digit years are
+20xx below 50, and ``2400`` is midnight at the end of the day. A day and
+month without a year (``31/12 0200``) is still a date: it takes its year
+from the default date or the previous timestamp, or gives no timestamp.
+
+Bare four digits that could be a year are only read as a time when they
+say so: ``May 2024 rain`` and ``rain in 2024`` have neither a date nor a
+time, while ``2024 HRS``, ``2024 LT``, ``2024 16.02.2024`` and
+``16.02.2024 2024`` (a time next to its date) are 20:24.
+"""
+
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+_MONTH = (
+    r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?'
+    r'|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\.?'
+)
+
+# Alternatives are tried in order at each position, so full dates win over
+# the time forms that could match their leading digits. ``hdot`` only takes
+# clock times, and a day/month without a year comes after it, so "08.15 hrs"
+# is a time and "0200 31.12" is a date. A two-digit year is never the hour of
+# a following time ("31 Aug 08:00")
+TOKEN_RE = re.compile(rf"""
+    (?P<iso>\b(?P<iso_y>\d{{4}})-(?P<iso_m>\d{{1,2}})-(?P<iso_d>\d{{1,2}})
+        (?:[T\s](?P<iso_h>\d{{1,2}}):(?P<iso_min>\d{{2}})(?::\d{{2}}(?:\.\d+)?)?)?)
+  | (?P<dmy>\b(?P<dmy_d>\d{{1,2}})(?P<sep>[./-])(?P<dmy_m>\d{{1,2}})(?P=sep)(?P<dmy_y>\d{{4}}|\d{{2}})\b)
+  | (?P<dmony>\b(?P<a_d>\d{{1,2}})(?:st|nd|rd|th)?[\s./-]*(?P<a_mon>{_MONTH})
+        (?:[\s./,-]*(?P<a_y>(?:19|20)\d{{2}}|\d{{2}}(?![:.]?\d)))?\b)
+  | (?P<mondy>\b(?P<b_mon>{_MONTH})\s*(?P<b_d>\d{{1,2}})(?:st|nd|rd|th)?\b
+        (?:,?\s*(?P<b_y>(?:19|20)\d{{2}}))?)
+  | (?P<monyear>\b{_MONTH}[\s,]*(?:19|20)\d{{2}}\b)
+  | (?P<hm>\b(?P<hm_h>\d{{1,2}}):(?P<hm_min>\d{{2}})(?::\d{{2}})?
+        (?:\s*(?P<hm_ampm>[ap])\.?m\b\.?)?)
+  | (?P<hdot>\b(?!24\.(?!00))(?P<hd_h>[01]?\d|2[0-4])\.(?P<hd_min>[0-5]\d)(?=\s*(?:hrs?\b|h\b|lt\b|$)))
+  | (?P<dm>\b(?P<dm_d>\d{{1,2}})[./-](?P<dm_m>\d{{1,2}})\b(?![./-]\d))
+  | (?P<hhmm>\b(?P<hh_h>[01]\d|2[0-4])(?P<hh_min>[0-5]\d)\b(?P<hh_unit>\s*(?:hrs?|h|lt)\b)?)
+""", re.IGNORECASE | re.VERBOSE)
+
+DATE_KINDS = ('iso', 'dmy', 'dm', 'dmony', 'mondy')
+
+
+class DateTimeParts(NamedTuple):
+    """What a timestamp string spelled out; missing fields are None"""
+    year: Optional[int]
+    month: Optional[int]
+    day: Optional[int]
+    hour: Optional[int]
+    minute: Optional[int]
+
+    @property
+    def has_date(self) -> bool:
+        return self.day is not None
+
+    @property
+    def has_time(self) -> bool:
+        return self.hour is not None
+
+
+def _year(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    year = int(value)
+    if year < 100:
+        year += 2000 if year < 50 else 1900
+    return year
+
+
+def _looks_like_year(value: str, match) -> bool:
+    """Whether bare ``19xx``/``20xx`` digits before any date are a year: no HRS/LT unit and no date after them"""
+    if match.group('hh_h') not in ('19', '20') or match.group('hh_unit'):
+        return False
+    return not any(
+        following.lastgroup in DATE_KINDS for following in TOKEN_RE.finditer(value, match.end())
+    )
+
+
+@lru_cache(maxsize=8192)
+def parse_parts(value: str) -> Optional[DateTimeParts]:
+    """
+    Tokenize a timestamp string in one pass (cached on the raw string)
+
+    The first date and the first time in the string are used.
+
+    Returns:
+        The parts found, or None if there is neither a date nor a time
+    """
+    year = month = day = hour = minute = None
+    for match in TOKEN_RE.finditer(value):
+        kind = match.lastgroup
+        groups = match.groupdict()
+        if day is None and kind in DATE_KINDS:
+            if kind == 'iso':
+                year, month, day = int(groups['iso_y']), int(groups['iso_m']), int(groups['iso_d'])
+                if groups['iso_h'] is not None and hour is None:
+                    hour, minute = int(groups['iso_h']), int(groups['iso_min'])
+            elif kind in ('dmy', 'dm'):
+                if kind == 'dmy':
+                    year = _year(groups['dmy_y'])
+                month, day = int(groups[f'{kind}_m']), int(groups[f'{kind}_d'])
+                if month > 12 >= day:
+                    day, month = month, day
+            elif kind == 'dmony':
+                year, day = _year(groups['a_y']), int(groups['a_d'])
+                month = MONTHS[groups['a_mon'][:3].lower()]
+            else:
+                year, day = _year(groups['b_y']), int(groups['b_d'])
+                month = MONTHS[groups['b_mon'][:3].lower()]
+        elif hour is None and kind in ('hm', 'hdot', 'hhmm'):
+            if kind == 'hhmm' and day is None and _looks_like_year(value, match):
+                continue
+            prefix = {'hm': 'hm', 'hdot': 'hd', 'hhmm': 'hh'}[kind]
+            hour, minute = int(groups[f'{prefix}_h']), int(groups[f'{prefix}_min'])
+            ampm = groups['hm_ampm'] if kind == 'hm' else None
+            if ampm:
+                if hour > 12:
+                    hour = minute = None
+                    continue
+                hour = hour % 12 + (12 if ampm.lower() == 'p' else 0)
+        if day is not None and hour is not None:
+            break
+
+    if day is None and hour is None:
+        return None
+    if hour is not None and (minute > 59 or hour > 24 or (hour == 24 and minute)):
+        hour = minute = None
+        if day is None:
+            return None
+    return DateTimeParts(year, month, day, hour, minute)
+
+
+def _build(parts: DateTimeParts, year: int, month: int, day: int) -> Optional[datetime]:
+    try:
+        parsed = datetime(year, month, day)
+    except ValueError:
+        return None
+    if parts.hour == 24:
+        return parsed + timedelta(days=1)
+    if parts.hour is not None:
+        parsed = parsed.replace(hour=parts.hour, minute=parts.minute)
+    return parsed
+
+
+def parse_sof_datetime(value: str, default_date: Optional[date] = None) -> Optional[datetime]:
+    """
+    Parse one SoF timestamp
+
+    Args:
+        value: Timestamp text, e.g. "1712 HRS 16.02.2024"
+        default_date: Date for a time on its own, and the year for a date
+            written without one
+
+    Returns:
+        The (naive) datetime, midnight if there is no time; None if the
+        text has no usable date
+    """
+    if not value or not isinstance(value, str):
+        return None
+    parts = parse_parts(value)
+    if parts is None:
+        return None
+    if parts.has_date:
+        year = parts.year if parts.year is not None else (default_date.year if default_date else None)
+        if year is None:
+            return None
+        return _build(parts, year, parts.month, parts.day)
+    if default_date is None:
+        return None
+    return _build(parts, default_date.year, default_date.month, default_date.day)
+
+
+def normalize_timestamps(values: Iterable[Optional[str]],
+                         reference: Optional[datetime] = None) -> List[Optional[datetime]]:
+    """
+    Parse a document's timestamps in document order
+
+    SoFs often give the date once and then only times, or leave the year
+    off. A time on its own takes the date of the previous timestamp, moving
+    to the next day when it is earlier than that timestamp (a watch past
+    midnight); a date without a year takes the previous year, moving to the
+    next year when it would fall months before (a call over New Year).
+
+    Args:
+        values: Timestamp strings; None or unparseable entries give None
+        reference: Starting point for a document whose first timestamps
+            lack a date or year (e.g. the upload date)
+
+    Returns:
+        One datetime or None per input value
+    """
+    results = []
+    previous = reference
+    for value in values:
+        parts = parse_parts(value) if value else None
+        parsed = None
+        if parts is not None:
+            if parts.has_date and parts.year is not None:
+                parsed = _build(parts, parts.year, parts.month, parts.day)
+            elif parts.has_date and previous is not None:
+                parsed = _build(parts, previous.year, parts.month, parts.day)
+                if parsed is not None and parsed < previous - timedelta(days=180):
+                    parsed = _build(parts, previous.year + 1, parts.month, parts.day)
+            elif not parts.has_date and previous is not None:
+                parsed = _build(parts, previous.year, previous.month, previous.day)
+                if parsed < previous:
+                    parsed += timedelta(days=1)
+        results.append(parsed)
+        if parsed is not None:
+            previous = parsed
+    return results
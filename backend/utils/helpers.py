@@ -6,10 +6,13 @@ import os
 import hashlib
 import re
 import uuid
+import tempfile
 from datetime import datetime, timedelta
-from typing import Optional, Union, List
+from typing import Optional, Union, List, Tuple
 import logging
 
+from .datetime_parser import parse_sof_datetime
+
 logger = logging.getLogger(__name__)
 
 def allowed_file(filename: str) -> bool:
@@ -49,6 +52,59 @@ def get_file_hash(file_path: str) -> str:
         logger.error(f"Error calculating file hash: {str(e)}")
         return ""
 
+def save_stream_hashed(stream, directory: str, max_size: Optional[int] = None,
+                       chunk_size: int = 1024 * 1024) -> Tuple[str, str, int]:
+    """
+    Write a stream to a temporary file while hashing it in the same pass
+    
+    Args:
+        stream: Readable binary stream (e.g. an uploaded file's stream)
+        directory: Directory for the temporary file; keep it on the same
+            filesystem as the final location so the rename is atomic
+        max_size: Maximum number of bytes to accept
+        chunk_size: Bytes to read per chunk
+        
+    Returns:
+        (temporary file path, SHA-256 hash, size in bytes)
+        
+    Raises:
+        ValueError: If the stream is larger than max_size
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    hash_sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise ValueError(f"File exceeds {max_size} bytes")
+                hash_sha256.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return temp_path, hash_sha256.hexdigest(), size
+
+def content_addressed_path(directory: str, file_hash: str, filename: str) -> str:
+    """
+    Storage path for a file named by its content hash
+    
+    Files are fanned out into subdirectories by the first two hash
+    characters and keep the original extension (text extraction uses it).
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return os.path.join(directory, file_hash[:2], f"{file_hash}{extension}")
+
+def contains_pattern(value: str) -> str:
+    """
+    LIKE pattern matching ``value`` anywhere, with its own ``%``/``_``
+    escaped; use with ``escape='\\'``
+    """
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
 def format_duration(seconds: int) -> str:
     """
     Format duration in seconds to human-readable format
@@ -80,6 +136,10 @@ def parse_datetime(date_str: str) -> Optional[datetime]:
     """
     Parse various datetime formats commonly found in maritime documents
     
+    A time on its own is taken to be today. See ``datetime_parser`` for the
+    formats understood; ``normalize_timestamps`` parses a whole document's
+    timestamps with day/year rollover.
+    
     Args:
         date_str: Date/time string to parse
         
@@ -89,85 +149,10 @@ def parse_datetime(date_str: str) -> Optional[datetime]:
     if not date_str or not isinstance(date_str, str):
         return None
     
-    # Common datetime formats in maritime documents
-    formats = [
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-        "%d/%m/%Y %H:%M",
-        "%d-%m-%Y %H:%M",
-        "%d.%m.%Y %H:%M",
-        "%Y-%m-%d",
-        "%d/%m/%Y",
-        "%d-%m-%Y",
-        "%d.%m.%Y",
-        "%H:%M",
-        "%H.%M"
-    ]
-    
-    # Clean the input string
-    cleaned_str = date_str.strip()
-    
-    # Try each format
-    for fmt in formats:
-        try:
-            parsed_dt = datetime.strptime(cleaned_str, fmt)
-            
-            # If only time is provided, assume current date
-            if fmt in ["%H:%M", "%H.%M"]:
-                today = datetime.now().date()
-                parsed_dt = datetime.combine(today, parsed_dt.time())
-            
-            return parsed_dt
-        except ValueError:
-            continue
-    
-    # Try parsing with regex for more flexible formats
-    try:
-        return parse_datetime_with_regex(cleaned_str)
-    except:
+    parsed = parse_sof_datetime(date_str.strip(), default_date=datetime.now().date())
+    if parsed is None:
         logger.warning(f"Could not parse datetime: {date_str}")
-        return None
-
-def parse_datetime_with_regex(date_str: str) -> Optional[datetime]:
-    """
-    Parse datetime using regex patterns for flexible parsing
-    
-    Args:
-        date_str: Date/time string to parse
-        
-    Returns:
-        Parsed datetime object or None if parsing fails
-    """
-    # Pattern for date and time
-    pattern = r'(\d{1,2})[\/\-\.](\d{1,2})[\/\-\.](\d{2,4})\s+(\d{1,2}):(\d{2})'
-    match = re.search(pattern, date_str)
-    
-    if match:
-        day, month, year, hour, minute = match.groups()
-        
-        # Handle 2-digit years
-        year = int(year)
-        if year < 100:
-            year += 2000 if year < 50 else 1900
-        
-        try:
-            return datetime(year, int(month), int(day), int(hour), int(minute))
-        except ValueError:
-            pass
-    
-    # Pattern for time only
-    time_pattern = r'(\d{1,2}):(\d{2})'
-    time_match = re.search(time_pattern, date_str)
-    
-    if time_match:
-        hour, minute = time_match.groups()
-        try:
-            today = datetime.now().date()
-            return datetime.combine(today, datetime.strptime(f"{hour}:{minute}", "%H:%M").time())
-        except ValueError:
-            pass
-    
-    return None
+    return parsed
 
 def sanitize_filename(filename: str) -> str:
     """
@@ -0,0 +1,236 @@
+"""
+Metrics for SoF Event Extractor
+In-process stage timers, histograms and a per-pattern cost table, rendered
+in the Prometheus text exposition format
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Stage latencies range from sub-millisecond regex work to minutes of OCR
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # label values -> [per-bucket counts..., sum, count]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> Dict[LabelValues, Dict[str, float]]:
+        """Count and sum per label set"""
+        with self._lock:
+            return {key: {'count': s[-1], 'sum': s[-2]} for key, s in self._series.items()}
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_number(values[-2])}"
+            yield f"{self.name}_count{labels} {values[-1]}"
+
+
+class PatternStats:
+    """
+    Hits and regex cost per event pattern
+
+    Fed by ``PatternEngine`` (one ``record`` per pattern per document), so a
+    pathological regex shows up as a high cost per run with few hits.
+    """
+
+    def __init__(self):
+        # (entry name, pattern index) -> [source, runs, hits, seconds]
+        self._patterns: Dict[Tuple[str, int], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, entry: str, index: int, source: str, hits: int, seconds: float):
+        key = (entry, index)
+        with self._lock:
+            stats = self._patterns.get(key)
+            if stats is None:
+                stats = self._patterns[key] = [source, 0, 0, 0.0]
+            stats[1] += 1
+            stats[2] += hits
+            stats[3] += seconds
+
+    def table(self) -> List[Dict[str, Any]]:
+        """Per-pattern rows, most expensive first"""
+        with self._lock:
+            items = [(key, list(stats)) for key, stats in self._patterns.items()]
+        rows = [
+            {
+                'entry': entry,
+                'pattern_index': index,
+                'pattern': source,
+                'runs': runs,
+                'hits': hits,
+                'seconds': round(seconds, 6),
+                'ms_per_run': round(seconds * 1000 / runs, 4) if runs else 0.0,
+                'ms_per_hit': round(seconds * 1000 / hits, 4) if hits else None
+            }
+            for (entry, index), (source, runs, hits, seconds) in items
+        ]
+        rows.sort(key=lambda row: row['seconds'], reverse=True)
+        return rows
+
+    def samples(self) -> Iterator[str]:
+        names = ('entry', 'pattern')
+        rows = sorted(self.table(), key=lambda row: (row['entry'], row['pattern_index']))
+        for metric, field, kind in (
+            ('sof_pattern_runs_total', 'runs', 'counter'),
+            ('sof_pattern_hits_total', 'hits', 'counter'),
+            ('sof_pattern_seconds_total', 'seconds', 'counter'),
+        ):
+            yield f"# HELP {metric} Event pattern {field} per pattern entry and pattern index"
+            yield f"# TYPE {metric} {kind}"
+            for row in rows:
+                labels = _format_labels(names, (row['entry'], row['pattern_index']))
+                yield f"{metric}{labels} {_format_number(row[field])}"
+
+
+class MetricsRegistry:
+    """The application's metrics, rendered together for ``/metrics``"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.patterns = PatternStats()
+        self.stage_seconds = self.histogram(
+            'sof_stage_duration_seconds',
+            'Time spent in each processing stage',
+            ('stage', 'backend')
+        )
+        self.stage_errors = self.counter(
+            'sof_stage_errors_total',
+            'Processing stages that raised an exception',
+            ('stage', 'backend')
+        )
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    @contextmanager
+    def stage(self, stage: str, backend: str = ''):
+        """Time a block as one run of ``stage``; exceptions are counted too"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.stage_errors.inc(stage=stage, backend=backend)
+            raise
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started, stage=stage, backend=backend)
+
+    def timed(self, stage: str, backend: str = ''):
+        """Decorator form of ``stage``"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage, backend):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        lines.extend(self.patterns.samples())
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry; with several gunicorn workers each one reports its own
+metrics = MetricsRegistry()
@@ -0,0 +1,90 @@
+"""
+Pagination and response streaming helpers for list endpoints
+"""
+
+import json
+import base64
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from flask import Response, stream_with_context
+
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor"""
+    payload = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """
+    Decode a cursor produced by ``encode_cursor``
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_fields(fields_arg: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """
+    Parse a ``fields=a,b,c`` query argument
+    
+    Returns:
+        The requested field names, or None to return every field
+        
+    Raises:
+        ValueError: If an unknown field is requested
+    """
+    if not fields_arg:
+        return None
+    fields = [field.strip() for field in fields_arg.split(',') if field.strip()]
+    unknown = set(fields) - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def select_fields(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Keep only the requested fields of a serialized row"""
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields}
+
+
+def parse_limit(limit_arg: Optional[str], default: int = 100) -> int:
+    """Parse a ``limit`` query argument, clamped to 1..MAX_PAGE_SIZE"""
+    try:
+        limit = int(limit_arg) if limit_arg else default
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def ndjson_response(rows: Iterable[Any], serialize: Callable[[Any], Dict[str, Any]]) -> Response:
+    """
+    Stream rows as newline-delimited JSON
+    
+    ``rows`` is consumed lazily inside the request context, so with a
+    ``yield_per`` query only one batch of rows is held in memory.
+    """
+    def generate():
+        for row in rows:
+            yield json.dumps(serialize(row), default=str) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def wants_ndjson(request) -> bool:
+    """True if the client asked for NDJSON via ``format=ndjson`` or the Accept header"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
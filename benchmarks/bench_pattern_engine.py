@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Pattern Engine Benchmark
+Compares the compiled anchor-routed PatternEngine with the legacy
+per-pattern re.finditer loop across document lengths and pattern counts.
+
+Usage:
+    python benchmarks/bench_pattern_engine.py
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.enhanced_maritime_extractor import EnhancedMaritimeExtractor
+from backend.pattern_engine import PatternEngine
+
+EVENT_LINES = [
+    "VESSEL ARRIVED AT SINGAPORE PORT LIMITS: 0800 HRS 31.08.2025",
+    "PILOT BOARDED: 0815 HRS 31.08.2025",
+    "FIRST LINE ASHORE BERTH NO B23: 0930 HRS 31.08.2025",
+    "ALL FAST: 0945 HRS 31.08.2025",
+    "LOADING COMMENCED: 1000 HRS 31.08.2025",
+    "LOADING COMPLETED: 1800 HRS 31.08.2025",
+    "NOR TENDERED: 1806 HRS 18.02.2024",
+    "FREE PRATIQUE GRANTED: 1635 HRS 18.02.2024",
+    "Heavy rain caused delay in operations",
+    "VESSEL DEPARTED: 1930 HRS 31.08.2025",
+]
+
+FILLER_LINES = [
+    "Draft survey carried out by independent surveyor and chief officer.",
+    "Hatch covers opened, holds inspected and found clean dry and ready.",
+    "Shore gang standing by, stevedores on shift 0600-1400.",
+    "Remarks: all times local, subject to master's signature.",
+    "Cargo documents handed over to agent; bunkers ROB confirmed.",
+]
+
+
+def make_document(pages: int, lines_per_page: int = 40, seed: int = 0) -> str:
+    """Build a synthetic SoF with roughly one event line in seven"""
+    rng = random.Random(seed)
+    blocks = []
+    for page in range(pages):
+        lines = [
+            rng.choice(EVENT_LINES) if rng.random() < 0.15 else rng.choice(FILLER_LINES)
+            for _ in range(lines_per_page)
+        ]
+        blocks.append(f"--- Page {page + 1} ---\n" + "\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def legacy_scan(event_patterns, text: str) -> int:
+    """The original loop: one full re.finditer scan per pattern"""
+    count = 0
+    for pattern_info in event_patterns:
+        for pattern in pattern_info['patterns']:
+            count += sum(1 for _ in re.finditer(pattern, text, re.IGNORECASE))
+    return count
+
+
+def engine_scan(engine: PatternEngine, text: str) -> int:
+    return sum(1 for _ in engine.iter_matches(text))
+
+
+def best_of(func, *args, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    event_patterns = EnhancedMaritimeExtractor().event_patterns
+    engine = PatternEngine(event_patterns)
+    print(f"Anchor index backend: {engine.anchor_index.backend}")
+
+    sample = make_document(40, seed=40)
+    hits = engine.scan(sample)
+    print(f"Anchor hits: {sum(map(len, hits.values()))} in {len(sample)} characters\n")
+
+    print("Scan cost vs document length")
+    print(f"{'pages':>6} {'chars':>9} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8}")
+    for pages in (1, 10, 40, 80):
+        text = make_document(pages, seed=pages)
+        assert legacy_scan(event_patterns, text) == engine_scan(engine, text)
+        legacy = best_of(legacy_scan, event_patterns, text)
+        compiled = best_of(engine_scan, engine, text)
+        print(f"{pages:>6} {len(text):>9} {legacy * 1000:>10.1f} "
+              f"{compiled * 1000:>10.1f} {legacy / compiled:>7.1f}x")
+
+    print("\nScan cost vs pattern count (40 pages)")
+    print(f"{'patterns':>9} {'legacy ms':>10} {'engine ms':>10}")
+    text = make_document(40, seed=40)
+    for factor in (1, 2, 4, 8):
+        patterns = event_patterns * factor
+        scaled_engine = PatternEngine(patterns)
+        legacy = best_of(legacy_scan, patterns, text, repeat=3)
+        compiled = best_of(engine_scan, scaled_engine, text, repeat=3)
+        count = sum(len(p['patterns']) for p in patterns)
+        print(f"{count:>9} {legacy * 1000:>10.1f} {compiled * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Golden Benchmark Corpus
+Deterministic SoF documents for the extraction benchmarks: anonymized
+snippets from the training data, grouped per source document, plus
+synthetic multi-page statements of facts in the formats we see in practice.
+
+The corpus is rebuilt from the same seed on every run, so results (and
+the event digest checked against the baseline) are comparable across
+machines and commits.
+"""
+
+import os
+import re
+import glob
+import json
+import random
+import hashlib
+from typing import List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CORPUS_VERSION = '1'
+DEFAULT_SEED = 2025
+SYNTHETIC_DOCUMENTS = 24
+
+_PAGE_MARKER = re.compile(r'^--- Page \d+ ---$', re.MULTILINE)
+_IMO = re.compile(r'\bIMO(\s*(?:NO\.?|NUMBER)?\s*[:.]?\s*)\d{7}\b', re.IGNORECASE)
+_VESSEL_NAME = re.compile(
+    r'\b(M/V|M\.V\.|MV|MT|M/T)[ \t]+[A-Z][A-Z0-9\-]*(?:[ \t]+[A-Z][A-Z0-9\-]*){0,2}'
+)
+_EMAIL = re.compile(r'\b[\w.+-]+@[\w-]+\.[\w.]+\b')
+
+VESSELS = ['MV OCEAN STAR', 'MV PACIFIC DAWN', 'MT NORTHERN LIGHT', 'MV CAPE ALBA']
+PORTS = ['SINGAPORE', 'ROTTERDAM', 'SURABAYA', 'SANTOS', 'PORT HEDLAND']
+
+# Event lines in the layouts the extractor supports
+EVENT_TEMPLATES = [
+    "VESSEL ARRIVED AT {port} PORT LIMITS: {hhmm} HRS {date}",
+    "END OF SEA PASSAGE: {hhmm} HRS {date}",
+    "NOR TENDERED: {hhmm} HRS {date}",
+    "NOR ACCEPTED: {hhmm} HRS {date}",
+    "FREE PRATIQUE GRANTED: {hhmm} HRS {date}",
+    "PILOT BOARDED: {hhmm} HRS {date}",
+    "FIRST LINE ASHORE: {hhmm} HRS {date}",
+    "ALL FAST: {hhmm} HRS {date}",
+    "LOADING COMMENCED: {hhmm} HRS {date}",
+    "Loading commenced at {hh_mm} on {date}",
+    "LOADING COMPLETED: {hhmm} HRS {date}",
+    "COMMENCED DISCHARGING: {hhmm} HRS {date}",
+    "DISCHARGING COMPLETED: {hhmm} HRS {date}",
+    "Heavy rain caused delay in operations",
+    "RAIN STOPPED CARGO OPERATIONS {hh_mm} - {hh_mm2}",
+    "CUSTOMS CLEARANCE GRANTED: {hhmm} HRS {date}",
+    "PILOT DISEMBARKED: {hhmm} HRS {date}",
+    "VESSEL DEPARTED: {hhmm} HRS {date}",
+]
+
+FILLER_LINES = [
+    "Draft survey carried out by independent surveyor and chief officer.",
+    "Hatch covers opened, holds inspected and found clean dry and ready.",
+    "Shore gang standing by, stevedores on shift 0600-1400.",
+    "Remarks: all times local, subject to master's signature.",
+    "Cargo documents handed over to agent; bunkers ROB confirmed.",
+    "Awaiting shore crane repair, vessel ready in all respects.",
+    "Sundays and holidays excepted unless used, as per charter party.",
+]
+
+
+class CorpusDocument:
+    """One benchmark document"""
+
+    __slots__ = ('name', 'source', 'text')
+
+    def __init__(self, name: str, source: str, text: str):
+        self.name = name
+        self.source = source
+        self.text = text
+
+    @property
+    def pages(self) -> int:
+        return max(1, len(_PAGE_MARKER.findall(self.text)))
+
+    @property
+    def page_texts(self) -> List[str]:
+        """Text of each page, without the page markers (a header joins page 1)"""
+        header, *pages = [part.strip('\n') for part in _PAGE_MARKER.split(self.text)]
+        if not pages:
+            return [self.text]
+        if header.strip():
+            pages[0] = f"{header}\n{pages[0]}"
+        return pages
+
+
+def anonymize(text: str) -> str:
+    """Mask vessel names, IMO numbers and e-mail addresses"""
+    text = _IMO.sub(lambda m: f"IMO{m.group(1)}0000000", text)
+    text = _VESSEL_NAME.sub(lambda m: f"{m.group(1)} VESSEL", text)
+    return _EMAIL.sub('ops@example.com', text)
+
+
+def find_training_data() -> Optional[str]:
+    """The newest maritime_training_data_*.json in the repository root"""
+    candidates = sorted(glob.glob(os.path.join(REPO_ROOT, 'maritime_training_data_*.json')))
+    return candidates[-1] if candidates else None
+
+
+def seeded_documents(path: str, snippets_per_page: int = 6) -> List[CorpusDocument]:
+    """Group training snippets by source file into anonymized multi-page documents"""
+    with open(path, 'r', encoding='utf-8') as f:
+        samples = json.load(f)
+
+    by_source = {}
+    for sample in samples:
+        by_source.setdefault(sample.get('source_file') or 'unknown', []).append(sample['text'])
+
+    documents = []
+    seen = set()
+    for source in sorted(by_source):
+        # The training data repeats snippets (and whole files); keep the first
+        snippets = [anonymize(text) for text in dict.fromkeys(by_source[source])]
+        pages = [
+            snippets[start:start + snippets_per_page]
+            for start in range(0, len(snippets), snippets_per_page)
+        ]
+        text = "\n\n".join(
+            f"--- Page {number} ---\n" + "\n".join(page)
+            for number, page in enumerate(pages, 1)
+        )
+        if text in seen:
+            continue
+        seen.add(text)
+        documents.append(CorpusDocument(f"seeded-{len(documents):03d}", 'training_data', text))
+    return documents
+
+
+def synthetic_document(rng: random.Random, index: int) -> CorpusDocument:
+    """A multi-page SoF (fictional vessel) with a header, event lines and filler"""
+    vessel = rng.choice(VESSELS)
+    port = rng.choice(PORTS)
+    day = rng.randint(1, 24)
+    month = rng.randint(1, 12)
+    year = rng.choice([2023, 2024, 2025])
+
+    header = (
+        f"STATEMENT OF FACTS\nVESSEL: {vessel}\nIMO: 9{index:06d}\n"
+        f"PORT: {port}\nTERMINAL: BULK TERMINAL {rng.randint(1, 5)}\nBERTH: B{rng.randint(1, 40)}"
+    )
+    pages = []
+    for _ in range(rng.choice([1, 2, 3, 5, 8])):
+        lines = []
+        for _ in range(rng.randint(25, 45)):
+            if rng.random() < 0.2:
+                hour, minute = rng.randint(0, 23), rng.choice([0, 15, 30, 45])
+                template = rng.choice(EVENT_TEMPLATES)
+                lines.append(template.format(
+                    port=port,
+                    hhmm=f"{hour:02d}{minute:02d}",
+                    hh_mm=f"{hour:02d}:{minute:02d}",
+                    hh_mm2=f"{(hour + 2) % 24:02d}:{minute:02d}",
+                    date=f"{day:02d}.{month:02d}.{year}"
+                ))
+                if rng.random() < 0.3:
+                    day = min(day + 1, 28)
+            else:
+                lines.append(rng.choice(FILLER_LINES))
+        pages.append("\n".join(lines))
+
+    text = header + "\n\n" + "\n\n".join(
+        f"--- Page {number} ---\n{page}" for number, page in enumerate(pages, 1)
+    )
+    return CorpusDocument(f"synthetic-{index:03d}", 'synthetic', text)
+
+
+def load_corpus(seed: int = DEFAULT_SEED, synthetic: int = SYNTHETIC_DOCUMENTS,
+                training_data: Optional[str] = None) -> List[CorpusDocument]:
+    """
+    Build the golden corpus
+
+    Args:
+        seed: Seed for the synthetic documents
+        synthetic: Number of synthetic documents
+        training_data: Training data JSON to seed from (default: newest in the repo)
+
+    Returns:
+        Seeded documents followed by synthetic ones, in a stable order
+    """
+    documents = []
+    path = training_data or find_training_data()
+    if path:
+        documents.extend(seeded_documents(path))
+
+    rng = random.Random(seed)
+    documents.extend(synthetic_document(rng, index) for index in range(synthetic))
+    return documents
+
+
+def corpus_digest(documents: List[CorpusDocument]) -> str:
+    """Fingerprint of the corpus text, so baselines from another corpus are not compared"""
+    digest = hashlib.sha256(CORPUS_VERSION.encode())
+    for document in documents:
+        digest.update(document.text.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def write_pdf(page_texts: List[str], path: str):
+    """
+    Write a plain text-layer PDF (Helvetica, one text line per source line)
+
+    Kept dependency-free so the PDF backends can be benchmarked on any machine.
+    """
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = len(objects) + 2 * len(page_texts) + 1
+    page_ids = []
+    for page_text in page_texts:
+        lines = []
+        source_lines = page_text.splitlines()
+        # Shrink the leading so long pages still fit on an A4 page
+        leading = min(11.0, 770.0 / max(len(source_lines), 1))
+        for line in source_lines:
+            escaped = line.encode('latin-1', 'replace').replace(b'\\', b'\\\\')
+            escaped = escaped.replace(b'(', b'\\(').replace(b')', b'\\)')
+            lines.append(b"(" + escaped + b") Tj T*")
+        stream = b"BT /F1 %.1f Tf %.2f TL 36 806 Td " % (min(9.0, leading * 0.8), leading)
+        stream += b" ".join(lines) + b" ET"
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font, content)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, xref
+    )
+    with open(path, 'wb') as f:
+        f.write(bytes(output))
+
+
+def write_docx(text: str, path: str) -> bool:
+    """Write the text as a DOCX, one paragraph per line; False without python-docx"""
+    try:
+        from docx import Document
+    except ImportError:
+        return False
+    document = Document()
+    for line in text.splitlines():
+        document.add_paragraph(line)
+    document.save(path)
+    return True
+
+
+if __name__ == "__main__":
+    corpus = load_corpus()
+    print(f"{len(corpus)} documents, {sum(d.pages for d in corpus)} pages, "
+          f"{sum(len(d.text) for d in corpus)} chars, digest {corpus_digest(corpus)}")
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Extraction Benchmark Suite
+Runs the golden corpus (benchmarks/corpus.py) through event extraction,
+text extraction per backend and the full upload -> /api/process path, and
+compares the results with a stored baseline.
+
+Each suite runs in a fresh interpreter so its peak RSS is its own.
+Reported per suite: p50/p99 latency per document, throughput (pages/s,
+chars/s), peak RSS and, for event extraction, a digest of the extracted
+events so output changes show up next to timing changes.
+
+Usage:
+    python benchmarks/run_benchmarks.py                  # all suites, diff against the baseline
+    python benchmarks/run_benchmarks.py --suite extract --repeat 5
+    python benchmarks/run_benchmarks.py --check          # exit 1 on a regression or changed output
+    python benchmarks/run_benchmarks.py --save-baseline  # store these results as the baseline
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import CorpusDocument, load_corpus, corpus_digest, write_docx, write_pdf
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+SUITES = [
+    'extract',
+    'text:txt', 'text:docx', 'text:pdf',
+    'text:pymupdf', 'text:pypdf2', 'text:pdfplumber', 'text:ocr',
+    'process',
+]
+
+# Metric -> True if higher is better
+METRICS = {
+    'p50_ms': False,
+    'p99_ms': False,
+    'pages_per_s': True,
+    'chars_per_s': True,
+    'peak_rss_mb': False,
+}
+
+
+class SuiteSkipped(Exception):
+    """The suite's backend is not available on this machine"""
+
+
+def peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def summarize(latencies: List[float], documents: List[CorpusDocument], repeat: int) -> Dict[str, Any]:
+    """Latency percentiles and throughput from per-document timings (seconds)"""
+    total = sum(latencies)
+    samples = np.array(latencies) * 1000
+    return {
+        'documents': len(documents),
+        'samples': len(latencies),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'mean_ms': round(float(samples.mean()), 3),
+        'pages_per_s': round(sum(d.pages for d in documents) * repeat / total, 1) if total else None,
+        'chars_per_s': round(sum(len(d.text) for d in documents) * repeat / total) if total else None,
+    }
+
+
+def time_documents(documents: List[CorpusDocument], run: Callable[[int], Any],
+                   repeat: int) -> List[float]:
+    """Time run(index) for every document, repeat times over the corpus"""
+    latencies = []
+    for _ in range(repeat):
+        for index in range(len(documents)):
+            started = time.perf_counter()
+            run(index)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def events_digest(results: List[list]) -> str:
+    digest = hashlib.sha256()
+    for events in results:
+        for event in events:
+            start_at = event.start_at.isoformat() if event.start_at else None
+            digest.update(f"{event.event_name}|{event.event_type}|{start_at}\n".encode())
+        digest.update(b'--\n')
+    return digest.hexdigest()[:16]
+
+
+def legacy_matches(event_patterns: List[Dict[str, Any]], text: str) -> List[tuple]:
+    """The matches of the original loop: one full re.finditer scan per pattern"""
+    import re
+    return [
+        (index, match.span(), match.groups())
+        for index, pattern_info in enumerate(event_patterns)
+        for pattern in pattern_info['patterns']
+        for match in re.finditer(pattern, text, re.IGNORECASE)
+    ]
+
+
+def legacy_context(text: str, match_start: int, match_end: int) -> str:
+    """The original remarks window: re-split the document prefix per match"""
+    import re
+    char_window = 1000
+    context_start = max(0, match_start - char_window)
+    context_end = min(len(text), match_end + char_window)
+    words = text[context_start:context_end].strip().split()
+    words_before_window = len(text[:context_start].split())
+    relative_match_start = len(text[:match_start].split()) - words_before_window
+    relative_match_end = len(text[:match_end].split()) - words_before_window
+    words_before = max(0, relative_match_start - 150)
+    words_after = min(len(words), relative_match_end + 150)
+    context = re.sub(r'\s+', ' ', ' '.join(words[words_before:words_after])).replace('\n', ' ')
+    if words_before > 0:
+        context = f"... {context}"
+    if words_after < len(words):
+        context = f"{context} ..."
+    return context
+
+
+def equivalence_mismatches(extractor, documents: List[CorpusDocument]) -> int:
+    """
+    Documents where the pattern engine or the word index disagree with the
+    code they replaced: the matches of ``PatternEngine.iter_matches`` against
+    a per-pattern ``re.finditer`` loop, and ``WordIndex.context_span``
+    remarks against re-splitting the document prefix
+    """
+    from backend.enhanced_maritime_extractor import WordIndex
+
+    positions = {id(pattern_info): index for index, pattern_info in enumerate(extractor.event_patterns)}
+    mismatches = 0
+    for document in documents:
+        text = document.text
+        expected = legacy_matches(extractor.event_patterns, text)
+        found = [
+            (positions[id(pattern_info)], match.span(), match.groups())
+            for pattern_info, match in extractor.pattern_engine.iter_matches(text)
+        ]
+        word_index = WordIndex(text)
+        if found != expected or any(
+            str(word_index.context_span(start, end)) != legacy_context(text, start, end)
+            for _, (start, end), _ in expected
+        ):
+            mismatches += 1
+    return mismatches
+
+
+def bench_extract(documents: List[CorpusDocument], repeat: int, workdir: str) -> Dict[str, Any]:
+    from backend.enhanced_maritime_extractor import EnhancedMaritimeExtractor
+
+    extractor = EnhancedMaritimeExtractor()
+    results = [extractor.extract_events(document.text) for document in documents]  # warm-up
+
+    latencies = time_documents(
+        documents, lambda index: extractor.extract_events(documents[index].text), repeat
+    )
+    metrics = summarize(latencies, documents, repeat)
+    metrics['events'] = sum(len(events) for events in results)
+    metrics['events_digest'] = events_digest(results)
+    metrics['equivalence_mismatches'] = equivalence_mismatches(extractor, documents)
+    return metrics
+
+
+def bench_text(backend: str, documents: List[CorpusDocument], repeat: int,
+               workdir: str) -> Dict[str, Any]:
+    from backend.services.document_processor import DocumentProcessor
+
+    processor = DocumentProcessor()
+    extension = {'txt': '.txt', 'docx': '.docx'}.get(backend, '.pdf')
+
+    paths = []
+    for document in documents:
+        path = os.path.join(workdir, f"{document.name}{extension}")
+        if extension == '.txt':
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(document.text)
+        elif extension == '.docx':
+            if not write_docx(document.text, path):
+                raise SuiteSkipped('python-docx is not installed')
+        else:
+            write_pdf(document.page_texts, path)
+        paths.append(path)
+
+    if backend in ('txt', 'docx', 'pdf'):
+        run = lambda index: processor.extract_text(paths[index])
+    elif backend == 'ocr':
+        reason = processor._ocr_unavailable_reason()
+        if reason:
+            raise SuiteSkipped(reason)
+        run = lambda index: processor._ocr_pages(paths[index], range(1, documents[index].pages + 1))
+    else:
+        opener = getattr(processor, f'_open_{backend}')
+
+        def run(index):
+            with ExitStack() as stack:
+                page_count, get_text = opener(paths[index], stack)
+                for page in range(page_count):
+                    get_text(page)
+
+    try:
+        text = run(0)  # warm-up, and the availability check for the PDF libraries
+    except ImportError as e:
+        raise SuiteSkipped(str(e))
+    if backend == 'pdf' and text.startswith('OCR_'):
+        raise SuiteSkipped('no PDF text layer library is installed')
+
+    return summarize(time_documents(documents, run, repeat), documents, repeat)
+
+
+def bench_process(documents: List[CorpusDocument], repeat: int, workdir: str) -> Dict[str, Any]:
+    """Upload each document and time POST /api/process until its job completes"""
+    import io
+
+    # app.py configures the database and log file at import time
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.sqlite')}"
+    os.chdir(workdir)
+    import app as application
+    logging.disable(logging.CRITICAL)
+
+    flask_app = application.app
+    flask_app.config['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    with flask_app.app_context():
+        application.upgrade_database()
+    client = flask_app.test_client()
+
+    def process(document: CorpusDocument, run: int) -> float:
+        # A distinct file per run, so every run misses the extraction cache
+        data = f"{document.text}\n\nBenchmark run {run}\n".encode('utf-8')
+        response = client.post(
+            '/api/upload',
+            data={'file': (io.BytesIO(data), f"{document.name}.txt")},
+            content_type='multipart/form-data'
+        )
+        document_id = response.get_json()['document_id']
+
+        started = time.perf_counter()
+        job_id = client.post(f'/api/process/{document_id}').get_json()['job_id']
+        while True:
+            job = client.get(f'/api/jobs/{job_id}').get_json()
+            if job['status'] in ('completed', 'failed'):
+                break
+            time.sleep(0.002)
+        elapsed = time.perf_counter() - started
+        if job['status'] != 'completed':
+            raise RuntimeError(f"Processing failed for {document.name}: {job.get('error')}")
+        return elapsed
+
+    process(documents[0], -1)  # warm-up
+    latencies = [
+        process(document, run)
+        for run in range(repeat)
+        for document in documents
+    ]
+    application.job_queue.stop()
+    return summarize(latencies, documents, repeat)
+
+
+def run_worker(suite: str, repeat: int, synthetic: int) -> Dict[str, Any]:
+    """Run one suite in this process and return its metrics"""
+    logging.disable(logging.CRITICAL)
+    documents = load_corpus(synthetic=synthetic)
+    workdir = tempfile.mkdtemp(prefix='sof-bench-')
+    cwd = os.getcwd()
+    try:
+        if suite == 'extract':
+            metrics = bench_extract(documents, repeat, workdir)
+        elif suite == 'process':
+            metrics = bench_process(documents, repeat, workdir)
+        else:
+            metrics = bench_text(suite.split(':', 1)[1], documents, repeat, workdir)
+        metrics['peak_rss_mb'] = peak_rss_mb()
+        return metrics
+    except SuiteSkipped as e:
+        return {'skipped': str(e)}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_suite(suite: str, repeat: int, synthetic: int) -> Dict[str, Any]:
+    """Run a suite in a fresh interpreter, so peak RSS and imports are its own"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', suite,
+         '--repeat', str(repeat), '--synthetic', str(synthetic)],
+        capture_output=True, text=True, cwd=REPO_ROOT
+    )
+    if completed.returncode != 0:
+        return {'error': (completed.stderr.strip().splitlines() or ['unknown error'])[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print each suite against the baseline; returns the regressions found"""
+    regressions = []
+    if baseline.get('corpus', {}).get('digest') != results['corpus']['digest']:
+        print("Baseline was recorded on a different corpus; not comparing.")
+        return regressions
+
+    print(f"\n{'suite':<16} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for suite, metrics in results['suites'].items():
+        base = baseline.get('suites', {}).get(suite)
+        if not base or 'skipped' in metrics or 'error' in metrics or 'skipped' in base:
+            continue
+
+        if 'events_digest' in base and base['events_digest'] != metrics.get('events_digest'):
+            regressions.append(f"{suite}: extracted events changed "
+                               f"({base.get('events')} -> {metrics.get('events')} events)")
+
+        for metric, higher_is_better in METRICS.items():
+            old, new = base.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ' !' if worse > tolerance else ''
+            print(f"{suite:<16} {metric:<12} {old:>12} {new:>12} {change:>+7.1%}{flag}")
+            if flag:
+                regressions.append(f"{suite}: {metric} {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def print_results(results: Dict[str, Any]):
+    corpus = results['corpus']
+    print(f"Corpus: {corpus['documents']} documents, {corpus['pages']} pages, "
+          f"{corpus['chars']} chars (digest {corpus['digest']})\n")
+    print(f"{'suite':<16} {'p50 ms':>9} {'p99 ms':>9} {'pages/s':>9} {'chars/s':>11} {'RSS MB':>8}")
+    for suite, metrics in results['suites'].items():
+        if 'skipped' in metrics or 'error' in metrics:
+            status = 'skipped' if 'skipped' in metrics else 'error'
+            print(f"{suite:<16} {status}: {metrics.get('skipped') or metrics.get('error')}")
+            continue
+        print(f"{suite:<16} {metrics['p50_ms']:>9} {metrics['p99_ms']:>9} "
+              f"{metrics['pages_per_s']:>9} {metrics['chars_per_s']:>11} {metrics['peak_rss_mb']:>8}")
+
+
+def write_results(results: Dict[str, Any], path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"Results written to {path}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--suite', action='append', choices=SUITES,
+                        help='Suite to run (repeatable; default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the corpus per suite')
+    parser.add_argument('--synthetic', type=int, default=None,
+                        help='Synthetic documents added to the seeded ones')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare with')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the baseline')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative slowdown before a metric counts as a regression')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    from corpus import SYNTHETIC_DOCUMENTS
+    synthetic = SYNTHETIC_DOCUMENTS if args.synthetic is None else args.synthetic
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.repeat, synthetic)))
+        return 0
+
+    documents = load_corpus(synthetic=synthetic)
+    results = {
+        'corpus': {
+            'documents': len(documents),
+            'pages': sum(d.pages for d in documents),
+            'chars': sum(len(d.text) for d in documents),
+            'digest': corpus_digest(documents),
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'repeat': args.repeat,
+        'suites': {},
+    }
+    for suite in args.suite or SUITES:
+        print(f"Running {suite}...", file=sys.stderr)
+        results['suites'][suite] = run_suite(suite, args.repeat, synthetic)
+
+    print_results(results)
+
+    # Output equivalence with the legacy matching code needs no baseline
+    regressions = [
+        f"{suite}: {metrics['equivalence_mismatches']} documents differ from the legacy "
+        f"finditer/split() extraction"
+        for suite, metrics in results['suites'].items()
+        if metrics.get('equivalence_mismatches')
+    ]
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions += compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+        else:
+            print("\nNo regressions against the baseline.")
+
+    if args.output:
+        write_results(results, args.output)
+    if args.save_baseline:
+        if args.suite and os.path.exists(args.baseline):
+            # Re-baselining some suites keeps the others
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            if baseline.get('corpus', {}).get('digest') == results['corpus']['digest']:
+                results['suites'] = dict(baseline.get('suites', {}), **results['suites'])
+        write_results(results, args.baseline)
+
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Shared pytest fixtures
+Runs the Flask app against a throwaway SQLite database and upload folder
+"""
+
+import io
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import, so point it at a temporary
+# database first. Tests run jobs themselves rather than on worker threads.
+TEST_ROOT = tempfile.mkdtemp(prefix='sof-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_ROOT, 'test.sqlite')}"
+os.environ['JOB_WORKERS'] = '0'
+
+SOF_TEXT = """STATEMENT OF FACTS
+VESSEL: MV {vessel}
+PORT: SINGAPORE
+NOR TENDERED: 0600 HRS 01/09/2025
+PILOT BOARDED: 0715 HRS 01/09/2025
+ALL FAST: 0930 HRS 01/09/2025
+LOADING COMMENCED: 1000 HRS 01/09/2025
+LOADING COMPLETED: 1800 HRS 03/09/2025
+HOSES DISCONNECTED: 1900 HRS 03/09/2025
+"""
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def sof_app():
+    import app as sof_app
+
+    sof_app.app.config['TESTING'] = True
+    sof_app.app.config['UPLOAD_FOLDER'] = os.path.join(TEST_ROOT, 'uploads')
+    upgrade = sof_app.app.test_cli_runner().invoke(args=['db-upgrade'])
+    assert upgrade.exit_code == 0, upgrade.output
+    return sof_app
+
+
+@pytest.fixture
+def client(sof_app):
+    return sof_app.app.test_client()
+
+
+@pytest.fixture
+def upload(client):
+    """Upload text as a .txt document; returns its id"""
+    def upload(text, filename='sof.txt'):
+        response = client.post(
+            '/api/upload',
+            data={'file': (io.BytesIO(text.encode('utf-8')), filename)},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['document_id']
+    return upload
+
+
+@pytest.fixture
+def run_jobs(sof_app):
+    """Run every queued job on this thread, as a worker would; returns their ids"""
+    def run_jobs():
+        queue = sof_app.job_queue
+        queue.ensure_started()
+        finished = []
+        with sof_app.app.app_context():
+            job_id = queue._claim()
+            while job_id:
+                queue._run(job_id)
+                finished.append(job_id)
+                job_id = queue._claim()
+        return finished
+    return run_jobs
+
+
+@pytest.fixture
+def processed_document(sof_app, client, upload, run_jobs):
+    """Upload an SoF and process it through the job queue; returns its id"""
+    def processed_document(text=None, vessel='TEST CARRIER'):
+        document_id = upload(text or SOF_TEXT.format(vessel=vessel), f"{vessel.lower()}.txt")
+        client.post(f'/api/process/{document_id}')
+        run_jobs()
+        with sof_app.app.app_context():
+            assert sof_app.db.session.get(sof_app.Document, document_id).status == 'processed'
+        return document_id
+    return processed_document
@@ -105,13 +105,14 @@ After=network.target
 Type=simple
 User=www-data
 WorkingDirectory={}
+ExecStartPre={}/venv/bin/flask --app app db-upgrade
 ExecStart={}/venv/bin/gunicorn -c gunicorn_config.py app:app
 Restart=always
 RestartSec=10
 
 [Install]
 WantedBy=multi-user.target
-""".format(os.getcwd(), os.getcwd())
+""".format(os.getcwd(), os.getcwd(), os.getcwd())
     
     with open("maritime-extractor.service", "w") as f:
         f.write(service_content)
@@ -214,7 +215,7 @@ def main():
     print("\n🎉 Deployment preparation completed!")
     print("\n📋 Next steps:")
     print("1. Test the application: python app.py")
-    print("2. For production with Gunicorn: gunicorn -c gunicorn_config.py app:app")
+    print("2. For production with Gunicorn: flask --app app db-upgrade && gunicorn -c gunicorn_config.py app:app")
     print("3. For Docker: docker-compose up -d")
     print("4. For systemd: Follow the service installation instructions above")
 
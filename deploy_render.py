@@ -78,7 +78,7 @@ def show_deployment_steps():
     print("   - Name: maritime-event-extractor")
     print("   - Environment: Python 3")
     print("   - Build Command: pip install -r requirements_render.txt && python -m spacy download en_core_web_sm")
-    print("   - Start Command: gunicorn app:app --bind 0.0.0.0:$PORT")
+    print("   - Start Command: flask --app app db-upgrade && gunicorn app:app --bind 0.0.0.0:$PORT")
     
     print("\n5. 🔑 Set Environment Variables:")
     print("   - PYTHON_VERSION: 3.11.0")
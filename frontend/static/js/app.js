@@ -250,7 +250,13 @@ async function processDocument(documentId) {
             throw new Error(result.error || 'Processing failed');
         }
 
-        extractedEvents = result.events || [];
+        if (result.job_id) {
+            // Processing runs in the background; wait for the job to finish
+            await waitForJob(result.job_id);
+            extractedEvents = await fetchDocumentEvents(documentId);
+        } else {
+            extractedEvents = result.events || [];
+        }
         
         // Show results
         showResults();
@@ -271,6 +277,35 @@ async function processDocument(documentId) {
     }
 }
 
+async function waitForJob(jobId, interval = 1000) {
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+        const job = await response.json();
+
+        if (!response.ok) {
+            throw new Error(job.error || 'Failed to check processing status');
+        }
+        if (job.status === 'completed') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Processing failed');
+        }
+
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
+async function fetchDocumentEvents(documentId) {
+    const response = await fetch(`${API_BASE_URL}/documents/${documentId}/events`);
+    const result = await response.json();
+
+    if (!response.ok) {
+        throw new Error(result.error || 'Failed to load events');
+    }
+    return result.events || [];
+}
+
 async function sendChatMessage(message) {
     try {
         const response = await fetch(`${API_BASE_URL}/chat`, {
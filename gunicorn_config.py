@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for the SoF Event Extractor
+
+    gunicorn -c gunicorn_config.py app:app
+
+The app is imported once in the master (``preload_app``) with the spaCy
+model loaded eagerly, then the workers are forked from it: they start
+serving immediately and share the model's memory copy-on-write instead of
+each loading its own copy. Workers recycled after ``max_requests`` are
+forked from the same master, so they don't reload the model either.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+preload_app = True
+
+# Load the model in the master while the app is preloaded (app.py reads this);
+# a background warmup thread would not survive the fork
+os.environ.setdefault('NLP_WARMUP', 'eager')
+
+
+def pre_fork(server, worker):
+    # Move everything the master allocated (the model above all) out of the
+    # collector's generations, so collections in the workers don't write to
+    # those pages and un-share them
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Database connections opened in the master must not be shared by the
+    # workers; drop them from the pool without closing the master's sockets
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
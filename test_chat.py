@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Chat Test
+Checks that document answers quote the passages retrieved for the question
+"""
+
+import pytest
+
+from conftest import SOF_TEXT
+
+CHAT_TEXT = SOF_TEXT.format(vessel='CHAT ONE') + (
+    'SURVEYOR DETAINED AT GANGWAY BY IMMIGRATION <img src=x onerror=alert(1)>\n'
+)
+
+
+def ask(client, message, document_id=None):
+    response = client.post('/api/chat', json={'message': message, 'document_id': document_id})
+    assert response.status_code == 200
+    return response.get_json()['response']
+
+
+@pytest.fixture
+def document_id(processed_document):
+    return processed_document(CHAT_TEXT)
+
+
+def test_question_is_answered_from_matching_passages(client, document_id):
+    answer = ask(client, 'Was the surveyor held by immigration at the gangway?', document_id)
+
+    assert 'best matches your question' in answer
+    assert 'IMMIGRATION' in answer
+    assert '&lt;img' in answer
+    assert '<img' not in answer
+
+
+def test_event_answers_cite_the_document(client, document_id):
+    answer = ask(client, 'When did the pilot board?', document_id)
+
+    assert 'From the document:' in answer
+    assert 'Pilot Boarded' in answer
+
+
+def test_count_questions_use_the_event_counts(client, document_id):
+    events = client.get(f'/api/documents/{document_id}/events?type=cargo').get_json()['events']
+    answer = ask(client, 'How many cargo events are there?', document_id)
+
+    assert f"Cargo: <strong>{len(events)}</strong>" in answer
+
+
+def test_without_a_document_nothing_is_retrieved(client):
+    assert 'From the document:' not in ask(client, 'When did the pilot board?')
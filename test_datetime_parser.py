@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Date/Time Parser Test
+Checks SoF timestamp layouts, midnight and year rollover, and bare years
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from backend.utils.datetime_parser import normalize_timestamps, parse_sof_datetime
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1712 HRS 16.02.2024', datetime(2024, 2, 16, 17, 12)),
+    ('31/08/25 0600', datetime(2025, 8, 31, 6, 0)),
+    ('2024-02-16 17:12', datetime(2024, 2, 16, 17, 12)),
+    ('9/Dec/23 05:30 HRS', datetime(2023, 12, 9, 5, 30)),
+    ('16th February 2024 08.15 hrs', datetime(2024, 2, 16, 8, 15)),
+    ('Feb 16, 2024 5:30 pm', datetime(2024, 2, 16, 17, 30)),
+    ('2400 HRS 16.02.2024', datetime(2024, 2, 17, 0, 0)),
+    ('13/25/2024', None),
+])
+def test_layouts(value, expected):
+    assert parse_sof_datetime(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2024 HRS', datetime(2024, 3, 1, 20, 24)),
+    ('2024 LT', datetime(2024, 3, 1, 20, 24)),
+    ('2024 16.02.2024', datetime(2024, 2, 16, 20, 24)),
+    ('16.02.2024 2024', datetime(2024, 2, 16, 20, 24)),
+    ('May 2024 rain', None),
+    ('rain in 2024', None),
+])
+def test_bare_years_are_not_times(value, expected):
+    assert parse_sof_datetime(value, default_date=date(2024, 3, 1)) == expected
+
+
+@pytest.mark.parametrize('value', ['31/12 0200', '0200 31.12', '31-12 0200 HRS'])
+def test_day_and_month_without_year_keep_their_date(value):
+    assert parse_sof_datetime(value) is None
+    assert parse_sof_datetime(value, default_date=date(2024, 3, 1)) == datetime(2024, 12, 31, 2, 0)
+    assert normalize_timestamps(['2200 HRS 30.12.2023', value]) == [
+        datetime(2023, 12, 30, 22, 0), datetime(2023, 12, 31, 2, 0)
+    ]
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('31 Aug 08:00', datetime(2025, 8, 31, 8, 0)),
+    ('9-Dec 05:30', datetime(2025, 12, 9, 5, 30)),
+    ('31st August 10:30 hrs', datetime(2025, 8, 31, 10, 30)),
+    ('31 Aug 08.15 hrs', datetime(2025, 8, 31, 8, 15)),
+    ('12 Mar 2024 08:00', datetime(2024, 3, 12, 8, 0)),
+])
+def test_month_name_dates_do_not_take_the_hour_as_year(value, expected):
+    assert parse_sof_datetime(value, default_date=date(2025, 3, 1)) == expected
+    assert parse_sof_datetime(value) == (expected if '2024' in value else None)
+
+
+def test_time_without_date_rolls_past_midnight():
+    assert normalize_timestamps(['2200 HRS 31.12.2023', '2330', '0130', '0600']) == [
+        datetime(2023, 12, 31, 22, 0),
+        datetime(2023, 12, 31, 23, 30),
+        datetime(2024, 1, 1, 1, 30),
+        datetime(2024, 1, 1, 6, 0),
+    ]
+
+
+def test_date_without_year_rolls_into_next_year():
+    assert normalize_timestamps(['1200 HRS 30.12.2023', '31 Dec 0800', '2 Jan 1000']) == [
+        datetime(2023, 12, 30, 12, 0),
+        datetime(2023, 12, 31, 8, 0),
+        datetime(2024, 1, 2, 10, 0),
+    ]
+
+
+def test_undated_times_need_a_reference():
+    assert normalize_timestamps(['0800', None, 'nil']) == [None, None, None]
+    assert normalize_timestamps(['0800', 'May 2024 rain', '0700'], reference=datetime(2024, 3, 1)) == [
+        datetime(2024, 3, 1, 8, 0),
+        None,
+        datetime(2024, 3, 2, 7, 0),
+    ]
@@ -42,12 +42,12 @@ def test_single_document(extractor, pdf_path):
         
         if events:
             for i, event in enumerate(events, 1):
-                print(f"  {i}. {event.get('event_name', 'N/A')}")
-                print(f"     Type: {event.get('event_type', 'N/A')}")
-                print(f"     Start: {event.get('start_time', 'N/A')}")
-                print(f"     End: {event.get('end_time', 'N/A')}")
-                print(f"     Location: {event.get('location', 'N/A')}")
-                print(f"     Confidence: {event.get('confidence', 'N/A')}")
+                print(f"  {i}. {event.event_name}")
+                print(f"     Type: {event.event_type}")
+                print(f"     Start: {event.start_time or 'N/A'}")
+                print(f"     End: {event.end_time or 'N/A'}")
+                print(f"     Location: {event.location or 'N/A'}")
+                print(f"     Confidence: {event.confidence}")
                 print()
         else:
             print("❌ No events extracted")
@@ -113,7 +113,7 @@ def test_multiple_documents():
         print(f"    Events: {len(events)}")
         if events:
             for event in events:
-                print(f"      - {event.get('event_name', 'N/A')} ({event.get('event_type', 'N/A')})")
+                print(f"      - {event.event_name} ({event.event_type})")
 
 def test_specific_document(filename):
     """Test a specific document by filename"""
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Extraction Cache Test
+Checks text and event cache hits, misses and invalidation on re-processing
+"""
+
+from conftest import SOF_TEXT
+
+
+def reprocess(sof_app, client, run_jobs, document_id):
+    """Process a document again; returns the job's cache report"""
+    with sof_app.app.app_context():
+        sof_app.db.session.get(sof_app.Document, document_id).status = 'failed'
+        sof_app.db.session.commit()
+    job_id = client.post(f'/api/process/{document_id}').get_json()['job_id']
+    run_jobs()
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'completed', job['error']
+    return job['result']['cache']
+
+
+def test_reprocessing_hits_the_cache(sof_app, client, upload, run_jobs):
+    document_id = upload(SOF_TEXT.format(vessel='CACHE ONE'), 'cache_one.txt')
+
+    assert reprocess(sof_app, client, run_jobs, document_id) == {'text': 'miss', 'events': 'miss'}
+    events = client.get(f'/api/documents/{document_id}/events').get_json()['events']
+
+    assert reprocess(sof_app, client, run_jobs, document_id) == {'text': 'hit', 'events': 'hit'}
+    cached = client.get(f'/api/documents/{document_id}/events').get_json()['events']
+    assert [event['event'] for event in cached] == [event['event'] for event in events]
+    assert [event['start_at'] for event in cached] == [event['start_at'] for event in events]
+
+
+def test_new_extractor_version_misses_the_event_cache(sof_app, client, upload, run_jobs, monkeypatch):
+    """Events are keyed on the extractor version; the text is not"""
+    document_id = upload(SOF_TEXT.format(vessel='CACHE TWO'), 'cache_two.txt')
+    reprocess(sof_app, client, run_jobs, document_id)
+
+    monkeypatch.setattr(sof_app.event_extractor, 'version', sof_app.event_extractor.version + '-next')
+    assert reprocess(sof_app, client, run_jobs, document_id) == {'text': 'hit', 'events': 'miss'}
+    assert reprocess(sof_app, client, run_jobs, document_id) == {'text': 'hit', 'events': 'hit'}
+
+
+def test_ocr_failure_is_not_cached(sof_app, client, upload, run_jobs, monkeypatch):
+    """Text that still needs OCR is retried on the next run instead of cached"""
+    document_id = upload(SOF_TEXT.format(vessel='CACHE THREE'), 'cache_three.txt')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            sof_app.document_processor, 'extract_text',
+            lambda file_path, page_report=None: 'OCR_UNAVAILABLE: tesseract is not installed'
+        )
+        assert reprocess(sof_app, client, run_jobs, document_id) == {
+            'text': 'not_cached', 'events': 'not_cached'
+        }
+
+    assert reprocess(sof_app, client, run_jobs, document_id) == {'text': 'miss', 'events': 'miss'}
+    assert reprocess(sof_app, client, run_jobs, document_id) == {'text': 'hit', 'events': 'hit'}
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Job Queue Test
+Runs processing jobs through the queue and checks lease expiry and requeueing
+"""
+
+from datetime import datetime, timedelta
+
+from conftest import SOF_TEXT
+
+
+def expire_lease(sof_app, job_id, attempts):
+    """Make a job look claimed by a worker that died an hour ago"""
+    with sof_app.app.app_context():
+        job = sof_app.db.session.get(sof_app.ProcessingJob, job_id)
+        an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+        job.status = 'running'
+        job.worker = 'gone:1'
+        job.attempts = attempts
+        job.started_at = an_hour_ago
+        job.heartbeat_at = an_hour_ago
+        sof_app.db.session.get(sof_app.Document, job.document_id).status = 'processing'
+        sof_app.db.session.commit()
+
+
+def recover_stale(sof_app):
+    with sof_app.app.app_context():
+        return sof_app.job_queue.recover_stale()
+
+
+def test_job_completes_with_stage_progress(client, upload, run_jobs):
+    """A queued job runs every stage and reports its result"""
+    document_id = upload(SOF_TEXT.format(vessel='QUEUE ONE'), 'queue_one.txt')
+    queued = client.post(f'/api/process/{document_id}')
+    assert queued.status_code == 202
+    job_id = queued.get_json()['job_id']
+
+    assert run_jobs() == [job_id]
+
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'completed'
+    assert job['attempts'] == 1
+    assert set(job['stages'].values()) == {1.0}
+    assert job['result']['total_events'] > 0
+
+
+def test_expired_lease_is_requeued(sof_app, client, upload, run_jobs):
+    """A job whose worker died goes back to the queue and runs again"""
+    document_id = upload(SOF_TEXT.format(vessel='QUEUE TWO'), 'queue_two.txt')
+    job_id = client.post(f'/api/process/{document_id}').get_json()['job_id']
+    expire_lease(sof_app, job_id, attempts=1)
+
+    assert recover_stale(sof_app) == 1
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'queued'
+
+    # Enqueueing again finds the requeued job instead of adding another
+    assert client.post(f'/api/process/{document_id}').get_json()['job_id'] == job_id
+    assert run_jobs() == [job_id]
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'completed'
+    assert job['attempts'] == 2
+
+
+def test_expired_lease_fails_after_max_attempts(sof_app, client, upload, run_jobs):
+    """After max_attempts claims the job fails and its document is left failed"""
+    document_id = upload(SOF_TEXT.format(vessel='QUEUE THREE'), 'queue_three.txt')
+    job_id = client.post(f'/api/process/{document_id}').get_json()['job_id']
+    expire_lease(sof_app, job_id, attempts=sof_app.job_queue.max_attempts)
+
+    assert recover_stale(sof_app) == 1
+    assert run_jobs() == []
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'failed'
+    assert 'gone:1' in job['error']
+    with sof_app.app.app_context():
+        assert sof_app.db.session.get(sof_app.Document, document_id).status == 'failed'
+
+
+def test_reclaimed_run_does_not_write_its_result(sof_app, client, upload, run_jobs, monkeypatch):
+    """A run whose lease expired mid-job leaves the job to the worker that reclaimed it"""
+    document_id = upload(SOF_TEXT.format(vessel='QUEUE FOUR'), 'queue_four.txt')
+    job_id = client.post(f'/api/process/{document_id}').get_json()['job_id']
+
+    def reclaimed_handler(document_id, report_progress, hold_lease):
+        # Meanwhile the lease ran out and another worker claimed the job
+        job = sof_app.db.session.get(sof_app.ProcessingJob, job_id)
+        job.worker = 'other:2'
+        job.attempts += 1
+        sof_app.db.session.commit()
+        report_progress('extracting_text', 1.0)
+        return {'total_events': 99}
+
+    monkeypatch.setattr(sof_app.job_queue, 'handler', reclaimed_handler)
+    assert run_jobs() == [job_id]
+
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'running'
+    assert job['result'] is None
+    assert job['finished_at'] is None
+    assert job['stages']['extracting_text'] == 0.0
+    with sof_app.app.app_context():
+        assert sof_app.db.session.get(sof_app.ProcessingJob, job_id).worker == 'other:2'
+
+
+def test_reclaimed_run_does_not_write_the_document(sof_app, client, upload, run_jobs, monkeypatch):
+    """A run that lost its lease before saving leaves the document and its events alone"""
+    document_id = upload(SOF_TEXT.format(vessel='QUEUE FIVE'), 'queue_five.txt')
+    job_id = client.post(f'/api/process/{document_id}').get_json()['job_id']
+    handler = sof_app.job_queue.handler
+
+    def reclaimed_handler(document_id, report_progress, hold_lease):
+        def report(stage, fraction):
+            report_progress(stage, fraction)
+            if stage == 'saving_events' and fraction == 0.0:
+                # The lease ran out and another worker claimed the job
+                job = sof_app.db.session.get(sof_app.ProcessingJob, job_id)
+                job.worker = 'other:2'
+                job.attempts += 1
+                sof_app.db.session.commit()
+        return handler(document_id, report, hold_lease)
+
+    monkeypatch.setattr(sof_app.job_queue, 'handler', reclaimed_handler)
+    assert run_jobs() == [job_id]
+
+    assert client.get(f'/api/jobs/{job_id}').get_json()['status'] == 'running'
+    with sof_app.app.app_context():
+        assert sof_app.db.session.get(sof_app.Document, document_id).status == 'processing'
+        assert sof_app.Event.query.filter_by(document_id=document_id).count() == 0
+
+
+def test_lease_lost_mid_run_leaves_the_document_unchanged(sof_app, client, upload, run_jobs, monkeypatch):
+    """Progress reported after the job was reclaimed stops the run before it writes anything"""
+    document_id = upload(SOF_TEXT.format(vessel='QUEUE SIX'), 'queue_six.txt')
+    job_id = client.post(f'/api/process/{document_id}').get_json()['job_id']
+    handler = sof_app.job_queue.handler
+
+    def reclaimed_handler(document_id, report_progress, hold_lease):
+        def report(stage, fraction):
+            if stage == 'extracting_events' and fraction == 0.0:
+                # The lease ran out and another worker claimed the job, while
+                # this run holds the extracted text and header uncommitted
+                with sof_app.db.engine.begin() as connection:
+                    connection.execute(
+                        sof_app.ProcessingJob.__table__.update()
+                        .where(sof_app.ProcessingJob.id == job_id)
+                        .values(worker='other:2', attempts=2)
+                    )
+            report_progress(stage, fraction)
+        return handler(document_id, report, hold_lease)
+
+    monkeypatch.setattr(sof_app.job_queue, 'handler', reclaimed_handler)
+    assert run_jobs() == [job_id]
+
+    job = client.get(f'/api/jobs/{job_id}').get_json()
+    assert job['status'] == 'running'
+    assert job['stages']['extracting_text'] == 1.0
+    assert job['stages']['extracting_events'] == 0.0
+    with sof_app.app.app_context():
+        document = sof_app.db.session.get(sof_app.Document, document_id)
+        assert document.status == 'processing'
+        assert document.text_content is None
+        assert document.vessel_name is None
+        assert sof_app.Event.query.filter_by(document_id=document_id).count() == 0
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Laytime Test
+Runs an SoF through the extractor and the laytime engine end to end
+"""
+
+from backend.enhanced_maritime_extractor import EnhancedMaritimeExtractor
+from backend.services.laytime import LaytimeEngine
+
+SOF_TEXT = """STATEMENT OF FACTS
+VESSEL: MV TEST CARRIER
+NOR TENDERED: 0600 HRS 01/09/2025
+LOADING COMMENCED: 0800 HRS 01/09/2025
+RAIN STOPPED CARGO OPERATIONS 14:00 - 16:30
+HEAVY RAIN 2300 - 0130 HRS
+LOADING COMPLETED: 1800 HRS 03/09/2025
+"""
+
+
+def test_weather_delays_are_excluded():
+    """Weather delay periods on undated lines are dated and excluded from laytime"""
+    extractor = EnhancedMaritimeExtractor()
+    events = extractor.extract_events(SOF_TEXT)
+
+    weather = [event for event in events if event.event_type == 'weather']
+    assert [(event.start_time, event.end_time, event.duration) for event in weather] == [
+        ('14:00 01/09/2025', '16:30 01/09/2025', '2:30'),
+        ('23:00 01/09/2025', '01:30 02/09/2025', '2:30'),
+    ]
+
+    result = LaytimeEngine().compute_document(events)
+    assert result['status'] == 'complete'
+    assert result['excluded_hours'] == 5.0
+    assert result['laytime_used_hours'] == result['gross_hours'] - 5.0
+
+
+def test_stream_dates_weather_delays():
+    """Page-by-page extraction dates delay periods the same way"""
+    extractor = EnhancedMaritimeExtractor()
+    pages = SOF_TEXT.split('RAIN STOPPED')
+    pages[1] = 'RAIN STOPPED' + pages[1]
+    events = list(extractor.extract_events_stream(pages))
+
+    weather = sorted(event.start_at for event in events if event.event_type == 'weather')
+    assert [start_at.isoformat() for start_at in weather] == [
+        '2025-09-01T14:00:00', '2025-09-01T23:00:00'
+    ]
+
+
+def test_weather_words_inside_other_words_are_not_delays():
+    """Only whole weather words start a delay ("DRAINING", "WINDLASS" do not)"""
+    text = SOF_TEXT.replace(
+        "RAIN STOPPED CARGO OPERATIONS 14:00 - 16:30\nHEAVY RAIN 2300 - 0130 HRS\n",
+        "DRAINING BALLAST TANKS 14:00 - 18:00\nWINDLASS TESTED 2000 - 2100\n"
+    )
+    events = EnhancedMaritimeExtractor().extract_events(text)
+
+    assert [event for event in events if event.event_type == 'weather'] == []
+    assert LaytimeEngine().compute_document(events)['excluded_hours'] == 0
+
+
+def test_weather_period_with_invalid_date_stays_undated():
+    """A period whose line gives an impossible date is left undated rather than failing extraction"""
+    text = SOF_TEXT.replace("HEAVY RAIN 2300 - 0130 HRS", "HEAVY RAIN 11:00 - 13:00 31/02/2025")
+    events = EnhancedMaritimeExtractor().extract_events(text)
+
+    weather = [event for event in events if event.event_type == 'weather']
+    assert [(event.start_at is None, event.date_raw) for event in weather] == [
+        (False, None), (True, '31/02/2025')
+    ]
+    assert LaytimeEngine().compute_document(events)['excluded_hours'] == 2.5
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+List Endpoint Test
+Checks keyset cursors, fields= selection and NDJSON streaming
+"""
+
+import json
+
+import pytest
+
+
+def all_pages(client, url, key, limit):
+    """Follow next_cursor from the first page to the last"""
+    rows = []
+    response = client.get(f'{url}?limit={limit}').get_json()
+    while True:
+        assert len(response[key]) <= limit
+        rows.extend(response[key])
+        if response['next_cursor'] is None:
+            return rows
+        response = client.get(f"{url}?limit={limit}&cursor={response['next_cursor']}").get_json()
+
+
+@pytest.fixture
+def document_id(processed_document):
+    return processed_document(vessel='LIST ONE')
+
+
+def test_event_pages_cover_every_event_once(client, document_id):
+    url = f'/api/documents/{document_id}/events'
+    events = client.get(url).get_json()['events']
+    assert len(events) > 2
+
+    assert all_pages(client, url, 'events', limit=2) == events
+
+
+def test_document_pages_cover_every_document_once(client, processed_document):
+    processed_document(vessel='LIST TWO')
+    processed_document(vessel='LIST THREE')
+    documents = client.get('/api/documents').get_json()['documents']
+
+    assert all_pages(client, '/api/documents', 'documents', limit=1) == documents
+
+
+def test_invalid_cursor_is_rejected(client, document_id):
+    assert client.get('/api/documents?cursor=not-a-cursor').status_code == 400
+    assert client.get(f'/api/documents/{document_id}/events?cursor=not-a-cursor').status_code == 400
+
+
+def test_fields_selects_columns(client, document_id):
+    events = client.get(f'/api/documents/{document_id}/events?fields=event,start_at').get_json()['events']
+    assert events
+    assert all(set(event) == {'event', 'start_at'} for event in events)
+
+    response = client.get(f'/api/documents/{document_id}/events?fields=event,password')
+    assert response.status_code == 400
+    assert 'password' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('request_args', [
+    {'query_string': {'format': 'ndjson'}},
+    {'headers': {'Accept': 'application/x-ndjson'}},
+])
+def test_ndjson_streams_every_row(client, document_id, request_args):
+    url = f'/api/documents/{document_id}/events'
+    events = client.get(url, query_string={'fields': 'id,event'}).get_json()['events']
+
+    query_string = dict(request_args.get('query_string', {}), fields='id,event')
+    response = client.get(url, query_string=query_string, headers=request_args.get('headers'))
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == events
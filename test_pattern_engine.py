@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Pattern Engine Test
+Checks the anchor-routed engine against one re.finditer scan per pattern
+"""
+
+import re
+
+import pytest
+
+from backend import pattern_engine
+from backend.enhanced_maritime_extractor import EnhancedMaritimeExtractor
+from backend.pattern_engine import PatternEngine
+from benchmarks.corpus import load_corpus
+
+EDGE_CASES = [
+    "",
+    "nor",
+    "NOR TENDERED: 0600 HRS 01/09/2025\nNor Tendered : 0700 hrs 02.09.2025",
+    "PİLOT BOARDED: 0815 HRS 31.08.2025",  # dotted capital I folds like "i"
+    "Heavy rain caused delay, RAIN STOPPED WORK, storm, fog and WIND",
+    "norNORnor tendered=0600hrs01/09/2025",
+    "OPERATIONS SUSPENDED DUE TO WEATHER\r\nOPERATION SUSPENDED DUE TO WEATHER",
+    "Vessel arrived at SINGAPORE anchorage 0800 hrs 31/08/2025 vessel vessel",
+]
+
+
+def legacy_matches(event_patterns, text):
+    return [
+        (index, match.span(), match.groups())
+        for index, pattern_info in enumerate(event_patterns)
+        for pattern in pattern_info['patterns']
+        for match in re.finditer(pattern, text, re.IGNORECASE)
+    ]
+
+
+def engine_matches(engine, text):
+    positions = {id(pattern_info): index for index, pattern_info in enumerate(engine.event_patterns)}
+    return [
+        (positions[id(pattern_info)], match.span(), match.groups())
+        for pattern_info, match in engine.iter_matches(text)
+    ]
+
+
+@pytest.fixture(scope='module')
+def event_patterns():
+    return EnhancedMaritimeExtractor().event_patterns
+
+
+@pytest.fixture(scope='module')
+def texts():
+    return EDGE_CASES + [document.text for document in load_corpus()]
+
+
+@pytest.mark.parametrize('backend', ['default', 'regex'])
+def test_matches_equal_finditer(event_patterns, texts, monkeypatch, backend):
+    """Every match, in order and with the same span and groups, on both keyword backends"""
+    if backend == 'regex':
+        monkeypatch.setattr(pattern_engine, 'ahocorasick', None)
+    engine = PatternEngine(event_patterns)
+
+    mismatched = [
+        text[:60] for text in texts
+        if engine_matches(engine, text) != legacy_matches(event_patterns, text)
+    ]
+    assert mismatched == []
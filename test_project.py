@@ -80,7 +80,20 @@ def test_document_processing(document_id):
     try:
         url = f"{BASE_URL}/api/process/{document_id}"
         response = requests.post(url)
-        if response.status_code == 200:
+        if response.status_code == 202:
+            job_id = response.json().get('job_id')
+            for _ in range(60):
+                job = requests.get(f"{BASE_URL}/api/jobs/{job_id}").json()
+                if job.get('status') in ('completed', 'failed'):
+                    break
+                time.sleep(1)
+            status = job.get('status', 'N/A')
+            if status == 'completed':
+                print(f"✅ Document processing successful - Status: {status}")
+                return True
+            print(f"❌ Document processing failed - Status: {status}")
+            return False
+        elif response.status_code == 200:
             data = response.json()
             status = data.get('status', 'N/A')
             print(f"✅ Document processing successful - Status: {status}")
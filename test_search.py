@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Search Test
+Checks full-text search snippets and keyset paging through ranked results
+"""
+
+import pytest
+
+from conftest import SOF_TEXT
+
+
+def hit_key(result):
+    return result['type'], result['document_id'], (result.get('event') or {}).get('id'), result['snippet']
+
+
+@pytest.fixture(autouse=True)
+def search_available(sof_app):
+    if not sof_app.search_index.available:
+        pytest.skip('Full-text search is not available on this database')
+
+
+def test_snippet_escapes_document_text(client, processed_document):
+    text = SOF_TEXT.format(vessel='SEARCH ONE') + (
+        'REMARKS: <script>alert("x")</script> QUARANTINE FLAG & BUNKERS <b>PENDING</b>\n'
+    )
+    document_id = processed_document(text)
+
+    results = client.get('/api/search?q=quarantine&type=document').get_json()['results']
+    snippets = [result['snippet'] for result in results if result['document_id'] == document_id]
+
+    assert len(snippets) == 1
+    assert '<mark>QUARANTINE</mark>' in snippets[0]
+    assert '&lt;script&gt;' in snippets[0]
+    assert '&amp;' in snippets[0]
+    assert '<script>' not in snippets[0]
+    assert '<b>' not in snippets[0]
+
+
+def test_cursor_pages_follow_the_ranking(client, processed_document):
+    for vessel in ('SEARCH TWO', 'SEARCH THREE', 'SEARCH FOUR'):
+        processed_document(SOF_TEXT.format(vessel=vessel) + f'TALLY CLERKS OF {vessel} ON BOARD\n')
+    ranked = client.get('/api/search?q=tally&limit=100').get_json()
+    assert ranked['next_cursor'] is None
+    assert len(ranked['results']) == 3
+
+    paged = []
+    response = client.get('/api/search?q=tally&limit=2').get_json()
+    while True:
+        assert len(response['results']) <= 2
+        paged.extend(response['results'])
+        if response['next_cursor'] is None:
+            break
+        response = client.get(f"/api/search?q=tally&limit=2&cursor={response['next_cursor']}").get_json()
+
+    assert [hit_key(result) for result in paged] == [hit_key(result) for result in ranked['results']]
+
+
+def test_each_document_is_one_hit(client, processed_document):
+    """The document text and the remarks of its events match once, as its best row"""
+    document_id = processed_document(vessel='SEARCH FIVE')
+
+    results = client.get('/api/search?q=loading&limit=1000').get_json()['results']
+    document_ids = [result['document_id'] for result in results]
+    assert len(document_ids) == len(set(document_ids))
+
+    hit = next(result for result in results if result['document_id'] == document_id)
+    assert hit['matches'] > 1
+    events = client.get('/api/search?q=loading&type=event&limit=1000').get_json()['results']
+    assert [result['document_id'] for result in events].count(document_id) == 1
+
+    scores = [result['score'] for result in results]
+    assert scores == sorted(scores, reverse=True)
+    assert len(set(scores)) > 1
+
+
+@pytest.mark.parametrize('query', ['', 'q=', 'q=loading&type=vessel', 'q=loading&cursor=not-a-cursor', 'q=%22%22'])
+def test_invalid_queries_are_rejected(client, query):
+    assert client.get(f'/api/search?{query}').status_code == 400